@@ -0,0 +1,18 @@
+#!/bin/bash
+# Réplica de leitura local (streaming replication a partir do serviço 'db').
+# Na primeira subida (volume vazio) copia o primário com pg_basebackup -R, que grava
+# primary_conninfo e standby.signal; depois só sobe o Postgres em modo standby.
+set -e
+
+if [ ! -s "$PGDATA/PG_VERSION" ]; then
+  echo "Réplica: aguardando o primário em db:5432..."
+  until pg_isready -h db -p 5432 -U "$POSTGRES_USER" -d "$POSTGRES_DB"; do sleep 2; done
+
+  echo "Réplica: copiando o primário (pg_basebackup)..."
+  PGPASSWORD="$POSTGRES_PASSWORD" pg_basebackup -h db -p 5432 -U "$POSTGRES_USER" \
+    -D "$PGDATA" -X stream -R --checkpoint=fast
+  chmod 0700 "$PGDATA"
+fi
+
+# hot_standby_feedback: o VACUUM do primário não cancela consultas longas do dashboard na réplica
+exec postgres -c hot_standby=on -c hot_standby_feedback=on
@@ -1,7 +1,6 @@
 import streamlit as st
 import pandas as pd
 import servicos.banco as banco
-import servicos.ia as ia
 
 # Importar páginas modulares
 import pages_logic.dashboard as dashboard_page
@@ -12,21 +11,17 @@ import pages_logic.explorador as explorer_page
 st.set_page_config(page_title="Analytics Dashboard", layout="wide")
 st.title("Analytics - Dashboard Inteligente")
 
-# --- SERVIÇOS ---
-if 'ia_service' not in st.session_state:
-    st.session_state['ia_service'] = ia.ServicoIA()
-
 # --- SIDEBAR E FILTROS ---
 st.sidebar.header("Filtros Globais")
 
-# Carregar datas dinâmicas (Cache simples via banco)
-df_datas = banco.executar_consulta("SELECT MIN(criado_em) as inicio, MAX(criado_em) as fim FROM pedidos")
+# Carregar datas dinâmicas (catálogo mantido pelo ETL, em cache no processo)
+info_pedidos = banco.obter_catalogo().get('pedidos', {})
 data_min = pd.to_datetime("2025-01-01")
 data_max = pd.to_datetime("2025-12-31")
 
-if df_datas is not None and not df_datas.empty:
-    data_min = pd.to_datetime(df_datas.iloc[0]['inicio'])
-    data_max = pd.to_datetime(df_datas.iloc[0]['fim'])
+if pd.notna(info_pedidos.get('data_min')) and pd.notna(info_pedidos.get('data_max')):
+    data_min = pd.to_datetime(info_pedidos['data_min'])
+    data_max = pd.to_datetime(info_pedidos['data_max'])
 
 data_inicio = st.sidebar.date_input("Data Início", data_min, min_value=data_min, max_value=data_max)
 data_fim = st.sidebar.date_input("Data Fim", data_max, min_value=data_min, max_value=data_max)
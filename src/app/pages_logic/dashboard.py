@@ -10,8 +10,15 @@ def render(params_globais):
         opcoes = visoes['nome'].tolist()
         # Adicionar chave única para evitar conflitos de widget ID se renderizar novamente
         opcao_visao = st.selectbox("Selecione a Visão", opcoes, key="dash_select_visao")
+        mostrar_performance = st.checkbox("Mostrar performance", key="dash_perf")
+        modo_lazy = st.checkbox("Carregamento sob demanda", value=False, key="dash_lazy", help="Calcula só a primeira linha de componentes; os demais carregam ao clicar (e só os carregados entram no envio)")
         
         row_visao = visoes[visoes['nome'] == opcao_visao].iloc[0]
-        renderizar_visao(row_visao['estrutura_json'], params_globais)
+        # Só a visão selecionada é lida por inteiro (cache por id + versão)
+        visao = banco.carregar_visao(row_visao['id'], row_visao['versao'])
+        if visao is None:
+            st.warning("Visão não encontrada. Ela pode ter sido excluída.")
+            return
+        renderizar_visao(visao['estrutura_json'], params_globais, mostrar_performance=mostrar_performance, id_visao=visao['id'], modo_lazy=modo_lazy)
     else:
         st.info("Nenhuma visão disponível. Vá em 'Gerenciar Visões' para criar uma.")
@@ -5,7 +5,7 @@ def render(params_globais):
     st.header("Explorador de Tabelas")
     
     # Listar tabelas permitidas
-    tabelas = ["pedidos", "itens", "suprimentos"]
+    tabelas = ["pedidos", "itens", "suprimentos", "disponibilidade_materiais"]
     tabela_sel = st.selectbox("Selecione a Tabela", tabelas, key="exp_select_tabela")
     
     if tabela_sel:
@@ -28,7 +28,8 @@ def render(params_globais):
     if st.button("Executar Query Manual", key="exp_btn_executar"):
         if query_debug.strip():
             with st.spinner("Executando..."):
-                df_res = banco.executar_consulta(query_debug)
+                # Resultado de tamanho livre: leitura colunar (ADBC/COPY) quando disponível
+                df_res = banco.executar_consulta(query_debug, colunar=True)
                 if df_res is not None:
                     st.dataframe(df_res, use_container_width=True)
                     st.success(f"{len(df_res)} linhas retornadas.")
@@ -36,3 +37,21 @@ def render(params_globais):
                     st.error("Erro na consulta. Verifique a sintaxe ou log do terminal.")
         else:
             st.warning("Digite uma query primeiro.")
+
+    st.divider()
+    st.subheader("Custo das Visões (Log de Consultas)")
+    st.caption("Custo acumulado das consultas registradas em 'consultas_log'. Consultas rápidas são amostradas e ponderadas.")
+    
+    dias = st.selectbox("Período", [1, 7, 30], index=1, format_func=lambda d: f"Últimos {d} dias", key="exp_custo_dias")
+    df_ranking = banco.ranking_custo_visoes(dias)
+    
+    if df_ranking is not None and not df_ranking.empty:
+        st.dataframe(df_ranking, use_container_width=True)
+        with st.expander("Consultas mais caras"):
+            df_lentas = banco.consultas_mais_lentas(dias)
+            if df_lentas is not None:
+                st.dataframe(df_lentas, use_container_width=True)
+    elif df_ranking is None:
+        st.error("Erro ao carregar o log de consultas. Rode o ETL para criar a tabela 'consultas_log'.")
+    else:
+        st.info("Nenhuma consulta registrada no período.")
@@ -1,11 +1,27 @@
 import streamlit as st
 import json
 import os
-import requests
-import subprocess
+import sys
 import servicos.banco as banco
+import servicos.envio as envio
 from utils.ui_helpers import renderizar_visao
 
+DIR_JOBS = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', 'jobs'))
+# No path desde o import da página: agendador é importado sob demanda (obter_agendador e botão de envio)
+if DIR_JOBS not in sys.path:
+    sys.path.append(DIR_JOBS)
+
+@st.cache_resource(show_spinner=False)
+def obter_agendador():
+    """
+    Agendador de relatórios em processo, compartilhado por todas as sessões.
+    Evita pagar o custo de subir um interpretador (pandas, matplotlib, seaborn) a cada envio.
+    """
+    import agendador
+    # O cron normalmente roda no sidecar (serviço 'agendador'); no app só a fila é usada
+    cron = os.getenv("AGENDADOR_CRON_NO_APP", "false") == "true"
+    return agendador.Agendador().iniciar(cron=cron)
+
 def render(params_globais):
     st.header("Central de Visões")
     
@@ -24,15 +40,20 @@ def render(params_globais):
         render_tab_manual(params_globais)
 
 def render_tab_lista(params_globais):
-    visoes = banco.listar_visoes()
+    busca = st.text_input("Buscar por tabela ou coluna", key="mgr_busca_visao", placeholder="ex: pedidos, estado_cliente")
+    visoes = banco.buscar_visoes(busca) if busca.strip() else banco.listar_visoes()
     if visoes is not None and not visoes.empty:
-        opcoes = {f"{row['id']} - {row['nome']}": row['id'] for index, row in visoes.iterrows()}
+        opcoes = {f"{row['id']} - {row['nome']} ({row['total_componentes']} componentes)": row['id'] for index, row in visoes.iterrows()}
         # Key única para evitar conflito com Dashboard
         opcao_selecionada = st.selectbox("Selecione uma Visão para Gerenciar", list(opcoes.keys()), key="mgr_select_visao")
         
         id_selecionado = opcoes[opcao_selecionada]
         row_visao = visoes[visoes['id'] == id_selecionado].iloc[0]
-        json_estrutura = row_visao['estrutura_json']
+        visao = banco.carregar_visao(id_selecionado, row_visao['versao'])
+        if visao is None:
+            st.warning("Visão não encontrada. Ela pode ter sido excluída.")
+            return
+        json_estrutura = visao['estrutura_json']
         
         # Ações
         c1, c2, c3, c4 = st.columns(4)
@@ -44,52 +65,45 @@ def render_tab_lista(params_globais):
                 st.success("Deletado!")
                 st.rerun()
         with c3:
-            # Botão para testar envio n8n (Script Global)
+            # Botão para testar envio n8n (Script Global), executado pelo agendador em segundo plano
             if st.button("Enviar p/ n8n (Script)", key=f"n8n_script_{id_selecionado}"):
-                with st.spinner("Processando e enviando..."):
-                    try:
-                        # Extrair datas dos parâmetros globais
-                        d_inicio = params_globais.get("data_inicio")
-                        d_fim = params_globais.get("data_fim")
-                        
-                        cmd = ["python", "src/jobs/processar_visoes.py"]
-                        
-                        if d_inicio:
-                            cmd.extend(["--start", str(d_inicio)])
-                        if d_fim:
-                            cmd.extend(["--end", str(d_fim)])
-                            
-                        res = subprocess.run(cmd, capture_output=True, text=True)
-                        
-                        if res.returncode == 0:
-                            st.success("Enviado com sucesso! Verifique o n8n.")
-                            with st.expander("Logs do Envio"):
-                                st.code(res.stdout)
-                        else:
-                            st.error("Erro ao executar script.")
-                            st.code(res.stderr + "\n" + res.stdout)
-                    except Exception as e:
-                        st.error(f"Erro: {e}")
+                try:
+                    from agendador import PRIORIDADE_ALTA
+                    
+                    # Extrair datas dos parâmetros globais
+                    d_inicio = params_globais.get("data_inicio")
+                    d_fim = params_globais.get("data_fim")
+                    
+                    st.session_state['job_n8n'] = obter_agendador().enfileirar(
+                        str(d_inicio) if d_inicio else None,
+                        str(d_fim) if d_fim else None,
+                        prioridade=PRIORIDADE_ALTA
+                    )
+                except Exception as e:
+                    st.error(f"Erro: {e}")
+
+        render_status_job()
 
         st.divider()
         
         # Edição
         with st.expander("Editar Detalhes", expanded=False):
             novo_nome = st.text_input("Nome", value=row_visao['nome'], key=f"edit_nome_{id_selecionado}")
-            novo_prompt = st.text_area("Prompt", value=row_visao['descricao_prompt'], key=f"edit_prompt_{id_selecionado}")
+            novo_prompt = st.text_area("Prompt", value=visao['descricao_prompt'], key=f"edit_prompt_{id_selecionado}")
             json_str = st.text_area("JSON Estrutura", value=json.dumps(json_estrutura, indent=4, ensure_ascii=False), height=300, key=f"edit_json_{id_selecionado}")
             
             if st.button("Salvar Alterações", key=f"save_edit_{id_selecionado}"):
                 try:
                     novo_json = json.loads(json_str)
-                    banco.atualizar_visao(int(id_selecionado), novo_nome, novo_prompt, novo_json)
+                    # Versão lida acima: falha se outra sessão salvou a visão nesse meio tempo
+                    banco.atualizar_visao(int(id_selecionado), novo_nome, novo_prompt, novo_json, versao=visao['versao'])
                     st.success("Atualizado!")
                     st.rerun()
                 except Exception as e:
                     st.error(f"Erro: {e}")
         
         st.subheader("Pré-visualização da Visão Selecionada")
-        imgs = renderizar_visao(json_estrutura, params_globais)
+        imgs = renderizar_visao(json_estrutura, params_globais, id_visao=id_selecionado)
 
         # Botão envio granular (imagens na tela)
         if st.button("Enviar p/ n8n (Imagens na Tela)", key=f"send_imgs_{id_selecionado}"):
@@ -97,6 +111,7 @@ def render_tab_lista(params_globais):
                  st.warning("Nenhum gráfico gerado para enviar.")
              else:
                  with st.spinner("Enviando imagens em lote..."):
+                     import requests
                      WEBHOOK_URL = os.getenv('WEBHOOK_URL', 'http://n8n-main:5678/webhook/relatorio')
                      
                      files_to_send = []
@@ -104,13 +119,20 @@ def render_tab_lista(params_globais):
                      
                      for item in imgs:
                          item['buffer'].seek(0)
-                         files_to_send.append(('files', (f"{item['titulo']}.png", item['buffer'], 'image/png')))
-                         metadata_list.append({
+                         # Tabelas grandes também levam o CSV completo (extensao/mime no item)
+                         files_to_send.append(('files', (f"{item['titulo']}.{item.get('extensao', 'png')}", item['buffer'], item.get('mime', 'image/png'))))
+                         metadados = {
                              'nome_visao': row_visao['nome'],
                              'titulo_grafico': item['titulo'],
                              'descricao': json_estrutura.get('descricao_prompt', ''),
-                             'dados_raw': item.get('dados_raw')
-                         })
+                             **envio.metadados_dados(item.get('dados'))
+                         }
+                         # Dados completos como arquivo (ANEXO_DADOS_ENVIO), referenciado nos metadados
+                         anexo = envio.anexo_dados(item['dados'], item['titulo']) if item.get('dados') is not None else None
+                         if anexo:
+                             files_to_send.append(('dados', anexo))
+                             metadados['arquivo_dados'] = anexo[0]
+                         metadata_list.append(metadados)
 
                      try:
                          # Enviar metadados como JSON string
@@ -131,20 +153,47 @@ def render_tab_lista(params_globais):
     else:
         st.info("Nenhuma visão criada. Use as abas ao lado para criar.")
 
+def render_status_job():
+    """Mostra o estado do último envio enfileirado nesta sessão."""
+    id_job = st.session_state.get('job_n8n')
+    if not id_job:
+        return
+
+    status = obter_agendador().status(id_job)
+    if status is None:
+        st.session_state.pop('job_n8n', None)
+        return
+
+    if status['estado'] == 'na_fila':
+        st.info(f"Envio na fila (posição {status.get('posicao_fila')}).")
+    elif status['estado'] == 'executando':
+        st.info("Processando e enviando...")
+    elif status['estado'] == 'concluido':
+        st.success("Enviado com sucesso! Verifique o n8n.")
+    else:
+        st.error(f"Erro ao executar script: {status['erro']}")
+
+    if status['estado'] in ('na_fila', 'executando'):
+        st.button("Atualizar status", key=f"status_{id_job}")
+    elif status['log']:
+        with st.expander("Logs do Envio"):
+            st.code(status['log'])
+
 def render_tab_ia(params_globais):
     st.subheader("Criar Nova Visão com IA")
     prompt = st.text_area("Descreva o que você quer ver", placeholder="Ex: Vendas por estado...", key="ia_prompt")
     
     if st.button("Gerar Visão (IA)", key="btn_gerar_ia"):
-        if 'ia_service' in st.session_state:
-            with st.spinner("Gerando..."):
-                resultado = st.session_state['ia_service'].gerar_visao_sql(prompt)
-                if "erro" in resultado:
-                    st.error(resultado["erro"])
-                else:
-                    st.session_state['visao_gerada'] = {"prompt": prompt, "resultado": resultado}
-        else:
-            st.error("Serviço IA não inicializado. Recarregue a página.")
+        # Serviço criado no primeiro uso: evita carregar o SDK do Gemini no cold start
+        if 'ia_service' not in st.session_state:
+            import servicos.ia as ia
+            st.session_state['ia_service'] = ia.ServicoIA()
+        with st.spinner("Gerando..."):
+            resultado = st.session_state['ia_service'].gerar_visao_sql(prompt)
+            if "erro" in resultado:
+                st.error(resultado["erro"])
+            else:
+                st.session_state['visao_gerada'] = {"prompt": prompt, "resultado": resultado}
     
     if 'visao_gerada' in st.session_state:
         visao = st.session_state['visao_gerada']['resultado']
@@ -1,7 +1,14 @@
 import os
+import time
+import threading
 import pandas as pd
 from sqlalchemy import create_engine, text
 from dotenv import load_dotenv
+import servicos.metricas as metricas
+import servicos.log_consultas as log_consultas
+import servicos.tipos as tipos
+import servicos.leitor_sql as leitor_sql
+import servicos.planos as planos
 
 # Carrega variáveis do .env
 load_dotenv()
@@ -26,7 +33,47 @@ DB_NAME = os.getenv("POSTGRES_DB", "gocase_db")
 
 DATABASE_URL = f"postgresql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
 
+# Réplica de leitura (opcional): as consultas do dashboard/playground vão para ela e as escritas
+# (visões, log, planos) e o ETL ficam no primário. Sem DB_HOST_LEITURA, tudo usa o primário.
+DB_HOST_LEITURA = os.getenv("DB_HOST_LEITURA", "")
+DB_PORT_LEITURA = os.getenv("DB_PORT_LEITURA", DB_PORT)
+DATABASE_URL_LEITURA = (f"postgresql://{DB_USER}:{DB_PASSWORD}@{DB_HOST_LEITURA}:{DB_PORT_LEITURA}/{DB_NAME}"
+                        if DB_HOST_LEITURA else None)
+# Atraso máximo de replicação aceito (segundos); acima disso as leituras voltam para o primário
+LIMITE_ATRASO_REPLICA_S = float(os.getenv("LIMITE_ATRASO_REPLICA", "30"))
+# Intervalo entre verificações do atraso/disponibilidade da réplica (segundos)
+INTERVALO_VERIFICACAO_REPLICA = 10
+# Timeouts curtos da réplica (segundos): host inacessível ou consulta de atraso travada não seguram as leituras
+TIMEOUT_CONEXAO_REPLICA_S = 2
+TIMEOUT_VERIFICACAO_REPLICA_MS = 2000
+
+# Atraso em segundos; 0 quando tudo o que foi recebido já foi aplicado (primário parado não conta como atraso)
+SQL_ATRASO_REPLICA = """
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() THEN 0
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+    END
+"""
+
 _engine = None
+_engine_leitura = None
+# "verificando": uma verificação em andamento; as demais chamadas seguem a última decisão
+_replica = {"usar": False, "verificado_em": None, "atraso": None, "verificando": False}
+_replica_lock = threading.Lock()
+
+# Cache do catálogo de metadados (compartilhado por todas as sessões do processo)
+_catalogo = None
+_catalogo_lock = threading.Lock()
+# Intervalo mínimo entre verificações da versão de carga do ETL (segundos)
+INTERVALO_VERIFICACAO_CATALOGO = 30
+
+# Visões completas em cache, por (id, versao): uma alteração gera nova versão e a entrada antiga só envelhece
+_visoes_cache = {}
+_visoes_lock = threading.Lock()
+LIMITE_CACHE_VISOES = 256
+# Dono das visões criadas por esta instância (catálogo multiusuário)
+DONO_PADRAO = os.getenv("DONO_VISOES", "padrao")
 
 def obter_conexao():
     global _engine
@@ -39,47 +86,279 @@ def obter_conexao():
             return None
     return _engine
 
-def executar_consulta(sql, params=None):
+def _verificar_replica(engine):
+    try:
+        with engine.connect() as conn:
+            # SET LOCAL vale só para esta transação; a conexão volta ao pool sem o limite
+            conn.execute(text(f"SET LOCAL statement_timeout = {TIMEOUT_VERIFICACAO_REPLICA_MS}"))
+            atraso = float(conn.execute(text(SQL_ATRASO_REPLICA)).scalar() or 0)
+    except Exception as e:
+        return None, str(e)
+    return atraso, None
+
+def obter_conexao_leitura():
+    """
+    Engine para leituras: a réplica quando configurada, acessível e com atraso até LIMITE_ATRASO_REPLICA_S;
+    senão o primário. A verificação é feita no máximo a cada INTERVALO_VERIFICACAO_REPLICA segundos, por uma
+    chamada só e fora do lock: enquanto ela roda, as outras usam a última decisão (primário até a primeira).
+    """
+    global _engine_leitura
+    if not DATABASE_URL_LEITURA:
+        return obter_conexao()
+
+    with _replica_lock:
+        agora = time.monotonic()
+        vencida = _replica["verificado_em"] is None or agora - _replica["verificado_em"] >= INTERVALO_VERIFICACAO_REPLICA
+        verificar = vencida and not _replica["verificando"]
+        if verificar:
+            _replica["verificando"] = True
+        usar = _replica["usar"]
+
+    if verificar:
+        atraso, erro = None, None
+        try:
+            if _engine_leitura is None:
+                try:
+                    print(f"DEBUG: Réplica de leitura em {DB_HOST_LEITURA}:{DB_PORT_LEITURA} db={DB_NAME}")
+                    # pool_pre_ping: conexões derrubadas por reinício da réplica são descartadas
+                    _engine_leitura = create_engine(DATABASE_URL_LEITURA, pool_pre_ping=True,
+                                                    connect_args={"connect_timeout": TIMEOUT_CONEXAO_REPLICA_S})
+                except Exception as e:
+                    erro = str(e)
+            if _engine_leitura is not None:
+                atraso, erro = _verificar_replica(_engine_leitura)
+            usar = erro is None and atraso <= LIMITE_ATRASO_REPLICA_S
+            with _replica_lock:
+                if usar != _replica["usar"] or _replica["verificado_em"] is None:
+                    motivo = f"erro: {erro}" if erro else f"atraso {atraso:.1f}s (limite {LIMITE_ATRASO_REPLICA_S:.0f}s)"
+                    print(f"Leituras {'na réplica' if usar else 'no primário'} ({motivo})")
+                _replica.update(usar=usar, verificado_em=time.monotonic(), atraso=atraso)
+        finally:
+            # Libera a próxima verificação mesmo se esta falhar de forma inesperada
+            with _replica_lock:
+                _replica["verificando"] = False
+
+    return _engine_leitura if usar else obter_conexao()
+
+def executar_consulta(sql, params=None, registrar=True, preparar=False, primario=False, colunar=False):
+    """
+    Executa uma consulta de leitura e retorna um DataFrame (None em caso de erro).
+    registrar=False não grava a consulta em consultas_log (uso interno/administrativo).
+    preparar=True usa prepared statement (servicos/planos.py) para SQL que se repete, como o das visões.
+    Vai para a réplica de leitura quando configurada; primario=True força o primário
+    (dados recém-gravados pela própria aplicação, como as visões).
+    colunar=True lê pelo motor colunar (ADBC/COPY) resultados potencialmente grandes, como os do playground.
+    """
     # SEGURANÇA: Validar se é apenas leitura
     sql_upper = sql.strip().upper()
     if not (sql_upper.startswith("SELECT") or sql_upper.startswith("WITH")):
         print(f"BLOQUEIO DE SEGURANÇA: Query tentou executar comando não permitido: {sql[:50]}...")
         return None
 
-    engine = obter_conexao()
+    engine = obter_conexao() if primario else obter_conexao_leitura()
     if not engine:
         return None
+    inicio = time.perf_counter()
     try:
-        # Wrap em text() para evitar problemas com % (percentagem) sendo interpretado como placeholder
-        # e para compatibilidade com SQLAlchemy 2.0+
-        return pd.read_sql(text(sql), engine, params=params)
+        # Leitura colunar (Arrow) quando disponível; o fallback usa pd.read_sql com text(),
+        # que evita problemas com % (percentagem) sendo interpretado como placeholder
+        with metricas.medir("executar_consulta") as span:
+            # Planos são registrados no primário, mesmo quando a consulta roda na réplica
+            df = planos.ler_preparada(engine, sql, params or {}, escrita=obter_conexao()) if preparar else None
+            if df is not None:
+                span["motor"] = "preparada"
+            else:
+                df, span["motor"] = leitor_sql.ler_sql(engine, sql, params, colunar=colunar)
+            # Texto em string Arrow: resultados grandes do playground ocupam bem menos memória (e cache)
+            df = tipos.compactar_resultado(df)
+            span["linhas"] = len(df)
+        if registrar:
+            log_consultas.registrar(sql, params, (time.perf_counter() - inicio) * 1000, len(df))
+        return df
     except Exception as e:
         print(f"Erro SQL: {e}")
+        if registrar:
+            log_consultas.registrar(sql, params, (time.perf_counter() - inicio) * 1000, None, erro=str(e))
         return None
 
-def salvar_visao(nome, prompt, estrutura_json):
+def obter_catalogo():
+    """
+    Retorna o catálogo de metadados mantido pelo ETL: {tabela: {linhas, data_min, data_max, carregado_em, versao_carga}}.
+    Fica em cache no processo e só é relido quando a versão de carga muda
+    (a versão é consultada no máximo a cada INTERVALO_VERIFICACAO_CATALOGO segundos).
+    """
+    global _catalogo
+    with _catalogo_lock:
+        agora = time.monotonic()
+        if _catalogo is not None and agora - _catalogo['verificado_em'] < INTERVALO_VERIFICACAO_CATALOGO:
+            return _catalogo['tabelas']
+
+        df_versao = executar_consulta("SELECT MAX(versao_carga) AS versao FROM catalogo_tabelas", registrar=False)
+        versao = None
+        if df_versao is not None and not df_versao.empty:
+            versao = df_versao.iloc[0]['versao']
+            versao = None if pd.isna(versao) else int(versao)
+
+        if _catalogo is None or versao != _catalogo['versao']:
+            tabelas = {}
+            df = executar_consulta("SELECT tabela, linhas, data_min, data_max, carregado_em, versao_carga FROM catalogo_tabelas", registrar=False)
+            if df is not None:
+                tabelas = {row['tabela']: row.drop('tabela').to_dict() for _, row in df.iterrows()}
+            elif df_versao is None:
+                # Banco carregado antes do catálogo existir: calcula os limites uma vez por intervalo
+                df_datas = executar_consulta("SELECT COUNT(*) AS linhas, MIN(criado_em) AS data_min, MAX(criado_em) AS data_max FROM pedidos", registrar=False)
+                if df_datas is not None and not df_datas.empty:
+                    tabelas = {'pedidos': df_datas.iloc[0].to_dict()}
+            _catalogo = {'versao': versao, 'tabelas': tabelas}
+
+        _catalogo['verificado_em'] = agora
+        return _catalogo['tabelas']
+
+def salvar_visao(nome, prompt, estrutura_json, dono=None):
+    """Cria uma visão e retorna o id. Versão, índices de busca e atualizado_em vêm do gatilho do banco."""
     engine = obter_conexao()
     import json
     with engine.connect() as conn:
-        conn.execute(
-            text("INSERT INTO visoes_dashboard (nome, descricao_prompt, estrutura_json) VALUES (:nome, :prompt, :json)"),
-            {"nome": nome, "prompt": prompt, "json": json.dumps(estrutura_json)}
-        )
+        id_visao = conn.execute(
+            text("INSERT INTO visoes_dashboard (nome, descricao_prompt, estrutura_json, dono) VALUES (:nome, :prompt, :json, :dono) RETURNING id"),
+            {"nome": nome, "prompt": prompt, "json": json.dumps(estrutura_json), "dono": dono or DONO_PADRAO}
+        ).scalar()
         conn.commit()
+    _compilar_planos(id_visao, estrutura_json)
+    return id_visao
+
+def _compilar_planos(id_visao, estrutura_json):
+    # Falha ao compilar não impede salvar a visão: o plano é refeito na primeira execução
+    try:
+        planos.compilar_visao(obter_conexao(), id_visao, estrutura_json)
+    except Exception as e:
+        print(f"Erro ao compilar planos da visão {id_visao}: {e}")
+
+def listar_visoes(dono=None):
+    """
+    Catálogo leve das visões (sem o JSON): id, nome, dono, versao, atualizado_em, total_componentes.
+    O JSON de uma visão é lido sob demanda com carregar_visao(id, versao).
+    """
+    filtro = "WHERE dono = :dono" if dono else ""
+    sql = f"SELECT id, nome, dono, versao, atualizado_em, total_componentes FROM visoes_dashboard {filtro} ORDER BY id DESC"
+    # Visões no primário: logo após salvar/editar, a réplica pode ainda não ter a nova versão
+    return executar_consulta(sql, {"dono": dono} if dono else None, registrar=False, primario=True)
+
+def buscar_visoes(termo=None, tipo=None, dono=None):
+    """
+    Catálogo das visões com componentes que usam a tabela/coluna `termo` e/ou do tipo `tipo`
+    (índices GIN em tabelas, colunas e estrutura_json).
+    """
+    condicoes, params = [], {}
+    if termo:
+        # Tabelas ficam em minúsculas; colunas, como escritas nos eixos
+        condicoes.append("(tabelas @> ARRAY[lower(CAST(:termo AS TEXT))] OR colunas @> ARRAY[CAST(:termo AS TEXT)])")
+        params["termo"] = termo.strip()
+    if tipo:
+        import json
+        condicoes.append("estrutura_json @> CAST(:filtro_tipo AS JSONB)")
+        params["filtro_tipo"] = json.dumps({"componentes": [{"tipo": tipo}]})
+    if dono:
+        condicoes.append("dono = :dono")
+        params["dono"] = dono
+    filtro = ("WHERE " + " AND ".join(condicoes)) if condicoes else ""
+    sql = f"SELECT id, nome, dono, versao, atualizado_em, total_componentes FROM visoes_dashboard {filtro} ORDER BY id DESC"
+    return executar_consulta(sql, params or None, registrar=False, primario=True)
 
-def listar_visoes():
-    sql = "SELECT id, nome, descricao_prompt, estrutura_json FROM visoes_dashboard ORDER BY id DESC"
-    return executar_consulta(sql)
+def carregar_visao(id_visao, versao=None):
+    """
+    Lê uma visão completa (dict com id, nome, descricao_prompt, estrutura_json, dono, versao).
+    Com a versão do catálogo, reaproveita o cache do processo: a chave (id, versao) muda a cada alteração.
+    """
+    if versao is not None:
+        with _visoes_lock:
+            visao = _visoes_cache.get((int(id_visao), int(versao)))
+        if visao is not None:
+            return visao
 
-def atualizar_visao(id_visao, nome, prompt, estrutura_json):
+    df = executar_consulta(
+        "SELECT id, nome, descricao_prompt, estrutura_json, dono, versao FROM visoes_dashboard WHERE id = :id",
+        {"id": int(id_visao)}, registrar=False, primario=True
+    )
+    if df is None or df.empty:
+        return None
+
+    visao = df.iloc[0].to_dict()
+    visao["id"], visao["versao"] = int(visao["id"]), int(visao["versao"])
+    if isinstance(visao["estrutura_json"], str):
+        import json
+        visao["estrutura_json"] = json.loads(visao["estrutura_json"])
+
+    with _visoes_lock:
+        _visoes_cache[(visao["id"], visao["versao"])] = visao
+        while len(_visoes_cache) > LIMITE_CACHE_VISOES:
+            _visoes_cache.pop(next(iter(_visoes_cache)))
+    return visao
+
+def ranking_custo_visoes(dias=7):
+    """
+    Visões ordenadas pelo custo acumulado das suas consultas (consultas_log) nos últimos N dias.
+    O peso compensa a amostragem das consultas rápidas.
+    """
+    sql = """
+        SELECT
+            l.id_visao,
+            COALESCE(v.nome, '(sem visão)') AS nome_visao,
+            ROUND(SUM(l.duracao_ms * l.peso)::numeric / 1000, 2) AS custo_total_s,
+            ROUND(SUM(l.peso)) AS execucoes_estimadas,
+            ROUND(AVG(l.duracao_ms)::numeric, 1) AS media_ms,
+            ROUND(PERCENTILE_CONT(0.95) WITHIN GROUP (ORDER BY l.duracao_ms)::numeric, 1) AS p95_ms,
+            COUNT(DISTINCT l.fingerprint) AS consultas_distintas,
+            COUNT(*) FILTER (WHERE l.erro IS NOT NULL) AS erros
+        FROM consultas_log l
+        LEFT JOIN visoes_dashboard v ON v.id = l.id_visao
+        WHERE l.executado_em >= NOW() - make_interval(days => :dias)
+        GROUP BY l.id_visao, v.nome
+        ORDER BY custo_total_s DESC
+    """
+    return executar_consulta(sql, {"dias": int(dias)}, registrar=False)
+
+def consultas_mais_lentas(dias=7, limite=20):
+    """Fingerprints com maior custo acumulado, com o último plano conhecido."""
+    sql = """
+        SELECT
+            fingerprint,
+            MIN(sql_normalizado) AS sql_normalizado,
+            ROUND(SUM(duracao_ms * peso)::numeric / 1000, 2) AS custo_total_s,
+            ROUND(MAX(duracao_ms)::numeric, 1) AS max_ms,
+            ROUND(AVG(linhas)) AS media_linhas,
+            COUNT(DISTINCT plan_hash) AS planos_distintos,
+            ARRAY_AGG(DISTINCT id_visao) FILTER (WHERE id_visao IS NOT NULL) AS visoes
+        FROM consultas_log
+        WHERE executado_em >= NOW() - make_interval(days => :dias)
+        GROUP BY fingerprint
+        ORDER BY custo_total_s DESC
+        LIMIT :limite
+    """
+    return executar_consulta(sql, {"dias": int(dias), "limite": int(limite)}, registrar=False)
+
+def atualizar_visao(id_visao, nome, prompt, estrutura_json, versao=None):
+    """
+    Atualiza uma visão e retorna a nova versão.
+    Com `versao` (a lida antes da edição), só grava se ninguém alterou a visão nesse meio tempo;
+    caso contrário levanta ValueError.
+    """
     engine = obter_conexao()
     import json
     with engine.connect() as conn:
-        conn.execute(
-            text("UPDATE visoes_dashboard SET nome = :nome, descricao_prompt = :prompt, estrutura_json = :json WHERE id = :id"),
-            {"nome": nome, "prompt": prompt, "json": json.dumps(estrutura_json), "id": id_visao}
-        )
+        nova_versao = conn.execute(
+            text("""
+                UPDATE visoes_dashboard SET nome = :nome, descricao_prompt = :prompt, estrutura_json = :json
+                WHERE id = :id AND (CAST(:versao AS INTEGER) IS NULL OR versao = :versao)
+                RETURNING versao
+            """),
+            {"nome": nome, "prompt": prompt, "json": json.dumps(estrutura_json), "id": id_visao, "versao": versao}
+        ).scalar()
         conn.commit()
+    if nova_versao is None:
+        raise ValueError(f"A visão {id_visao} foi alterada ou excluída por outra sessão desde a versão {versao}. Recarregue antes de salvar.")
+    _compilar_planos(id_visao, estrutura_json)
+    return nova_versao
 
 def deletar_visao(id_visao):
     engine = obter_conexao()
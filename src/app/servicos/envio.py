@@ -0,0 +1,78 @@
+import os
+import io
+import json
+import gzip
+
+import pandas as pd
+
+# Dados de cada componente no envio para o n8n:
+#   colunas   -> metadados com JSON por coluna ({"coluna": [valores]}), até LIMITE_LINHAS linhas (padrão)
+#   registros -> formato antigo: 'dados_raw' com uma lista de dicts por linha, sem limite
+FORMATO_DADOS = os.getenv("FORMATO_DADOS_ENVIO", "colunas")
+LIMITE_LINHAS = int(os.getenv("LIMITE_LINHAS_ENVIO", "500"))
+# Anexo com os dados completos, um arquivo por componente: nenhum | json.gz | parquet
+ANEXO_DADOS = os.getenv("ANEXO_DADOS_ENVIO", "nenhum")
+
+
+def _valores(serie):
+    # to_json já converte datas (ISO), NaN (null) e tipos numpy/Arrow sem passar por objetos Python
+    return json.loads(serie.to_json(orient="values", date_format="iso"))
+
+
+def resumo_dataframe(df):
+    """Estatísticas por coluna: min/max/média/soma para números, distintos e mais frequentes para o resto."""
+    resumo = {}
+    for col in df.columns:
+        serie = df[col]
+        estat = {"nulos": int(serie.isna().sum())}
+        if pd.api.types.is_numeric_dtype(serie) and not pd.api.types.is_bool_dtype(serie):
+            descr = serie.agg(["min", "max", "mean", "sum"])
+            estat.update(dict(zip(["min", "max", "media", "soma"], _valores(descr))))
+        elif pd.api.types.is_datetime64_any_dtype(serie):
+            estat.update(dict(zip(["min", "max"], _valores(pd.Series([serie.min(), serie.max()])))))
+        else:
+            contagem = serie.value_counts().head(5)
+            estat["distintos"] = int(serie.nunique())
+            estat["mais_frequentes"] = dict(zip(contagem.index.astype(str), contagem.astype(int).tolist()))
+        resumo[str(col)] = estat
+    return resumo
+
+
+def dados_compactos(df, limite=None):
+    """
+    Dados de um componente em JSON por coluna, com no máximo `limite` linhas.
+    Quando corta, inclui o resumo estatístico da tabela inteira.
+    """
+    limite = LIMITE_LINHAS if limite is None else limite
+    recorte = df.iloc[:limite]
+    dados = {
+        "linhas_total": len(df),
+        "linhas": len(recorte),
+        "truncado": len(df) > len(recorte),
+        "colunas": {str(col): _valores(recorte[col]) for col in recorte.columns},
+    }
+    if dados["truncado"]:
+        dados["resumo"] = resumo_dataframe(df)
+    return dados
+
+
+def anexo_dados(df, nome):
+    """Arquivo com os dados completos do componente (multipart), conforme ANEXO_DADOS, ou None."""
+    if ANEXO_DADOS == "parquet":
+        buf = io.BytesIO()
+        df.to_parquet(buf, index=False, compression="zstd")
+        buf.seek(0)
+        return (f"{nome}.parquet", buf, "application/vnd.apache.parquet")
+    if ANEXO_DADOS == "json.gz":
+        corpo = df.to_json(orient="split", index=False, date_format="iso").encode()
+        return (f"{nome}.json.gz", io.BytesIO(gzip.compress(corpo, compresslevel=6)), "application/gzip")
+    return None
+
+
+def metadados_dados(df):
+    """Campos de dados de um item de metadados no formato configurado."""
+    if df is None:
+        return {}
+    if FORMATO_DADOS == "registros":
+        return {"dados_raw": json.loads(df.to_json(orient="records", date_format="iso"))}
+    return {"dados": dados_compactos(df)}
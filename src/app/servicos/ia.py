@@ -1,11 +1,12 @@
 import os
-from google import genai
 import json
 
 class ServicoIA:
     def __init__(self):
         api_key = os.getenv("GOOGLE_API_KEY")
         if api_key:
+            # Import tardio: google.genai só é carregado quando a IA é realmente usada
+            from google import genai
             self.client = genai.Client(api_key=api_key)
             self.model_id = os.getenv("MODEL_NAME")
             self.ativo = True
@@ -23,7 +24,19 @@ class ServicoIA:
         Tabelas do Banco de Dados PostgreSQL:
         1. pedidos (id_pedido, cliente_ref, criado_em, status, valor_total, custo_frete, cidade_cliente, estado_cliente, total_itens_preco, desconto_implicito, desconto_perc, mes_pedido, ano_pedido, dia_semana)
         2. itens (id, id_pedido, id_produto, id_material, nome_material, categoria, preco, status)
-        3. suprimentos (id_suprimento, id_material, nome_material, quantidade, tempo_entrega, id_fabrica)
+        3. suprimentos (id_suprimento, id_material, nome_material, quantidade, tempo_entrega, id_fabrica, descontinuado, reposicao, id_centro_estoque, deve_vender, id_localizacao_material)
+           -> uma linha por material e centro de estoque; para análises por centro agrupe por `id_centro_estoque`.
+        4. disponibilidade_materiais (id_material, nome_material, estoque_total, qtd_fabricas, tempo_entrega_min, tempo_entrega_medio, descontinuado, demanda_30d, demanda_90d, cobertura_dias)
+           -> UMA linha por material (estoque somado entre fábricas). Use esta tabela para estoque e tempo de entrega, em vez de `suprimentos`.
+        5. localidades (id_localidade, estado, cidade, cidade_normalizada, prefixo_cep)
+           -> cidade/estado normalizados (uma linha por cidade). `pedidos.id_localidade` aponta para ela.
+        6. pedidos_geo_diario (dia, id_localidade, pedidos, valor_total, custo_frete, total_itens_preco, desconto_implicito, contagem_itens, peso_kg)
+           -> pedidos já somados por dia e localidade. Para análises por cidade/estado, use esta tabela com JOIN em `localidades`
+              e filtre por `dia BETWEEN :data_inicio AND :data_fim` (dispensa o filtro em `pedidos.criado_em`).
+        7. cubo_frete (dia, transportadora, estado, faixa_peso, ordem_faixa_peso, pedidos, frete_soma, frete_soma_quadrados, peso_soma, peso_soma_quadrados, itens_soma, itens_soma_quadrados)
+           -> frete já somado por transportadora x estado x faixa de peso x dia. Para frete/peso por transportadora, estado ou faixa de peso, use esta tabela:
+              média = SUM(frete_soma) / SUM(pedidos); custo por kg = SUM(frete_soma) / SUM(peso_soma);
+              variância = (SUM(frete_soma_quadrados) - SUM(frete_soma)^2 / SUM(pedidos)) / (SUM(pedidos) - 1). Filtre por `dia`, como em `pedidos_geo_diario`.
         """
 
         prompt_sistema = f"""
@@ -42,6 +55,7 @@ class ServicoIA:
            - Se a consulta for na tabela `itens` ou `suprimentos`, FAÇA JOIN com `pedidos` para poder filtrar pela data do pedido!
            - Exemplo: `SELECT i.nome, count(*) FROM itens i JOIN pedidos p ON i.id_pedido = p.id_pedido WHERE p.criado_em BETWEEN :data_inicio AND :data_fim GROUP BY i.nome`
            - Isso garante que o usuário possa filtrar "Top Produtos" por mês/ano.
+           - Exceção: consultas em `pedidos_geo_diario` e `cubo_frete` (já agregadas por dia) usam `WHERE dia BETWEEN :data_inicio AND :data_fim`.
         5. **CRÍTICO - LIMITE DE DADOS**:
            - Para gráficos de barra com categorias (ex: produtos, cidades), SEMPRE use `LIMIT 10` ou `LIMIT 15`.
            - Para variáveis numéricas contínuas (ex: desconto_implicito, valor_total), **JAMAIS** agrupe pelo valor exato ou arredondado (ROUND).
@@ -65,13 +79,21 @@ class ServicoIA:
 
         8. **EXEMPLOS CHAVE (TEMPLATES DE SQL)**:
            - **Analise Complexa (Join Multiplo)**: "Faturamento e Tempo de Entrega por Estado"
-             `SELECT p.estado_cliente, SUM(p.valor_total) AS faturamento, ROUND(AVG(s.tempo_entrega), 1) AS tempo_entrega_medio 
+             `SELECT p.estado_cliente, SUM(i.preco) AS faturamento, ROUND(AVG(d.tempo_entrega_medio), 1) AS tempo_entrega_medio 
               FROM pedidos p 
               JOIN itens i ON p.id_pedido = i.id_pedido 
-              JOIN suprimentos s ON i.id_material = s.id_material 
+              JOIN disponibilidade_materiais d ON i.id_material = d.id_material 
               WHERE p.criado_em BETWEEN :data_inicio AND :data_fim 
               GROUP BY p.estado_cliente 
               ORDER BY faturamento ASC LIMIT 15`
+             -> **NUNCA** faça JOIN de `itens` com `suprimentos` (vários registros por material duplicam as somas).
+
+           - **Estoque Baixo (Tabela)**: "Materiais vendidos no período com menor cobertura de estoque"
+             `SELECT d.nome_material, d.estoque_total, d.demanda_30d, d.cobertura_dias, d.tempo_entrega_min 
+              FROM disponibilidade_materiais d 
+              WHERE NOT d.descontinuado 
+                AND d.id_material IN (SELECT i.id_material FROM itens i JOIN pedidos p ON i.id_pedido = p.id_pedido WHERE p.criado_em BETWEEN :data_inicio AND :data_fim) 
+              ORDER BY d.cobertura_dias ASC NULLS LAST LIMIT 15`
 
            - **Distribuição (Histograma)**: "Qual faixa de ticket médio fatura mais?"
              `SELECT 
@@ -88,12 +110,21 @@ class ServicoIA:
               ORDER BY 1`
            
            - **Top Ranking Simples**: "Top 10 Cidades que mais compram"
-             `SELECT cidade_cliente, COUNT(*) as total_pedidos 
-              FROM pedidos 
-              WHERE criado_em BETWEEN :data_inicio AND :data_fim 
-              GROUP BY cidade_cliente 
+             `SELECT l.cidade || ' - ' || l.estado AS cidade, SUM(g.pedidos) AS total_pedidos 
+              FROM pedidos_geo_diario g 
+              JOIN localidades l ON l.id_localidade = g.id_localidade 
+              WHERE g.dia BETWEEN :data_inicio AND :data_fim 
+              GROUP BY l.id_localidade, l.cidade, l.estado 
               ORDER BY total_pedidos DESC LIMIT 10`
 
+           - **Eficiência de Frete (Cubo)**: "Custo de frete por kg por transportadora"
+             `SELECT transportadora, ROUND(SUM(frete_soma) / NULLIF(SUM(peso_soma), 0), 2) AS custo_por_kg, SUM(pedidos) AS pedidos 
+              FROM cubo_frete 
+              WHERE dia BETWEEN :data_inicio AND :data_fim 
+              GROUP BY transportadora 
+              ORDER BY custo_por_kg DESC`
+             -> Para faixas de peso no eixo X, agrupe por `faixa_peso, ordem_faixa_peso` e ordene por `ordem_faixa_peso`.
+
            - **Relacionamento/Trade-off (Gráfico Combinado)**: "Volume de Vendas vs Ticket Médio por Mês"
              `SELECT TO_CHAR(criado_em, 'YYYY-MM') as mes, COUNT(*) as total_vendas, AVG(valor_total) as ticket_medio 
               FROM pedidos 
@@ -0,0 +1,201 @@
+import os
+import json
+import threading
+import importlib.util
+from io import BytesIO
+
+import pandas as pd
+from sqlalchemy import text
+
+# Motor de leitura das consultas:
+#   auto       -> read_sql nas consultas comuns (poucas linhas: os caminhos colunares custam conexões e
+#                 round trips a mais); ADBC ou COPY (o primeiro disponível) só nas leituras colunar=True,
+#                 como os resultados grandes do playground/explorador
+#   adbc | connectorx | copy -> força o motor em todas as consultas
+#   read_sql   -> caminho antigo (pandas monta o DataFrame linha a linha a partir de objetos Python)
+# connectorx fica fora do auto: colunas JSON/JSONB chegam como texto em vez de dict (ex: estrutura_json).
+MOTOR = os.getenv("MOTOR_CONSULTA", "auto")
+ORDEM_AUTO = ["adbc", "copy"]
+
+# OIDs do Postgres -> tipos Arrow usados na leitura do CSV do COPY (demais tipos chegam como texto)
+TIPOS_OID = {
+    16: "bool_", 20: "int64", 21: "int16", 23: "int32",
+    700: "float32", 701: "float64", 1700: "float64",  # NUMERIC vira float, como no read_sql (coerce_float)
+    25: "string", 1042: "string", 1043: "string",
+    1082: "date32", 1114: "timestamp", 1184: "timestamptz",
+}
+# JSON/JSONB: o psycopg2 devolve dict/list; os caminhos Arrow recebem texto e decodificam
+OIDS_JSON = {114, 3802}
+
+_indisponiveis = set()
+_avisados = set()
+_local = threading.local()
+
+
+def _pacote_disponivel(motor):
+    pacote = {"adbc": "adbc_driver_postgresql", "connectorx": "connectorx", "copy": "pyarrow"}[motor]
+    return motor not in _indisponiveis and importlib.util.find_spec(pacote) is not None
+
+
+def motores_ativos(colunar=False):
+    if MOTOR == "read_sql" or (MOTOR == "auto" and not colunar):
+        return []
+    candidatos = ORDEM_AUTO if MOTOR == "auto" else [MOTOR]
+    return [m for m in candidatos if _pacote_disponivel(m)]
+
+
+def _url(engine):
+    # connectorx/ADBC usam a URI da libpq (sem o sufixo de driver do SQLAlchemy)
+    return engine.url.set(drivername="postgresql").render_as_string(hide_password=False)
+
+
+def _mogrify(cur, dialeto, sql, params):
+    compilado = text(sql).compile(dialect=dialeto)
+    # Sempre com dict (mesmo vazio) para que o '%%' escapado pelo SQLAlchemy volte a ser '%'
+    return cur.mogrify(compilado.string, params or {}).decode()
+
+
+def sql_literal(engine, sql, params):
+    """
+    Converte o SQL com parâmetros nomeados (:data_inicio) em SQL com os valores já escapados pelo psycopg2.
+    Necessário para COPY (não aceita parâmetros) e para os drivers Arrow.
+    """
+    conn = engine.raw_connection()
+    try:
+        with conn.cursor() as cur:
+            return _mogrify(cur, engine.dialect, sql, params)
+    finally:
+        conn.close()
+
+
+def _erro_da_consulta(erro):
+    """
+    Erro do próprio SQL (sintaxe, tabela inexistente, conversão de dados): repetir no read_sql só dobraria o custo.
+    Pelos nomes do DB-API, que valem para o psycopg2 (inclusive subclasses de psycopg2.errors) e para o ADBC.
+    """
+    return any(c.__name__ in ("ProgrammingError", "DataError") for c in type(erro).__mro__)
+
+
+def _para_pandas(tabela, colunas_json=()):
+    """Tabela Arrow -> DataFrame com textos em string Arrow (sem cópia para objetos Python)."""
+    import pyarrow as pa
+    mapa = {pa.string(): pd.StringDtype("pyarrow"), pa.large_string(): pd.StringDtype("pyarrow")}
+    df = tabela.to_pandas(types_mapper=mapa.get)
+    for col in colunas_json:
+        df[col] = df[col].astype(object).map(json.loads, na_action="ignore")
+    return df
+
+
+def _ler_adbc(engine, sql, params):
+    import adbc_driver_postgresql.dbapi as adbc
+    sql = sql_literal(engine, sql, params)
+    # Uma conexão ADBC por thread, reaproveitada entre consultas
+    url = _url(engine)
+    conexoes = getattr(_local, "adbc", None)
+    if conexoes is None:
+        conexoes = _local.adbc = {}
+    if url not in conexoes:
+        conexoes[url] = adbc.connect(url, autocommit=True)
+    conn = conexoes[url]
+    try:
+        with conn.cursor() as cur:
+            cur.execute(sql)
+            tabela = cur.fetch_arrow_table()
+        # O driver ADBC anota o tipo original do Postgres nos metadados de cada campo
+        colunas_json = [
+            campo.name for campo in tabela.schema
+            if (campo.metadata or {}).get(b"ADBC:postgresql:typname") in (b"json", b"jsonb")
+        ]
+        return _para_pandas(tabela, colunas_json)
+    except Exception:
+        conexoes.pop(url, None)
+        conn.close()
+        raise
+
+
+def _ler_connectorx(engine, sql, params):
+    import connectorx as cx
+    return _para_pandas(cx.read_sql(_url(engine), sql_literal(engine, sql, params), return_type="arrow"))
+
+
+def _tipo_arrow(oid):
+    import pyarrow as pa
+    nome = TIPOS_OID.get(oid, "string")
+    if nome == "timestamp":
+        return pa.timestamp("us")
+    if nome == "timestamptz":
+        return pa.timestamp("us", tz="UTC")
+    return getattr(pa, nome)()
+
+
+def _ler_copy(engine, sql, params):
+    """
+    COPY ... TO STDOUT em CSV, convertido pelo parser multithread do Arrow com os tipos da consulta.
+    Parâmetros, tipos e dados usam a mesma conexão do pool.
+    """
+    import pyarrow.csv as pcsv
+    conn = engine.raw_connection()
+    try:
+        with conn.cursor() as cur:
+            # Quebras de linha em volta: um "-- comentário" no fim do SQL não engole o parêntese
+            sql = _mogrify(cur, engine.dialect, sql.strip().rstrip(";"), params)
+            sql = f"(\n{sql}\n)"
+            # Descobre nomes e tipos das colunas sem trazer dados
+            cur.execute(f"SELECT * FROM {sql} AS _consulta LIMIT 0")
+            colunas = [(d.name, d.type_code) for d in cur.description]
+            nomes = [nome for nome, _ in colunas]
+            if len(set(nomes)) != len(nomes):
+                raise ValueError("Colunas com nomes repetidos não são suportadas pelo COPY")
+
+            buffer = BytesIO()
+            cur.copy_expert(f"COPY {sql} TO STDOUT WITH (FORMAT csv, HEADER false)", buffer)
+        conn.rollback()
+    finally:
+        conn.close()
+
+    tipos_arrow = {nome: _tipo_arrow(oid) for nome, oid in colunas}
+    if buffer.tell() == 0:
+        # Resultado vazio: o parser do Arrow não aceita arquivo vazio
+        import pyarrow as pa
+        return _para_pandas(pa.schema(list(tipos_arrow.items())).empty_table(), [])
+
+    buffer.seek(0)
+    tabela = pcsv.read_csv(
+        buffer,
+        read_options=pcsv.ReadOptions(column_names=nomes),
+        # Uma única coluna NULL gera linha vazia, que precisa continuar contando como linha
+        parse_options=pcsv.ParseOptions(ignore_empty_lines=False),
+        convert_options=pcsv.ConvertOptions(
+            column_types=tipos_arrow,
+            # No CSV do COPY, NULL é campo vazio e texto vazio é "" (entre aspas)
+            null_values=[""], strings_can_be_null=True, quoted_strings_can_be_null=False,
+            true_values=["t"], false_values=["f"],
+        ),
+    )
+    return _para_pandas(tabela, [nome for nome, oid in colunas if oid in OIDS_JSON])
+
+
+LEITORES = {"adbc": _ler_adbc, "connectorx": _ler_connectorx, "copy": _ler_copy}
+
+
+def ler_sql(engine, sql, params=None, colunar=False):
+    """
+    Executa uma consulta e retorna (DataFrame, motor usado).
+    colunar=True: resultado potencialmente grande, lido pelo motor colunar no modo auto.
+    Se o motor colunar falhar por conta própria, usa pd.read_sql (caminho original); erros do SQL sobem direto.
+    """
+    motores = motores_ativos(colunar)
+    if motores:
+        motor = motores[0]
+        try:
+            return LEITORES[motor](engine, sql, params), motor
+        except ImportError:
+            _indisponiveis.add(motor)
+        except Exception as e:
+            if _erro_da_consulta(e):
+                raise
+            if motor not in _avisados:
+                _avisados.add(motor)
+                print(f"Leitura via {motor} falhou, usando read_sql: {e}")
+
+    return pd.read_sql(text(sql), engine, params=params), "read_sql"
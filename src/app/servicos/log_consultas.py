@@ -0,0 +1,151 @@
+import os
+import re
+import json
+import queue
+import time
+import random
+import hashlib
+import threading
+import contextvars
+from contextlib import contextmanager
+from datetime import datetime
+from sqlalchemy import text
+
+# Fração das consultas rápidas que é registrada (consultas lentas são sempre registradas)
+TAXA_AMOSTRAGEM = float(os.getenv("LOG_CONSULTAS_AMOSTRAGEM", "0.2"))
+# A partir desta duração a consulta é considerada lenta: sempre registrada e com hash do plano
+LIMIAR_LENTA_MS = float(os.getenv("LOG_CONSULTAS_LIMIAR_MS", "500"))
+# Escrita em lote: grava quando juntar TAMANHO_LOTE registros ou a cada INTERVALO_FLUSH segundos
+TAMANHO_LOTE = 50
+INTERVALO_FLUSH = 5
+# Limite da fila em memória; acima disso registros são descartados para não pressionar o app
+MAX_FILA = 10000
+
+_fila = queue.Queue(maxsize=MAX_FILA)
+_writer = None
+_writer_lock = threading.Lock()
+_contexto = contextvars.ContextVar("contexto_consulta", default={})
+
+
+@contextmanager
+def contexto_consulta(id_visao=None, id_componente=None):
+    """Associa as consultas executadas dentro do bloco a uma visão/componente."""
+    token = _contexto.set({
+        "id_visao": None if id_visao is None else int(id_visao),
+        "id_componente": id_componente
+    })
+    try:
+        yield
+    finally:
+        _contexto.reset(token)
+
+
+def normalizar_sql(sql):
+    """
+    Fingerprint textual da consulta: literais viram '?', espaços são colapsados e tudo vai para minúsculas.
+    Consultas que diferem só em valores caem no mesmo fingerprint.
+    """
+    s = re.sub(r"'(?:[^']|'')*'", "?", sql)
+    s = re.sub(r"\b\d+(?:\.\d+)?\b", "?", s)
+    s = re.sub(r"\s+", " ", s).strip().rstrip(";").strip()
+    return s.lower()
+
+
+def fingerprint(sql_normalizado):
+    return hashlib.md5(sql_normalizado.encode()).hexdigest()
+
+
+def _hash_plano(plano):
+    """Hash da forma do plano (tipos de nó, relações e índices), ignorando custos e estimativas."""
+    def forma(no):
+        return [
+            no.get("Node Type"), no.get("Relation Name"), no.get("Index Name"),
+            [forma(filho) for filho in no.get("Plans", [])]
+        ]
+    return hashlib.md5(json.dumps(forma(plano[0]["Plan"])).encode()).hexdigest()[:16]
+
+
+def registrar(sql, params, duracao_ms, linhas, erro=None):
+    """
+    Enfileira o registro de uma consulta (não bloqueia). Consultas rápidas são amostradas;
+    o campo 'peso' (1/taxa) permite estimar o custo total sem viés.
+    """
+    lenta = duracao_ms >= LIMIAR_LENTA_MS or erro is not None
+    if not lenta and random.random() >= TAXA_AMOSTRAGEM:
+        return
+
+    sql_normalizado = normalizar_sql(sql)
+    contexto = _contexto.get()
+    registro = {
+        "executado_em": datetime.now(),
+        "fingerprint": fingerprint(sql_normalizado),
+        "sql_normalizado": sql_normalizado,
+        "id_visao": contexto.get("id_visao"),
+        "id_componente": None if contexto.get("id_componente") is None else str(contexto["id_componente"]),
+        "duracao_ms": round(duracao_ms, 2),
+        "linhas": linhas,
+        "peso": 1.0 if lenta else round(1 / TAXA_AMOSTRAGEM, 4),
+        "erro": erro,
+        # Plano só para consultas lentas; o EXPLAIN roda na thread de escrita, fora do caminho da página
+        "_explain": (sql, params) if lenta and erro is None else None,
+    }
+    try:
+        _fila.put_nowait(registro)
+    except queue.Full:
+        return
+    _garantir_writer()
+
+
+def _garantir_writer():
+    global _writer
+    if _writer is not None:
+        return
+    with _writer_lock:
+        if _writer is None:
+            _writer = threading.Thread(target=_loop_writer, name="log-consultas", daemon=True)
+            _writer.start()
+
+
+def _loop_writer():
+    # Import tardio para evitar import circular com o serviço de banco
+    import servicos.banco as banco
+
+    while True:
+        # Espera o primeiro registro e junta os seguintes até encher o lote ou vencer o intervalo
+        lote = [_fila.get()]
+        prazo = time.monotonic() + INTERVALO_FLUSH
+        while len(lote) < TAMANHO_LOTE:
+            restante = prazo - time.monotonic()
+            if restante <= 0:
+                break
+            try:
+                lote.append(_fila.get(timeout=restante))
+            except queue.Empty:
+                break
+
+        try:
+            _gravar_lote(banco.obter_conexao(), lote)
+        except Exception as e:
+            print(f"Erro ao gravar log de consultas: {e}")
+
+
+def _gravar_lote(engine, lote):
+    with engine.connect() as conn:
+        for registro in lote:
+            explain = registro.pop("_explain")
+            registro["plan_hash"] = None
+            if explain:
+                try:
+                    sql, params = explain
+                    plano = conn.execute(text(f"EXPLAIN (FORMAT JSON) {sql}"), params or {}).scalar()
+                    registro["plan_hash"] = _hash_plano(plano if isinstance(plano, list) else json.loads(plano))
+                except Exception:
+                    conn.rollback()
+
+        conn.execute(text("""
+            INSERT INTO consultas_log
+                (executado_em, fingerprint, sql_normalizado, id_visao, id_componente, duracao_ms, linhas, peso, plan_hash, erro)
+            VALUES
+                (:executado_em, :fingerprint, :sql_normalizado, :id_visao, :id_componente, :duracao_ms, :linhas, :peso, :plan_hash, :erro)
+        """), lote)
+        conn.commit()
@@ -0,0 +1,195 @@
+import os
+import json
+import time
+import uuid
+import threading
+import contextvars
+import functools
+from collections import deque
+from contextlib import contextmanager
+
+# Quantos spans manter em memória (os mais antigos são descartados)
+MAX_SPANS = 5000
+
+# Se definido, cada span finalizado é anexado neste arquivo (JSON Lines, estilo OpenTelemetry)
+ARQUIVO_SPANS = os.getenv("METRICAS_ARQUIVO_SPANS")
+
+_spans = deque(maxlen=MAX_SPANS)
+_agregados = {}
+_lock = threading.Lock()
+_span_atual = contextvars.ContextVar("span_atual", default=None)
+
+
+def _chave_rotulos(etapa, atributos):
+    # Só atributos de baixa cardinalidade viram rótulos Prometheus
+    rotulos = {"etapa": etapa}
+    for nome in ("tipo", "cache", "origem"):
+        if atributos.get(nome) is not None:
+            rotulos[nome] = str(atributos[nome])
+    return tuple(sorted(rotulos.items()))
+
+
+def _registrar(span):
+    with _lock:
+        _spans.append(span)
+        chave = _chave_rotulos(span["name"], span["attributes"])
+        agg = _agregados.setdefault(chave, {"count": 0, "sum": 0.0, "linhas": 0, "bytes": 0})
+        agg["count"] += 1
+        agg["sum"] += span["duracao_ms"] / 1000
+        agg["linhas"] += int(span["attributes"].get("linhas") or 0)
+        agg["bytes"] += int(span["attributes"].get("bytes") or 0)
+
+    if ARQUIVO_SPANS:
+        try:
+            with open(ARQUIVO_SPANS, "a") as f:
+                f.write(json.dumps(span, default=str) + "\n")
+        except Exception as e:
+            print(f"Erro ao gravar span: {e}")
+
+
+@contextmanager
+def medir(etapa, **atributos):
+    """
+    Mede a duração de um trecho e registra como span.
+    Spans abertos dentro de outro viram filhos (mesmo trace). O dict retornado aceita
+    atributos extras durante a execução (ex: span['linhas'] = len(df)).
+    """
+    pai = _span_atual.get()
+    span = {
+        "traceId": pai["traceId"] if pai else uuid.uuid4().hex,
+        "spanId": uuid.uuid4().hex[:16],
+        "parentSpanId": pai["spanId"] if pai else None,
+        "name": etapa,
+        "startTimeUnixNano": time.time_ns(),
+        "attributes": dict(atributos),
+    }
+    token = _span_atual.set(span)
+    inicio = time.perf_counter()
+    try:
+        yield span["attributes"]
+    except Exception as e:
+        span["attributes"]["erro"] = str(e)
+        raise
+    finally:
+        span["duracao_ms"] = (time.perf_counter() - inicio) * 1000
+        span["endTimeUnixNano"] = span["startTimeUnixNano"] + int(span["duracao_ms"] * 1e6)
+        _span_atual.reset(token)
+        _registrar(span)
+
+
+def instrumentar(etapa):
+    """Decorator: registra cada chamada da função como um span da etapa."""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with medir(etapa):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def atributo(nome, valor):
+    """Define um atributo no span atual (se houver). Ex: marcar cache miss dentro da função em cache."""
+    span = _span_atual.get()
+    if span is not None:
+        span["attributes"][nome] = valor
+
+
+def trace_atual():
+    span = _span_atual.get()
+    return span["traceId"] if span else None
+
+
+def tamanho_dataframe(df):
+    """Bytes ocupados por um DataFrame (0 se vazio/None)."""
+    if df is None:
+        return 0
+    return int(df.memory_usage(index=True, deep=True).sum())
+
+
+def spans_do_trace(trace_id):
+    with _lock:
+        return [s for s in _spans if s["traceId"] == trace_id]
+
+
+def exportar_prometheus():
+    """Agregados no formato texto de exposição do Prometheus."""
+    with _lock:
+        itens = sorted(_agregados.items())
+
+    def fmt(rotulos):
+        return ",".join(f'{k}="{v}"' for k, v in rotulos)
+
+    linhas = [
+        "# HELP gocase_etapa_duracao_segundos Duração das etapas instrumentadas.",
+        "# TYPE gocase_etapa_duracao_segundos summary",
+    ]
+    for rotulos, agg in itens:
+        linhas.append(f"gocase_etapa_duracao_segundos_count{{{fmt(rotulos)}}} {agg['count']}")
+        linhas.append(f"gocase_etapa_duracao_segundos_sum{{{fmt(rotulos)}}} {agg['sum']:.6f}")
+
+    linhas += [
+        "# HELP gocase_etapa_linhas_total Linhas retornadas pelas etapas.",
+        "# TYPE gocase_etapa_linhas_total counter",
+    ]
+    linhas += [f"gocase_etapa_linhas_total{{{fmt(r)}}} {a['linhas']}" for r, a in itens if a["linhas"]]
+
+    linhas += [
+        "# HELP gocase_etapa_bytes_total Bytes (DataFrame em memória) retornados pelas etapas.",
+        "# TYPE gocase_etapa_bytes_total counter",
+    ]
+    linhas += [f"gocase_etapa_bytes_total{{{fmt(r)}}} {a['bytes']}" for r, a in itens if a["bytes"]]
+    return "\n".join(linhas) + "\n"
+
+
+def exportar_spans(caminho=None, trace_id=None):
+    """
+    Spans em JSON Lines (um span por linha, campos no estilo OpenTelemetry).
+    Sem caminho, retorna o texto; com caminho, grava o arquivo e retorna o caminho.
+    """
+    with _lock:
+        spans = [s for s in _spans if trace_id is None or s["traceId"] == trace_id]
+    conteudo = "".join(json.dumps(s, default=str) + "\n" for s in spans)
+    if caminho is None:
+        return conteudo
+    with open(caminho, "w") as f:
+        f.write(conteudo)
+    return caminho
+
+
+def resumo_por_componente(trace_id):
+    """
+    Consolida os spans de uma renderização de visão por componente:
+    tempo de SQL, linhas, bytes, cache, filtro e renderização.
+    """
+    spans = spans_do_trace(trace_id)
+    filhos = {}
+    for s in spans:
+        filhos.setdefault(s["parentSpanId"], []).append(s)
+
+    def descendentes(span_id):
+        for filho in filhos.get(span_id, []):
+            yield filho
+            yield from descendentes(filho["spanId"])
+
+    linhas = []
+    for comp in (s for s in spans if s["name"] == "componente"):
+        linha = {
+            "componente": comp["attributes"].get("titulo"),
+            "tipo": comp["attributes"].get("tipo"),
+            "total_ms": round(comp["duracao_ms"], 1),
+            "sql_ms": 0.0, "cache": None, "linhas": None, "bytes": None,
+            "filtro_ms": 0.0, "render_ms": 0.0,
+        }
+        for d in descendentes(comp["spanId"]):
+            if d["name"] == "consulta":
+                linha["sql_ms"] += round(d["duracao_ms"], 1)
+                linha["cache"] = d["attributes"].get("cache")
+                linha["linhas"] = d["attributes"].get("linhas")
+                linha["bytes"] = d["attributes"].get("bytes")
+            elif d["name"] == "filtrar_dataframe":
+                linha["filtro_ms"] += round(d["duracao_ms"], 1)
+            elif d["name"] in ("gerar_grafico", "gerar_tabela_imagens"):
+                linha["render_ms"] += round(d["duracao_ms"], 1)
+        linhas.append(linha)
+    return linhas
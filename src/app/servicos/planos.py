@@ -0,0 +1,193 @@
+import os
+import re
+import time
+import hashlib
+import threading
+import datetime
+
+import pandas as pd
+from sqlalchemy import text
+
+# Consultas das visões executadas como prepared statements (PREPARE/EXECUTE), um cache por conexão do pool:
+# o Postgres deixa de analisar e planejar o mesmo SQL a cada renderização do dashboard
+ATIVO = os.getenv("PLANOS_PREPARADOS", "true").lower() == "true"
+
+# Parâmetros globais como o dashboard os envia (st.date_input -> date): tipos usados ao compilar no salvamento,
+# para que o plano registrado seja o mesmo que a renderização vai pedir
+EXEMPLO_PARAMETROS_DASHBOARD = {"data_inicio": datetime.date(2000, 1, 1), "data_fim": datetime.date(2000, 1, 1)}
+
+# Carimbo do esquema: muda quando o ETL altera tabelas/colunas/tipos (recriar com o mesmo esquema não muda)
+SQL_VERSAO_ESQUEMA = """
+    SELECT md5(string_agg(table_name || '.' || column_name || ':' || data_type, ',' ORDER BY table_name, ordinal_position))
+    FROM information_schema.columns
+    WHERE table_schema = 'public'
+"""
+INTERVALO_VERIFICACAO_ESQUEMA = 30
+
+_planos = {}
+_lock = threading.Lock()
+_esquema = {"versao": None, "verificado_em": None}
+_avisados = set()
+
+
+def versao_esquema(engine):
+    """Carimbo atual do esquema, consultado no máximo a cada INTERVALO_VERIFICACAO_ESQUEMA segundos."""
+    with _lock:
+        agora = time.monotonic()
+        if _esquema["verificado_em"] is not None and agora - _esquema["verificado_em"] < INTERVALO_VERIFICACAO_ESQUEMA:
+            return _esquema["versao"]
+    with engine.connect() as conn:
+        versao = conn.execute(text(SQL_VERSAO_ESQUEMA)).scalar()
+    with _lock:
+        _esquema.update(versao=versao, verificado_em=time.monotonic())
+    return versao
+
+
+def _tipo_parametro(valor):
+    """
+    Tipo Postgres deduzido do valor Python. Texto e valor ausente viram 'unknown': o Postgres deduz pelo uso,
+    como faz com o literal do caminho normal ('2025-01-01' comparado a timestamp continua timestamp).
+    """
+    if valor is None or isinstance(valor, str):
+        return "unknown"
+    # datetime antes de date (datetime é subclasse de date); bool antes de int
+    for tipo_py, tipo_pg in ((bool, "boolean"), (int, "bigint"), (float, "double precision"),
+                             (datetime.datetime, "timestamp"), (datetime.date, "date")):
+        if isinstance(valor, tipo_py):
+            return tipo_pg
+    return None
+
+
+def compilar_plano(engine, sql, params=None, versao=None):
+    """
+    SQL com parâmetros nomeados (:data_inicio) -> plano com $1..$n tipados, pronto para PREPARE.
+    Retorna None se algum parâmetro não tiver tipo conhecido (a consulta segue pelo caminho normal).
+    """
+    compilado = text(sql).compile(dialect=engine.dialect)
+    nomes = []
+
+    def posicional(m):
+        if m.group(1) not in nomes:
+            nomes.append(m.group(1))
+        return f"${nomes.index(m.group(1)) + 1}"
+
+    # O dialeto psycopg2 gera %(nome)s e escapa % literal como %%
+    sql_preparado = re.sub(r"%\((\w+)\)s", posicional, compilado.string).replace("%%", "%").strip().rstrip(";")
+    tipos = [_tipo_parametro((params or {}).get(nome)) for nome in nomes]
+    if None in tipos:
+        return None
+
+    chave = hashlib.md5(f"{sql_preparado}|{','.join(tipos)}".encode()).hexdigest()
+    return {
+        "nome": f"pv_{chave[:16]}",
+        "hash": chave,
+        "sql_original": sql,
+        "sql_preparado": sql_preparado,
+        "parametros": nomes,
+        "tipos": tipos,
+        "versao_esquema": versao,
+    }
+
+
+def gravar_plano(engine, plano, id_visao=None):
+    """Registra o plano em planos_consultas (ao lado de visoes_dashboard), com o carimbo do esquema."""
+    try:
+        with engine.connect() as conn:
+            conn.execute(text("""
+                INSERT INTO planos_consultas (hash, nome, id_visao, sql_original, sql_preparado, parametros, tipos, versao_esquema)
+                VALUES (:hash, :nome, :id_visao, :sql_original, :sql_preparado, :parametros, :tipos, :versao_esquema)
+                ON CONFLICT (hash) DO UPDATE SET
+                    versao_esquema = EXCLUDED.versao_esquema,
+                    id_visao = COALESCE(EXCLUDED.id_visao, planos_consultas.id_visao),
+                    compilado_em = CURRENT_TIMESTAMP
+            """), {**{k: plano[k] for k in ("hash", "nome", "sql_original", "sql_preparado", "parametros", "tipos", "versao_esquema")},
+                   "id_visao": id_visao})
+            conn.commit()
+    except Exception as e:
+        print(f"Erro ao gravar plano {plano['nome']}: {e}")
+
+
+def compilar_visao(engine, id_visao, estrutura_json):
+    """
+    Compila e registra os planos dos componentes de uma visão (chamado ao salvar/atualizar),
+    com os tipos de EXEMPLO_PARAMETROS_DASHBOARD; outros parâmetros ficam 'unknown', como texto na execução.
+    """
+    versao = versao_esquema(engine)
+    for comp in (estrutura_json or {}).get("componentes", []):
+        if comp.get("sql"):
+            plano = compilar_plano(engine, comp["sql"], EXEMPLO_PARAMETROS_DASHBOARD, versao=versao)
+            if plano:
+                gravar_plano(engine, plano, id_visao)
+
+
+def obter_plano(engine, sql, params, escrita=None):
+    """
+    Plano da consulta para os tipos destes parâmetros (cache do processo).
+    É recompilado quando o carimbo do esquema muda; planos que falharam ficam desativados até lá.
+    `escrita` é o engine onde o plano é registrado (o primário, quando `engine` é uma réplica).
+    """
+    versao = versao_esquema(engine)
+    chave = (sql, tuple(sorted((k, type(v).__name__) for k, v in (params or {}).items())))
+    with _lock:
+        plano = _planos.get(chave)
+    if plano is not None and plano["versao_esquema"] == versao:
+        return None if plano.get("invalido") else plano
+
+    plano = compilar_plano(engine, sql, params, versao) or {"versao_esquema": versao, "invalido": True}
+    if not plano.get("invalido"):
+        gravar_plano(escrita or engine, plano)
+    with _lock:
+        _planos[chave] = plano
+    return None if plano.get("invalido") else plano
+
+
+def executar(engine, plano, params):
+    """
+    Executa o plano numa conexão do pool. Cada conexão guarda em conn.info os statements já preparados
+    (nome -> carimbo do esquema); carimbo diferente faz DEALLOCATE + PREPARE de novo.
+    """
+    conn = engine.raw_connection()
+    try:
+        preparados = conn.info.setdefault("planos_preparados", {})
+        with conn.cursor() as cur:
+            if preparados.get(plano["nome"]) != plano["versao_esquema"]:
+                if plano["nome"] in preparados:
+                    cur.execute(f"DEALLOCATE {plano['nome']}")
+                tipos = f" ({', '.join(plano['tipos'])})" if plano["tipos"] else ""
+                cur.execute(f"PREPARE {plano['nome']}{tipos} AS {plano['sql_preparado']}")
+                preparados[plano["nome"]] = plano["versao_esquema"]
+            marcadores = ", ".join(["%s"] * len(plano["parametros"]))
+            cur.execute(f"EXECUTE {plano['nome']}" + (f" ({marcadores})" if marcadores else ""),
+                        [params[nome] for nome in plano["parametros"]])
+            colunas = [d.name for d in cur.description]
+            linhas = cur.fetchall()
+        # PREPARE vale para a sessão; commit só encerra a transação de leitura
+        conn.commit()
+    except Exception:
+        # Estado dos statements da sessão ficou incerto: descarta a conexão do pool
+        conn.invalidate()
+        raise
+    finally:
+        conn.close()
+
+    # coerce_float: NUMERIC vira float, como no read_sql
+    return pd.DataFrame.from_records(linhas, columns=colunas, coerce_float=True)
+
+
+def ler_preparada(engine, sql, params, escrita=None):
+    """DataFrame via prepared statement, ou None se a consulta não tiver plano (ou o plano falhar)."""
+    if not ATIVO:
+        return None
+    plano = None
+    try:
+        plano = obter_plano(engine, sql, params, escrita)
+        if plano is None:
+            return None
+        return executar(engine, plano, params)
+    except Exception as e:
+        if sql not in _avisados:
+            _avisados.add(sql)
+            print(f"Plano preparado falhou, usando o caminho normal: {e}")
+        if plano is not None:
+            plano["invalido"] = True
+        return None
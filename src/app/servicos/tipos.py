@@ -0,0 +1,92 @@
+import os
+import pandas as pd
+
+# Política de tipos compactos usada pelo ETL (aplicar_politica_tipos), onde o esquema é conhecido:
+# - texto de baixa cardinalidade -> category
+# - demais textos -> string com armazenamento Arrow (quando pyarrow está instalado)
+# - inteiros -> menor inteiro que comporta os valores
+# Valores monetários continuam float64 para não perder centavos em somas.
+# Resultados de consultas (compactar_resultado) só trocam texto por string Arrow: inteiros reduzidos
+# estouram em contas do usuário (int8 * 3) e category muda groupby/gráficos no playground.
+
+# POLITICA_TIPOS=0 desliga a política (volta aos tipos padrão do pandas; útil para comparar no benchmark)
+ATIVA = os.getenv("POLITICA_TIPOS", "1") != "0"
+
+# Proporção máxima de valores distintos para um texto virar category
+LIMITE_CARDINALIDADE = 0.5
+# Abaixo desta quantidade de linhas não vale a pena converter para category
+# (resultados pequenos costumam ir direto para gráficos, que respeitam a ordem das categorias)
+MIN_LINHAS_CATEGORIA = 10000
+
+try:
+    import pyarrow  # noqa: F401
+    TIPO_TEXTO = pd.StringDtype("pyarrow")
+except ImportError:
+    TIPO_TEXTO = pd.StringDtype()
+
+
+def _eh_texto(serie):
+    if pd.api.types.is_object_dtype(serie):
+        # Colunas object também guardam datas, Decimal, listas...: só texto puro entra na política
+        return pd.api.types.infer_dtype(serie, skipna=True) == "string"
+    return pd.api.types.is_string_dtype(serie)
+
+
+def compactar_inteiros(serie):
+    """Reduz uma coluna inteira para o menor tipo inteiro que comporta os valores."""
+    if pd.api.types.is_integer_dtype(serie) and not pd.api.types.is_bool_dtype(serie):
+        return pd.to_numeric(serie, downcast="integer")
+    return serie
+
+
+def compactar_texto(serie, categoria=None):
+    """
+    Converte texto para category (categoria=True) ou string Arrow (categoria=False).
+    Com categoria=None decide pela cardinalidade.
+    """
+    if isinstance(serie.dtype, pd.CategoricalDtype) or not _eh_texto(serie):
+        return serie
+    if categoria is None:
+        categoria = len(serie) >= MIN_LINHAS_CATEGORIA and serie.nunique(dropna=True) <= len(serie) * LIMITE_CARDINALIDADE
+    if categoria:
+        return serie.astype("category")
+    return serie.astype(TIPO_TEXTO)
+
+
+def aplicar_politica_tipos(df, categorias=None, textos=None, inteiros=None):
+    """
+    Aplica a política de tipos compactos em um DataFrame do ETL (retorna uma cópia rasa).
+
+    categorias/textos/inteiros: colunas com tipo fixado (uso no ETL, onde o esquema é conhecido).
+    As demais colunas têm o tipo decidido automaticamente pelo conteúdo.
+    """
+    if not ATIVA or df is None or df.empty:
+        return df
+    categorias, textos, inteiros = set(categorias or ()), set(textos or ()), set(inteiros or ())
+
+    df = df.copy(deep=False)
+    for col in df.columns:
+        serie = df[col]
+        if col in categorias:
+            df[col] = compactar_texto(serie, categoria=True)
+        elif col in textos:
+            df[col] = compactar_texto(serie, categoria=False)
+        elif col in inteiros:
+            # Colunas INTEGER do esquema: valores inválidos/nulos viram 0 antes de reduzir o tipo
+            df[col] = compactar_inteiros(pd.to_numeric(serie, errors="coerce").fillna(0).astype("int64"))
+        elif _eh_texto(serie):
+            df[col] = compactar_texto(serie)
+        else:
+            df[col] = compactar_inteiros(serie)
+    return df
+
+
+def compactar_resultado(df):
+    """Resultado de consulta: textos viram string Arrow; inteiros (int64) e demais tipos ficam como vieram."""
+    if not ATIVA or df is None or df.empty:
+        return df
+    df = df.copy(deep=False)
+    for col in df.columns:
+        if _eh_texto(df[col]):
+            df[col] = compactar_texto(df[col], categoria=False)
+    return df
@@ -1,10 +1,85 @@
-import matplotlib.pyplot as plt
-import matplotlib.ticker as ticker
-import seaborn as sns
+import os
 from io import BytesIO
 import textwrap
+import threading
 
-import re
+import numpy as np
+import servicos.metricas as metricas
+
+# matplotlib/seaborn são carregados sob demanda (import custa centenas de ms no cold start)
+plt = None
+ticker = None
+sns = None
+# pyplot não é thread-safe (figura "atual" global): as sessões do Streamlit e o agendador em processo
+# desenham sob este lock. Reentrante para funções de desenho que chamam outras.
+LOCK_PYPLOT = threading.RLock()
+
+def carregar_stack_grafica():
+    """Importa matplotlib e seaborn na primeira renderização e reaproveita nas seguintes."""
+    global plt, ticker, sns
+    if plt is None:
+        import matplotlib
+        matplotlib.use('Agg')
+        import matplotlib.pyplot as _plt
+        import matplotlib.ticker as _ticker
+        import seaborn as _sns
+        plt, ticker, sns = _plt, _ticker, _sns
+    return plt, ticker, sns
+
+# Codificação das imagens: formato -> (extensão, MIME)
+FORMATOS_IMAGEM = {
+    "png": ("png", "image/png"),
+    "png8": ("png", "image/png"),  # PNG com paleta de 256 cores
+    "webp": ("webp", "image/webp"),
+    "svg": ("svg", "image/svg+xml"),
+}
+def _formato_configurado(variavel, padrao):
+    """Formato de imagem vindo do ambiente; desconhecido cai para png com aviso (validado uma vez, no import)."""
+    formato = os.getenv(variavel, padrao)
+    if formato not in FORMATOS_IMAGEM:
+        print(f"AVISO: {variavel}={formato} não é suportado ({', '.join(FORMATOS_IMAGEM)}). Usando png.")
+        return "png"
+    return formato
+
+# Formato, DPI e recorte (bbox_inches='tight', um passe de layout a mais) por destino da imagem
+DESTINOS_IMAGEM = {
+    "tela": {"formato": "png", "dpi": 120, "recorte": True},
+    "email": {
+        "formato": _formato_configurado("FORMATO_IMAGEM_EMAIL", "png8"),
+        "dpi": int(os.getenv("DPI_IMAGEM_EMAIL", "100")),
+        "recorte": os.getenv("RECORTE_IMAGEM_EMAIL", "false").lower() == "true",
+    },
+}
+
+def salvar_figura(fig, formato="png", dpi=120, recorte=True):
+    """
+    Codifica a figura no formato pedido (ver FORMATOS_IMAGEM; outro formato levanta ValueError).
+    recorte=False dispensa o bbox_inches='tight' quando o layout já é fixo (tight_layout).
+    Retorna: BytesIO.
+    """
+    if formato not in FORMATOS_IMAGEM:
+        raise ValueError(f"Formato de imagem desconhecido: {formato} (suportados: {', '.join(FORMATOS_IMAGEM)})")
+    opcoes = {"dpi": dpi, "facecolor": "white"}
+    if recorte:
+        opcoes["bbox_inches"] = "tight"
+
+    buf = BytesIO()
+    if formato == "png8":
+        # Gráficos têm poucas cores: quantizar para paleta reduz o PNG sem perda visível
+        from PIL import Image
+        bruto = BytesIO()
+        fig.savefig(bruto, format="png", pil_kwargs={"compress_level": 1}, **opcoes)
+        bruto.seek(0)
+        imagem = Image.open(bruto).convert("RGB").quantize(colors=256, method=Image.Quantize.FASTOCTREE)
+        imagem.save(buf, format="png", optimize=True)
+    elif formato == "webp":
+        fig.savefig(buf, format="webp", pil_kwargs={"quality": 90, "method": 4}, **opcoes)
+    elif formato == "svg":
+        fig.savefig(buf, format="svg", **opcoes)
+    else:  # png
+        fig.savefig(buf, format="png", **opcoes)
+    buf.seek(0)
+    return buf
 
 def format_number(x, pos):
     """Formata números para K (milhares) e M (milhões) para evitar notação científica."""
@@ -15,10 +90,30 @@ def format_number(x, pos):
     else:
         return f'{x:.0f}'
 
+# Ordens conhecidas para rótulos do eixo X (minúsculas, sem ponto final). dia_semana segue o dayofweek do ETL (segunda = 0)
+ORDEM_MESES = {}
+for _n, _nomes in enumerate([
+    ("janeiro", "jan", "january"), ("fevereiro", "fev", "february", "feb"), ("março", "marco", "mar", "march"),
+    ("abril", "abr", "april", "apr"), ("maio", "mai", "may"), ("junho", "jun", "june"),
+    ("julho", "jul", "july"), ("agosto", "ago", "august", "aug"), ("setembro", "set", "september", "sep"),
+    ("outubro", "out", "october", "oct"), ("novembro", "nov", "november"), ("dezembro", "dez", "december", "dec"),
+], start=1):
+    ORDEM_MESES.update(dict.fromkeys(_nomes, _n))
+
+ORDEM_DIAS_SEMANA = {}
+for _n, _nomes in enumerate([
+    ("segunda", "segunda-feira", "seg", "monday", "mon"), ("terça", "terça-feira", "terca", "terca-feira", "ter", "tuesday", "tue"),
+    ("quarta", "quarta-feira", "qua", "wednesday", "wed"), ("quinta", "quinta-feira", "qui", "thursday", "thu"),
+    ("sexta", "sexta-feira", "sex", "friday", "fri"), ("sábado", "sabado", "sab", "sáb", "saturday", "sat"),
+    ("domingo", "dom", "sunday", "sun"),
+]):
+    ORDEM_DIAS_SEMANA.update(dict.fromkeys(_nomes, _n))
+
 def sort_dataframe_logically(df, col):
     """
     Tenta ordenar o DataFrame de forma lógica para o eixo X.
-    Resolve problemas de faixas como '5-10%' vindo depois de '10-15%' (ordem alfabética errada).
+    Resolve problemas de faixas como '5-10%' vindo depois de '10-15%' (ordem alfabética errada),
+    além de meses e dias da semana por extenso. Ordenação estável: empates mantêm a ordem original.
     """
     try:
         if df.empty or col not in df.columns:
@@ -26,29 +121,44 @@ def sort_dataframe_logically(df, col):
 
         # Se já for numérico ou data, ordena direto
         if pd.api.types.is_numeric_dtype(df[col]) or pd.api.types.is_datetime64_any_dtype(df[col]):
-            return df.sort_values(by=col)
+            return df.sort_values(by=col, kind='stable')
 
-        # Lógica para Strings (Faixas, Meses, etc)
-        df = df.copy()
-        
-        def extract_sort_key(val):
-            s = str(val).strip()
-            
-            # Padrão para faixas numéricas: "0-5%", ">15%", "<10", "R$ 100-200"
-            # Extrai o primeiro número encontrado
-            match = re.search(r'(\d+[.,]?\d*)', s)
-            if match:
-                num = float(match.group(1).replace(',', '.'))
-                # Ajuste para modificadores
-                if '>' in s: num += 0.1 # Garante que >15 venha depois de 15
-                if '<' in s: num -= 0.1
-                return num
-            
-            return s # Fallback para string normal
+        # Lógica para Strings (Faixas, Meses, etc): chaves calculadas só sobre os rótulos distintos
+        codigos, distintos = pd.factorize(df[col])
+        texto = pd.Series(distintos, dtype=object).astype(str).str.strip()
+        rotulo = texto.str.lower().str.rstrip('.')
 
-        df['_sort_key'] = df[col].apply(extract_sort_key)
-        df_sorted = df.sort_values(by='_sort_key').drop(columns=['_sort_key'])
-        return df_sorted
+        # Meses / dias da semana: só quando todos os valores são nomes conhecidos
+        for ordem in (ORDEM_MESES, ORDEM_DIAS_SEMANA):
+            conhecidos = rotulo.map(ordem)
+            if conhecidos.notna().all():
+                numero = conhecidos.to_numpy(dtype=float)
+                ajuste = np.zeros(len(rotulo))
+                break
+        else:
+            # Faixas numéricas: "0-5%", ">15%", "<10", "R$ 100-200" -> primeiro número encontrado
+            numero = rotulo.str.extract(r'(\d{1,3}(?:\.\d{3})+(?:,\d+)?|\d+(?:[.,]\d+)?)', expand=False)
+            # Separador de milhar brasileiro: "R$ 1.000" é mil, não 1.0
+            milhar = numero.str.fullmatch(r'\d{1,3}(?:\.\d{3})+(?:,\d+)?').fillna(False).astype(bool)
+            numero = numero.where(~milhar, numero.str.replace('.', '', regex=False))
+            numero = numero.str.replace(',', '.', regex=False).astype(float).to_numpy()
+            # Segundo nível: "<10" antes de "10-20", ">15" / "15+" depois de "10-15"
+            ajuste = np.select(
+                [rotulo.str.contains(r'<|abaixo|menos de|até', regex=True).to_numpy(),
+                 rotulo.str.contains(r'>|acima|mais de|\+', regex=True).to_numpy()],
+                [-1, 1], 0,
+            )
+
+        # Sem número: depois dos numéricos, em ordem alfabética. np.lexsort usa a última chave como principal
+        sem_numero = np.isnan(numero)
+        ordem_distintos = np.lexsort((texto.to_numpy(), ajuste, np.where(sem_numero, 0.0, numero), sem_numero))
+        posicao = np.empty(len(distintos) + 1, dtype=np.int64)
+        posicao[ordem_distintos] = np.arange(len(distintos))
+        # Nulos (código -1) vão para a última posição
+        posicao[-1] = len(distintos)
+
+        # argsort estável: empates mantêm a ordem original das linhas
+        return df.iloc[np.argsort(posicao[codigos], kind='stable')]
 
     except Exception:
         # Se der erro na lógica customizada, retorna original (ou poderia tentar sort simples)
@@ -68,11 +178,18 @@ def wrap_labels(ax, width=15):
         labels.append(textwrap.fill(text, width=width))
     ax.set_xticklabels(labels, rotation=45, ha='right')
 
-def gerar_grafico(df, tipo, titulo, eixo_x, eixo_y, eixo_y2=None):
+@metricas.instrumentar("gerar_grafico")
+def gerar_grafico(df, tipo, titulo, eixo_x, eixo_y, eixo_y2=None, destino="tela"):
     """
     Gera um gráfico estático (Matplotlib/Seaborn) a partir de um DataFrame.
-    Retorna: BytesIO buffer contendo a imagem PNG.
+    destino escolhe formato, DPI e recorte em DESTINOS_IMAGEM.
+    Retorna: BytesIO buffer contendo a imagem (PNG na tela).
     """
+    plt, ticker, sns = carregar_stack_grafica()
+    with LOCK_PYPLOT:
+        return _desenhar_grafico(plt, ticker, sns, df, tipo, titulo, eixo_x, eixo_y, eixo_y2, destino)
+
+def _desenhar_grafico(plt, ticker, sns, df, tipo, titulo, eixo_x, eixo_y, eixo_y2, destino):
     try:
         # Configuração de Estilo
         plt.figure(figsize=(12, 7)) 
@@ -166,10 +283,8 @@ def gerar_grafico(df, tipo, titulo, eixo_x, eixo_y, eixo_y2=None):
 
         plt.tight_layout()
         
-        # Salvar em buffer com bbox_inches='tight' para não cortar textos
-        buf = BytesIO()
-        plt.savefig(buf, format='png', dpi=120, bbox_inches='tight', facecolor='white')
-        buf.seek(0)
+        # Na tela, bbox_inches='tight' para não cortar textos
+        buf = salvar_figura(plt.gcf(), **DESTINOS_IMAGEM[destino])
         plt.close()
         
         return buf, None
@@ -178,106 +293,128 @@ def gerar_grafico(df, tipo, titulo, eixo_x, eixo_y, eixo_y2=None):
         plt.close()
         return None, str(e)
 
-def gerar_tabela_imagem(df, titulo="Tabela"):
+# Tabelas: quebra de texto, paginação e limite de linhas rasterizadas
+LARGURA_QUEBRA = 35
+LINHAS_POR_IMAGEM = 40
+MAX_IMAGENS_TABELA = 5
+ALTURA_LINHA_POL = 0.22  # polegadas por linha de texto na imagem
+
+def formatar_tabela(df, largura=LARGURA_QUEBRA):
     """
-    Converte um DataFrame em uma imagem PNG usando Matplotlib com alta qualidade.
+    Converte o DataFrame em texto para exibição, coluna a coluna.
+    Retorna (matriz de textos, linhas de texto por linha da tabela).
     """
+    colunas = []
+    for col in df.columns:
+        serie = df[col]
+        nulos = serie.isna().to_numpy()
+        if pd.api.types.is_float_dtype(serie):
+            # 1,234.50 -> 1.234,50
+            texto = serie.map('{:,.2f}'.format, na_action='ignore').astype(object)
+            texto = texto.where(~nulos, "").astype(str).str.translate(str.maketrans(',.', '.,'))
+        else:
+            texto = serie.astype(object).where(~nulos, "").astype(str)
+            if not pd.api.types.is_numeric_dtype(serie) and not pd.api.types.is_datetime64_any_dtype(serie):
+                # Quebra só as células que passam da largura (textwrap é caro)
+                longos = texto.str.len() > largura
+                if longos.any():
+                    texto[longos] = texto[longos].map(lambda x: textwrap.fill(x, width=largura))
+        colunas.append(texto.to_numpy(dtype=object))
+
+    valores = np.column_stack(colunas) if colunas else np.empty((len(df), 0), dtype=object)
+    quebras = np.char.count(valores.astype(str), '\n') if valores.size else np.zeros(valores.shape, dtype=int)
+    linhas_texto = quebras.max(axis=1) + 1 if valores.shape[1] else np.ones(len(df), dtype=int)
+    return valores, linhas_texto
+
+def _desenhar_pagina_tabela(valores, linhas_texto, colunas, titulo):
+    """Uma imagem PNG com as linhas recebidas (cores e bordas definidas na criação da tabela)."""
+    num_cols = len(colunas)
+    num_rows = len(valores)
+
+    # Altura em "linhas de texto": cabeçalho = 1.5, cada linha = texto + respiro.
+    # A figura tem exatamente o tamanho da tabela (antes ela transbordava o eixo e o PNG saía enorme)
+    unidades = np.concatenate(([1.5], linhas_texto + 0.6))
+    altura_total = ALTURA_LINHA_POL * unidades.sum() + 0.6  # +0.6 para o título
+    largura_total = max(8, min(num_cols * 4, 22))
+
+    fig, ax = plt.subplots(figsize=(largura_total, altura_total))
     try:
-        # 1. Preparar Dados (Formatação e Wrap)
-        df_display = df.copy()
-        
-        WIDTH_WRAP = 35
-        def smart_wrap(text, width=WIDTH_WRAP):
-            return textwrap.fill(str(text), width=width)
-
-        for col in df_display.columns:
-            if pd.api.types.is_float_dtype(df_display[col]):
-                df_display[col] = df_display[col].apply(lambda x: f"{x:,.2f}".replace(",", "X").replace(".", ",").replace("X", "."))
-            elif pd.api.types.is_string_dtype(df_display[col]) or pd.api.types.is_object_dtype(df_display[col]):
-                 df_display[col] = df_display[col].apply(lambda x: smart_wrap(x, width=WIDTH_WRAP))
-        
-        # 2. Configuração de Tamanho Inteligente
-        num_cols = len(df.columns)
-        num_rows = len(df)
-        
-        # Calcular linhas reais (altura do conteudo)
-        total_text_lines = 0
-        row_heights = [] # Para armazenar altura necessária de cada linha
-        
-        # Header counts as 2 lines approx
-        total_text_lines += 2
-        
-        for idx, row in df_display.iterrows():
-            max_lines_in_row = 1
-            for item in row:
-                if isinstance(item, str):
-                    max_lines_in_row = max(max_lines_in_row, item.count('\n') + 1)
-            row_heights.append(max_lines_in_row)
-            total_text_lines += max_lines_in_row
-
-        # Fatores de escala
-        base_height_per_line = 0.4 
-        altura_total = max(2, total_text_lines * base_height_per_line + 1) # +1 para título
-        
-        largura_total = max(8, min(num_cols * 4, 22))
-        
-        plt.figure(figsize=(largura_total, altura_total))
-        
-        # 3. Desenhar Tabela
-        ax = plt.gca()
         ax.axis('off')
-        
-        tabela = plt.table(
-            cellText=df_display.values,
-            colLabels=df_display.columns,
-            loc='upper center', 
+
+        cores = np.where((np.arange(num_rows) % 2 == 0)[:, None], 'white', '#fdfdfd')
+        tabela = ax.table(
+            cellText=valores,
+            colLabels=list(colunas),
+            cellColours=np.broadcast_to(cores, (num_rows, num_cols)),
             cellLoc='left',
             colLoc='center',
-            edges='horizontal' 
+            edges='horizontal',
+            bbox=[0, 0, 1, 1]
         )
+        # Sem ajuste automático de fonte (reduz a fonte célula a célula a cada desenho)
+        tabela.auto_set_font_size(False)
+        tabela.set_fontsize(10)
 
-        # 4. Ajuste Fino de Altura por Linha
-        # Iterar cells para ajustar altura conforme o conteudo
-        cell_dict = tabela.get_celld()
-        
-        for row in range(num_rows + 1):
-             # row 0 is header
-             if row == 0:
-                 height = 0.1
-             else:
-                 # row indices in data are 0-based, so row in table is data_index + 1
-                 # row_heights array index is row - 1
-                 lines = row_heights[row-1]
-                 height = lines * 0.08 + 0.05 # Altura base + extra por linha
-
-             for col in range(num_cols):
-                 if (row, col) in cell_dict:
-                     cell = cell_dict[(row, col)]
-                     cell.set_height(height)
-                     
-                     cell.set_linewidth(0)
-                     if row >= 0:
-                         cell.set_edgecolor('#eeeeee')
-                         cell.set_linewidth(1)
-                     
-                     # Estilo
-                     if row == 0:
-                        cell.set_text_props(weight='bold', color='white', size=11)
-                        cell.set_facecolor('#2c3e50')
-                        cell.set_text_props(ha='center')
-                     else:
-                        cell.set_facecolor('white' if row % 2 != 0 else '#fdfdfd')
-
-        plt.title(titulo, fontsize=14, weight='bold', color='#333333', pad=10)
-        
-        # 5. Salvar (DPI Reduzido para ficar "menor" na tela)
+        # Altura relativa por linha da tabela (0 = cabeçalho); o bbox escala para caber no eixo
+        alturas = unidades / unidades.sum()
+        for (row, _), cell in tabela.get_celld().items():
+            cell.set_height(alturas[row])
+            cell.set_edgecolor('#eeeeee')
+            cell.set_linewidth(1)
+        # Com edges='horizontal' o fundo da célula não é pintado: cabeçalho em texto escuro
+        for col in range(num_cols):
+            tabela[0, col].set_text_props(weight='bold', color='#2c3e50', size=11, ha='center')
+
+        ax.set_title(titulo, fontsize=14, weight='bold', color='#333333', pad=10)
+        fig.subplots_adjust(left=0.01, right=0.99, bottom=0.01, top=1 - 0.6 / altura_total)
+
+        # DPI reduzido para ficar "menor" na tela
         buf = BytesIO()
-        plt.savefig(buf, format='png', dpi=150, bbox_inches='tight', pad_inches=0.1)
+        fig.savefig(buf, format='png', dpi=150, bbox_inches='tight', pad_inches=0.1)
         buf.seek(0)
-        plt.close()
-        
-        return buf, None
+        return buf
+    finally:
+        plt.close(fig)
+
+@metricas.instrumentar("gerar_tabela_imagens")
+def gerar_tabela_imagens(df, titulo="Tabela", linhas_por_imagem=LINHAS_POR_IMAGEM, max_imagens=MAX_IMAGENS_TABELA):
+    """
+    Converte um DataFrame em imagens PNG, uma a cada linhas_por_imagem linhas.
+    Só as primeiras linhas_por_imagem * max_imagens linhas são desenhadas; para o restante use gerar_tabela_csv.
+    Retorna: (lista de buffers, erro). Tabela vazia: ([], None), sem imagem.
+    """
+    if df.empty:
+        return [], None
+    carregar_stack_grafica()
+    try:
+        limite = linhas_por_imagem * max_imagens
+        valores, linhas_texto = formatar_tabela(df.iloc[:limite])
+
+        total = max(1, -(-len(valores) // linhas_por_imagem))
+        imagens = []
+        with LOCK_PYPLOT:
+            for pagina in range(total):
+                fatia = slice(pagina * linhas_por_imagem, (pagina + 1) * linhas_por_imagem)
+                titulo_pagina = titulo if total == 1 else f"{titulo} ({pagina + 1}/{total})"
+                imagens.append(_desenhar_pagina_tabela(valores[fatia], linhas_texto[fatia], df.columns, titulo_pagina))
+        return imagens, None
 
     except Exception as e:
-        plt.close()
-        return None, str(e)
+        return [], str(e)
+
+def gerar_tabela_imagem(df, titulo="Tabela"):
+    """
+    Converte um DataFrame em uma imagem PNG (só a primeira página, até LINHAS_POR_IMAGEM linhas).
+    """
+    imagens, erro = gerar_tabela_imagens(df, titulo, max_imagens=1)
+    return (imagens[0] if imagens else None), erro
+
+def gerar_tabela_csv(df):
+    """
+    Alternativa leve à imagem para tabelas grandes: CSV completo (separador ';' e vírgula decimal, abre direto no Excel).
+    Retorna: BytesIO.
+    """
+    buf = BytesIO()
+    buf.write(df.to_csv(index=False, sep=';', decimal=',').encode('utf-8-sig'))
+    buf.seek(0)
+    return buf
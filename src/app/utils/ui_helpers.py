@@ -2,11 +2,29 @@ import streamlit as st
 import pandas as pd
 import servicos.banco as banco
 import servicos.visualizacao as visuais
+import servicos.metricas as metricas
+import servicos.log_consultas as log_consultas
+
+
+# No modo lazy, componentes calculados de imediato (primeira linha do grid de 2 colunas)
+COMPONENTES_IMEDIATOS = 2
 
 
 @st.cache_data(ttl=300, show_spinner=False)
+def _consultar_cache(sql, params):
+    # Só executa em cache miss
+    metricas.atributo("cache", "miss")
+    # SQL das visões se repete a cada renderização: prepared statement por conexão
+    return banco.executar_consulta(sql, params, preparar=True)
+
+
 def consultar_com_cache(sql, params):
-    return banco.executar_consulta(sql, params)
+    with metricas.medir("consulta") as span:
+        span["cache"] = "hit"
+        df = _consultar_cache(sql, params)
+        span["linhas"] = 0 if df is None else len(df)
+        span["bytes"] = metricas.tamanho_dataframe(df)
+    return df
 
 
 def filtrar_dataframe(df, data_inicio, data_fim):
@@ -39,11 +57,42 @@ def filtrar_dataframe(df, data_inicio, data_fim):
     return df_filtrado
 
 
-def renderizar_visao(json_visao, params_comb):
+def renderizar_visao(json_visao, params_comb, mostrar_performance=False, id_visao=None, modo_lazy=False):
     """
     Renderiza os componentes de uma visão (Gráficos, Indicadores).
-    Retorna lista de imagens geradas (buffer) para envio.
+    Com mostrar_performance=True, exibe um expander com a latência de cada componente.
+    id_visao identifica as consultas da visão no log de consultas.
+    Com modo_lazy=True, só a primeira linha do grid é calculada; os demais componentes aparecem
+    com o título e são carregados sob demanda (o tempo até a primeira pintura não cresce com a visão).
+    Retorna lista de imagens geradas (buffer) para envio (no modo lazy, só dos componentes já carregados).
     """
+    with metricas.medir("renderizar_visao", visao=json_visao.get("nome")):
+        trace_id = metricas.trace_atual()
+        imagens_para_envio = _renderizar_componentes(json_visao, params_comb, id_visao, modo_lazy)
+
+    if mostrar_performance:
+        renderizar_painel_performance(trace_id)
+
+    return imagens_para_envio
+
+
+def renderizar_painel_performance(trace_id):
+    """Expander com tempos de SQL, filtro e renderização por componente da última renderização."""
+    with st.expander("Performance"):
+        resumo = metricas.resumo_por_componente(trace_id)
+        if resumo:
+            st.dataframe(pd.DataFrame(resumo), use_container_width=True)
+        else:
+            st.caption("Nenhum componente medido.")
+
+        c1, c2 = st.columns(2)
+        with c1:
+            st.download_button("Métricas (Prometheus)", data=metricas.exportar_prometheus(), file_name="metricas.prom", mime="text/plain", key=f"perf_prom_{trace_id}")
+        with c2:
+            st.download_button("Spans (JSONL)", data=metricas.exportar_spans(trace_id=trace_id), file_name="spans.jsonl", mime="application/json", key=f"perf_spans_{trace_id}")
+
+
+def _renderizar_componentes(json_visao, params_comb, id_visao=None, modo_lazy=False):
     st.subheader(json_visao.get("nome", "Visão sem nome"))
     componentes = json_visao.get("componentes", [])
     
@@ -58,64 +107,133 @@ def renderizar_visao(json_visao, params_comb):
         
         # Seleciona a coluna atual (0 ou 1)
         with cols[i % 2]:
-            tipo = comp.get("tipo")
-            titulo = comp.get("titulo")
-            sql = comp.get("sql")
-            
-            st.markdown(f"**{titulo}**")
-            
-            if sql:
-                # Filtragem de segurança
-                try:
-                    df = consultar_com_cache(sql, params_comb)
-                    d_inicio = params_comb.get("data_inicio")
-                    d_fim = params_comb.get("data_fim")
+            if modo_lazy and i >= COMPONENTES_IMEDIATOS:
+                # Fora da primeira linha: só o título; consulta e gráfico ficam para quando o usuário pedir
+                _componente_sob_demanda(comp, i, params_comb, id_visao, _chave_lazy(json_visao, id_visao, i),
+                                        json_visao.get("nome"))
+                continue
+
+            imagens_para_envio.extend(_renderizar_componente(comp, i, params_comb, id_visao))
+
+    if modo_lazy and len(componentes) > COMPONENTES_IMEDIATOS:
+        if st.button("Carregar todos os componentes", key=f"lazy_todos_{_chave_lazy(json_visao, id_visao, '')}"):
+            for i in range(COMPONENTES_IMEDIATOS, len(componentes)):
+                st.session_state[_chave_lazy(json_visao, id_visao, i)] = True
+            st.rerun()
+    
+    return imagens_para_envio
+
+
+def _chave_lazy(json_visao, id_visao, i):
+    return f"lazy_{id_visao if id_visao is not None else json_visao.get('nome')}_{i}"
+
+
+@st.fragment
+def _componente_sob_demanda(comp, i, params_comb, id_visao, chave, nome_visao=None):
+    """
+    Placeholder de um componente no modo lazy. Roda como fragment: carregar um componente
+    reexecuta só este trecho, sem refazer as consultas do resto da página.
+    """
+    if not st.session_state.get(chave):
+        st.markdown(f"**{comp.get('titulo')}**")
+        if not st.button("Carregar", key=f"{chave}_btn", help="Executa a consulta e gera o gráfico deste componente"):
+            st.caption(f"{comp.get('tipo', 'componente')} não carregado.")
+            st.markdown("---")
+            return
+        # O clique já reexecuta só este fragment; a partir daqui o componente fica carregado
+        st.session_state[chave] = True
+
+    # Span próprio: o tempo de um componente carregado depois não entra como renderização de uma visão
+    with metricas.medir("componente_sob_demanda", visao=nome_visao or id_visao, titulo=comp.get("titulo")):
+        _renderizar_componente(comp, i, params_comb, id_visao)
+
+
+def _renderizar_componente(comp, i, params_comb, id_visao=None):
+    """Executa a consulta e renderiza um componente. Retorna os itens de envio (imagem + dados), possivelmente vazio."""
+    itens_envio = []
+    with metricas.medir("componente", titulo=comp.get("titulo"), tipo=comp.get("tipo")), \
+         log_consultas.contexto_consulta(id_visao, comp.get("id", i)):
+        tipo = comp.get("tipo")
+        titulo = comp.get("titulo")
+        sql = comp.get("sql")
+    
+        st.markdown(f"**{titulo}**")
+    
+        if sql:
+            # Filtragem de segurança
+            try:
+                df = consultar_com_cache(sql, params_comb)
+                d_inicio = params_comb.get("data_inicio")
+                d_fim = params_comb.get("data_fim")
+                with metricas.medir("filtrar_dataframe"):
                     df = filtrar_dataframe(df, d_inicio, d_fim)
-                except Exception as e:
-                    st.error(f"Erro na query: {e}")
-                    df = None
+            except Exception as e:
+                st.error(f"Erro na query: {e}")
+                df = None
+        
+            if df is not None and not df.empty:
+                if tipo == "indicador":
+                    val = df.iloc[0, 0]
+                    if isinstance(val, (int, float)):
+                        st.metric(label="Valor", value=f"{val:,.2f}")
+                    else:
+                        st.metric(label="Valor", value=str(val))
+                    
+                elif tipo == "tabela":
+                    st.dataframe(df, use_container_width=True)
+                    itens_envio = _itens_envio_tabela(df, titulo)
+
+                elif tipo in ["grafico_barra", "grafico_linha", "grafico_combinado"]:
+                    eixo_x = comp.get("eixo_x")
+                    eixo_y = comp.get("eixo_y")
+                    eixo_y2 = comp.get("eixo_y2")
                 
-                if df is not None and not df.empty:
-                    if tipo == "indicador":
-                        val = df.iloc[0, 0]
-                        if isinstance(val, (int, float)):
-                            st.metric(label="Valor", value=f"{val:,.2f}")
-                        else:
-                            st.metric(label="Valor", value=str(val))
-                            
-                    elif tipo == "tabela":
-                        st.dataframe(df, use_container_width=True)
-                        buf_tab, erro_tab = visuais.gerar_tabela_imagem(df, titulo)
-                        
-                        item_envio = {
-                            "titulo": f"{titulo} (Tabela)",
-                            "buffer": buf_tab if buf_tab else None,
-                            "dados_raw": df.to_dict(orient='records')
-                        }
-                        imagens_para_envio.append(item_envio)
-
-                    elif tipo in ["grafico_barra", "grafico_linha", "grafico_combinado"]:
-                        eixo_x = comp.get("eixo_x")
-                        eixo_y = comp.get("eixo_y")
-                        eixo_y2 = comp.get("eixo_y2")
-                        
-                        buf, erro = visuais.gerar_grafico(df, tipo, titulo, eixo_x, eixo_y, eixo_y2)
-                        
-                        if buf:
-                            st.image(buf, use_container_width=True)
-                            imagens_para_envio.append({
-                                "titulo": titulo,
-                                "buffer": buf,
-                                "dados_raw": df.to_dict(orient='records')
-                            })
-                            buf.seek(0)
-                        else:
-                            st.error(f"Erro visual: {erro}")
-                else:
-                    st.warning("Sem dados.")
+                    buf, erro = visuais.gerar_grafico(df, tipo, titulo, eixo_x, eixo_y, eixo_y2)
+                
+                    if buf:
+                        st.image(buf, use_container_width=True)
+                        itens_envio = [{
+                            "titulo": titulo,
+                            "buffer": buf,
+                            "dados": df
+                        }]
+                        buf.seek(0)
+                    else:
+                        st.error(f"Erro visual: {erro}")
             else:
-                st.error("SQL não definido.")
-            
-            st.markdown("---")
+                st.warning("Sem dados.")
+        else:
+            st.error("SQL não definido.")
     
-    return imagens_para_envio
+        st.markdown("---")
+    
+    return itens_envio
+
+
+def _itens_envio_tabela(df, titulo):
+    """
+    Itens de envio de uma tabela: uma imagem por página (até visuais.MAX_IMAGENS_TABELA) e,
+    se a tabela não couber nas imagens, o CSV completo como anexo.
+    """
+    imagens, erro = visuais.gerar_tabela_imagens(df, titulo)
+    if erro:
+        st.caption(f"Imagem da tabela indisponível: {erro}")
+
+    itens = []
+    for pagina, buf in enumerate(imagens):
+        itens.append({
+            "titulo": f"{titulo} (Tabela)" if len(imagens) == 1 else f"{titulo} (Tabela {pagina + 1} de {len(imagens)})",
+            "buffer": buf,
+            # Dados uma vez por tabela, na primeira página (serializados só no envio, ver servicos/envio.py)
+            "dados": df if pagina == 0 else None
+        })
+
+    if len(df) > visuais.LINHAS_POR_IMAGEM * visuais.MAX_IMAGENS_TABELA:
+        itens.append({
+            "titulo": f"{titulo} (Tabela completa)",
+            "buffer": visuais.gerar_tabela_csv(df),
+            "extensao": "csv",
+            "mime": "text/csv",
+            "dados": None
+        })
+    return itens
@@ -0,0 +1,233 @@
+"""
+Teste de carga headless do dashboard: simula N usuários abrindo as visões salvas em visoes_dashboard
+com janelas de datas aleatórias e repete o mesmo caminho de renderizar_visao (SQL -> filtro -> gráfico/tabela),
+sem o Streamlit no meio.
+
+Reporta p50/p95/p99 por componente (total, SQL e renderização) e a vazão geral. Com vários níveis de
+usuários (--usuarios 1,5,10,20) mostra em que ponto a latência começa a degradar.
+
+Uso (Postgres local do docker-compose, variáveis do .env):
+    python src/benchmarks/bench_carga_dashboard.py --usuarios 1,5,10 --duracao 60
+    python src/benchmarks/bench_carga_dashboard.py --usuarios 8 --duracao 30 --visoes 3,7 --json
+
+Obs: as consultas não passam pelo st.cache_data (todo acesso é cache miss, o pior caso) e, por padrão,
+não são gravadas em consultas_log para não distorcer o ranking de custo das visões (--registrar-log grava).
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import threading
+import time
+from datetime import timedelta
+
+import numpy as np
+import pandas as pd
+
+DIR_APP = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'app'))
+sys.path.append(DIR_APP)
+
+import servicos.banco as banco
+import servicos.visualizacao as visuais
+from utils.ui_helpers import filtrar_dataframe
+
+TIPOS_GRAFICO = ["grafico_barra", "grafico_linha", "grafico_combinado"]
+
+# pyplot não é thread-safe: a renderização é serializada, como no agendador com 1 worker
+_lock_render = threading.Lock()
+
+
+def carregar_visoes(ids=None):
+    """Lê as visões salvas. Retorna lista de (id, estrutura)."""
+    df = banco.listar_visoes()
+    if df is None or df.empty:
+        return []
+    visoes = []
+    for _, row in df.iterrows():
+        if ids and int(row['id']) not in ids:
+            continue
+        visao = banco.carregar_visao(row['id'], row['versao'])
+        if visao is not None:
+            visoes.append((visao['id'], visao['estrutura_json']))
+    return visoes
+
+
+def limites_datas():
+    """Intervalo de datas disponível (catálogo do ETL), com o mesmo padrão do main.py."""
+    info_pedidos = banco.obter_catalogo().get('pedidos', {})
+    data_min = pd.to_datetime(info_pedidos.get('data_min') or "2025-01-01").date()
+    data_max = pd.to_datetime(info_pedidos.get('data_max') or "2025-12-31").date()
+    return data_min, data_max
+
+
+def janela_aleatoria(rng, data_min, data_max, dias_max):
+    total = (data_max - data_min).days
+    dias = rng.randint(0, min(dias_max, total))
+    inicio = data_min + timedelta(days=rng.randint(0, total - dias))
+    return inicio, inicio + timedelta(days=dias)
+
+
+def executar_componente(comp, params, registrar_log):
+    """Reproduz um componente de renderizar_visao. Retorna (sql_ms, filtro_ms, render_ms, erro)."""
+    tipo = comp.get("tipo")
+    sql = comp.get("sql")
+    if not sql:
+        return 0.0, 0.0, 0.0, "SQL não definido"
+
+    t0 = time.perf_counter()
+    df = banco.executar_consulta(sql, params, registrar=registrar_log)
+    t1 = time.perf_counter()
+    if df is None:
+        return (t1 - t0) * 1000, 0.0, 0.0, "Erro na query"
+
+    df = filtrar_dataframe(df, params["data_inicio"], params["data_fim"])
+    t2 = time.perf_counter()
+
+    erro = None
+    if not df.empty:
+        with _lock_render:
+            t2 = time.perf_counter()  # Não conta a espera pelo lock como renderização
+            if tipo == "tabela":
+                _, erro = visuais.gerar_tabela_imagem(df, comp.get("titulo"))
+            elif tipo in TIPOS_GRAFICO:
+                _, erro = visuais.gerar_grafico(df, tipo, comp.get("titulo"), comp.get("eixo_x"), comp.get("eixo_y"), comp.get("eixo_y2"))
+            else:
+                # Indicador: só lê o valor
+                df.iloc[0, 0]
+    t3 = time.perf_counter()
+    return (t1 - t0) * 1000, (t2 - t1) * 1000, (t3 - t2) * 1000, erro
+
+
+def usuario_simulado(semente, visoes, limites, args, prazo, amostras):
+    rng = random.Random(semente)
+    while time.monotonic() < prazo:
+        id_visao, estrutura = rng.choice(visoes)
+        inicio, fim = janela_aleatoria(rng, *limites, args.dias_max)
+        params = {"data_inicio": inicio, "data_fim": fim}
+
+        t_visao = time.perf_counter()
+        for i, comp in enumerate(estrutura.get("componentes", [])):
+            t_comp = time.perf_counter()
+            try:
+                sql_ms, filtro_ms, render_ms, erro = executar_componente(comp, params, args.registrar_log)
+            except Exception as e:
+                sql_ms = filtro_ms = render_ms = 0.0
+                erro = str(e)
+            amostras.append({
+                "visao": id_visao,
+                "componente": comp.get("titulo") or f"componente_{i}",
+                "tipo": comp.get("tipo"),
+                "total_ms": (time.perf_counter() - t_comp) * 1000,
+                "sql_ms": sql_ms, "filtro_ms": filtro_ms, "render_ms": render_ms,
+                "erro": erro,
+            })
+        amostras.append({"visao": id_visao, "componente": None, "total_ms": (time.perf_counter() - t_visao) * 1000})
+
+        if args.pausa:
+            time.sleep(rng.uniform(0, args.pausa))
+
+
+def percentis(valores):
+    p50, p95, p99 = np.percentile(valores, [50, 95, 99])
+    return round(float(p50), 1), round(float(p95), 1), round(float(p99), 1)
+
+
+def rodar_nivel(usuarios, visoes, limites, args):
+    """Executa um nível de carga (N usuários por args.duracao segundos) e consolida as amostras."""
+    amostras = []  # list.append é thread-safe
+    inicio = time.monotonic()
+    prazo = inicio + args.duracao
+    threads = [
+        threading.Thread(target=usuario_simulado, args=(args.semente + i, visoes, limites, args, prazo, amostras), daemon=True)
+        for i in range(usuarios)
+    ]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    decorrido = time.monotonic() - inicio
+
+    df = pd.DataFrame(amostras)
+    if df.empty:
+        return {"usuarios": usuarios, "duracao_s": round(decorrido, 1), "visoes_renderizadas": 0, "componentes": []}
+
+    df_visoes = df[df["componente"].isna()]
+    df_comp = df[df["componente"].notna()]
+
+    componentes = []
+    for (id_visao, componente), grupo in df_comp.groupby(["visao", "componente"], sort=False):
+        p50, p95, p99 = percentis(grupo["total_ms"])
+        componentes.append({
+            "visao": int(id_visao),
+            "componente": componente,
+            "tipo": grupo["tipo"].iloc[0],
+            "amostras": len(grupo),
+            "erros": int(grupo["erro"].notna().sum()),
+            "p50_ms": p50, "p95_ms": p95, "p99_ms": p99,
+            "sql_p95_ms": percentis(grupo["sql_ms"])[1],
+            "render_p95_ms": percentis(grupo["render_ms"])[1],
+        })
+
+    p50, p95, p99 = percentis(df_visoes["total_ms"])
+    return {
+        "usuarios": usuarios,
+        "duracao_s": round(decorrido, 1),
+        "visoes_renderizadas": len(df_visoes),
+        "visoes_por_s": round(len(df_visoes) / decorrido, 2),
+        "componentes_por_s": round(len(df_comp) / decorrido, 2),
+        "erros": int(df_comp["erro"].notna().sum()),
+        "visao_p50_ms": p50, "visao_p95_ms": p95, "visao_p99_ms": p99,
+        "componentes": componentes,
+    }
+
+
+def imprimir(resultado):
+    print(f"\n=== {resultado['usuarios']} usuário(s) | {resultado['duracao_s']}s | "
+          f"{resultado['visoes_renderizadas']} visões ({resultado.get('visoes_por_s', 0)}/s, "
+          f"{resultado.get('componentes_por_s', 0)} componentes/s) | erros: {resultado.get('erros', 0)}")
+    if not resultado["componentes"]:
+        return
+    print(f"Visão completa: p50={resultado['visao_p50_ms']}ms p95={resultado['visao_p95_ms']}ms p99={resultado['visao_p99_ms']}ms")
+    print(f"{'Visão':>5}  {'Componente':<40} {'N':>5} {'p50':>8} {'p95':>8} {'p99':>8} {'SQL p95':>8} {'Rend p95':>9}")
+    for c in resultado["componentes"]:
+        print(f"{c['visao']:>5}  {str(c['componente'])[:40]:<40} {c['amostras']:>5} {c['p50_ms']:>8} {c['p95_ms']:>8} "
+              f"{c['p99_ms']:>8} {c['sql_p95_ms']:>8} {c['render_p95_ms']:>9}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Teste de carga headless das visões do dashboard.")
+    parser.add_argument("--usuarios", default="1,5,10", help="Níveis de usuários simultâneos, separados por vírgula")
+    parser.add_argument("--duracao", type=float, default=30, help="Duração de cada nível (segundos)")
+    parser.add_argument("--pausa", type=float, default=0.0, help="Tempo máximo de 'leitura' entre visões por usuário (segundos)")
+    parser.add_argument("--dias-max", type=int, default=90, help="Tamanho máximo da janela de datas aleatória (dias)")
+    parser.add_argument("--visoes", help="Ids das visões a usar (padrão: todas)")
+    parser.add_argument("--semente", type=int, default=42)
+    parser.add_argument("--registrar-log", action="store_true", help="Grava as consultas em consultas_log")
+    parser.add_argument("--json", action="store_true", help="Emitir resultado em JSON")
+    args = parser.parse_args()
+
+    ids = {int(i) for i in args.visoes.split(",")} if args.visoes else None
+    visoes = carregar_visoes(ids)
+    if not visoes:
+        print("Nenhuma visão encontrada em visoes_dashboard.", file=sys.stderr)
+        sys.exit(1)
+    limites = limites_datas()
+
+    # Aquece matplotlib fora da medição
+    visuais.carregar_stack_grafica()
+
+    resultados = []
+    for usuarios in [int(u) for u in args.usuarios.split(",") if u.strip()]:
+        print(f"Rodando {usuarios} usuário(s) por {args.duracao}s em {len(visoes)} visão(ões)...", file=sys.stderr)
+        resultado = rodar_nivel(usuarios, visoes, limites, args)
+        resultados.append(resultado)
+        if not args.json:
+            imprimir(resultado)
+
+    if args.json:
+        print(json.dumps(resultados, indent=2, ensure_ascii=False, default=str))
+
+
+if __name__ == "__main__":
+    main()
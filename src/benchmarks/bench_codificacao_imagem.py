@@ -0,0 +1,85 @@
+"""
+Benchmark da codificação das imagens dos relatórios (visualizacao.salvar_figura): tempo de codificação e
+tamanho em bytes por formato (PNG, PNG com paleta, WebP, SVG), DPI e com/sem bbox_inches='tight'.
+
+Não usa o banco: desenha um gráfico de barras e um combinado (barras + linha) com dados sintéticos,
+no mesmo estilo de gerar_grafico, e codifica a mesma figura várias vezes.
+
+Uso:
+    python src/benchmarks/bench_codificacao_imagem.py
+    python src/benchmarks/bench_codificacao_imagem.py --dpis 72,100,120 --repeticoes 5 --json
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+DIR_APP = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'app'))
+sys.path.append(DIR_APP)
+
+import servicos.visualizacao as visuais
+
+
+def desenhar(tipo, rng):
+    plt, _, sns = visuais.carregar_stack_grafica()
+    meses = ["Janeiro", "Fevereiro", "Março", "Abril", "Maio", "Junho",
+             "Julho", "Agosto", "Setembro", "Outubro", "Novembro", "Dezembro"]
+    df = pd.DataFrame({"mes": meses, "receita": rng.gamma(4.0, 25000.0, 12), "pedidos": rng.integers(200, 900, 12)})
+
+    fig, ax = plt.subplots(figsize=(12, 7))
+    sns.barplot(data=df, x="mes", y="receita", hue="mes", palette="viridis", legend=False, ax=ax, edgecolor="black", linewidth=0.5)
+    if tipo == "combinado":
+        ax2 = ax.twinx()
+        sns.lineplot(data=df, x="mes", y="pedidos", ax=ax2, color='#e74c3c', marker='o', linewidth=3)
+    ax.set_title(f"Receita por mês ({tipo})", fontsize=16, weight='bold', pad=20)
+    visuais.wrap_labels(ax)
+    fig.tight_layout()
+    return fig
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compara formatos de codificação das imagens dos relatórios.")
+    parser.add_argument("--formatos", default=",".join(visuais.FORMATOS_IMAGEM))
+    parser.add_argument("--dpis", default="100,120")
+    parser.add_argument("--repeticoes", type=int, default=5)
+    parser.add_argument("--json", action="store_true", help="Emitir resultado em JSON")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(42)
+    plt, _, _ = visuais.carregar_stack_grafica()
+
+    resultados = []
+    for tipo in ("barra", "combinado"):
+        fig = desenhar(tipo, rng)
+        for formato in args.formatos.split(","):
+            for dpi in [int(d) for d in args.dpis.split(",")]:
+                for recorte in (True, False):
+                    tempos = []
+                    for _ in range(args.repeticoes):
+                        inicio = time.perf_counter()
+                        buf = visuais.salvar_figura(fig, formato, dpi, recorte)
+                        tempos.append(time.perf_counter() - inicio)
+                    resultados.append({
+                        "grafico": tipo, "formato": formato, "dpi": dpi, "recorte": recorte,
+                        "mediana_ms": round(statistics.median(tempos) * 1000, 1),
+                        "kb": round(len(buf.getbuffer()) / 1024, 1),
+                    })
+                    print(f"[{tipo}] {formato} dpi={dpi} recorte={recorte}: {resultados[-1]['mediana_ms']}ms", file=sys.stderr)
+        plt.close(fig)
+
+    if args.json:
+        print(json.dumps(resultados, indent=2, ensure_ascii=False))
+        return
+
+    print(f"{'Gráfico':<10} {'Formato':<8} {'DPI':>4} {'Recorte':>8} {'Mediana(ms)':>12} {'Tamanho(KB)':>12}")
+    for r in resultados:
+        print(f"{r['grafico']:<10} {r['formato']:<8} {r['dpi']:>4} {str(r['recorte']):>8} {r['mediana_ms']:>12} {r['kb']:>12}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,215 @@
+"""
+Benchmark reprodutível do ETL: gera Pedidos/Itens/Supply sintéticos no layout de colunas que o
+pipeline espera e roda src/etl/pipeline.py contra o Postgres local, coletando tempo, linhas/s e
+pico de RSS por etapa.
+
+ATENÇÃO: o pipeline recria as tabelas do banco configurado no .env. Use um banco local/descartável.
+
+Uso:
+    python src/benchmarks/bench_etl.py --tamanhos 10k,1m --confirmar --saida bench_etl.json
+    python src/benchmarks/bench_etl.py --tamanhos 10m --so-gerar --dir-dados /tmp/etl_10m
+
+O JSON de saída traz a versão (commit) para comparar regressões entre versões.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+RAIZ = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+PIPELINE = os.path.join(RAIZ, 'src', 'etl', 'pipeline.py')
+
+TAMANHOS = {"10k": 10_000, "100k": 100_000, "1m": 1_000_000, "10m": 10_000_000}
+
+# Proporções em relação à quantidade de pedidos
+ITENS_POR_PEDIDO = 1.5
+SUPRIMENTOS_POR_PEDIDO = 0.01
+
+# Ids de material e de suprimento a partir da casa do milhar, como no Supply.csv real ('2.546'): o separador aparece em qualquer tamanho
+ID_INICIAL = 1_000
+
+# Geração em blocos para não estourar memória nos tamanhos grandes
+LINHAS_POR_BLOCO = 500_000
+
+MESES_PT = np.array(["jan.", "fev.", "mar.", "abr.", "mai.", "jun.", "jul.", "ago.", "set.", "out.", "nov.", "dez."])
+ESTADOS = np.array(["SP", "RJ", "MG", "CE", "BA", "PR", "RS", "PE", "SC", "GO"])
+CIDADES = np.array(["São Paulo", "Rio de Janeiro", "Belo Horizonte", "Fortaleza", "Salvador", "Curitiba", "Porto Alegre", "Recife", "Florianópolis", "Goiânia"])
+TRANSPORTADORAS = np.array(["Correios PAC", "Correios SEDEX", "Jadlog", "Loggi", "Total Express"])
+STATUS_PEDIDO = np.array(["complete", "canceled", "pending", "shipped"])
+STATUS_ITEM = np.array(["produced", "canceled", "waiting", "shipped"])
+CATEGORIAS = np.array(["Capinha", "Copo", "Garrafa", "Estojo", "Mochila", "Acessório"])
+
+
+def moeda_br(valores):
+    """Formata floats no padrão brasileiro (1.234,56), como nos CSVs de origem."""
+    centavos = np.round(valores * 100).astype(np.int64)
+    inteiro, cent = centavos // 100, centavos % 100
+    milhar, resto = inteiro // 1000, inteiro % 1000
+    cent_s = pd.Series(cent).astype(str).str.zfill(2)
+    com_milhar = pd.Series(milhar).astype(str) + "." + pd.Series(resto).astype(str).str.zfill(3)
+    inteiro_s = pd.Series(inteiro).astype(str).where(milhar == 0, com_milhar)
+    return (inteiro_s + "," + cent_s).values
+
+
+def inteiro_milhar(valores):
+    """Formata inteiros com '.' como separador de milhar (1.787), como os ids e quantidades do Supply.csv."""
+    return pd.Series(valores).map("{:,}".format).str.replace(",", ".", regex=False).values
+
+
+def datas_pt(rng, n):
+    """Datas no formato '05 jan., 2025, 14:30' (mês abreviado em português)."""
+    inicio = np.datetime64("2025-01-01T00:00")
+    minutos = rng.integers(0, 365 * 24 * 60, n)
+    datas = pd.Series(inicio + minutos.astype("timedelta64[m]"))
+    meses = MESES_PT[datas.dt.month.values - 1]
+    return (datas.dt.strftime("%d") + " " + meses + ", " + datas.dt.strftime("%Y, %H:%M")).values
+
+
+def gerar_pedidos(rng, inicio, n):
+    ids = np.arange(inicio, inicio + n)
+    idx_local = rng.integers(0, len(ESTADOS), n)
+    return pd.DataFrame({
+        "id": ids,
+        "reference": "R" + pd.Series(ids).astype(str).str.zfill(9),
+        "created_at": datas_pt(rng, n),
+        "order_state": STATUS_PEDIDO[rng.integers(0, len(STATUS_PEDIDO), n)],
+        "Valor de NF (R$)": moeda_br(rng.gamma(2.0, 60.0, n)),
+        "Frete Cobrado do Cliente (R$)": moeda_br(rng.uniform(0, 40, n)),
+        "Cidade": CIDADES[idx_local],
+        "Estado": ESTADOS[idx_local],
+        "CEP": rng.integers(1_000_000, 99_999_999, n),
+        "Transportadora": TRANSPORTADORAS[rng.integers(0, len(TRANSPORTADORAS), n)],
+        "Número de Itens no Pedido": rng.integers(1, 5, n),
+        "Peso (kg)": moeda_br(rng.uniform(0.1, 3.0, n)),
+    })
+
+
+def gerar_itens(rng, n, total_pedidos, total_materiais):
+    materiais = rng.integers(ID_INICIAL, ID_INICIAL + total_materiais, n)
+    return pd.DataFrame({
+        "order_id": rng.integers(1, total_pedidos + 1, n),
+        "product_id": rng.integers(1, 50_000, n),
+        "material_id": materiais,
+        "material_name": "Material " + pd.Series(materiais).astype(str),
+        "material_category": CATEGORIAS[materiais % len(CATEGORIAS)],
+        "price": moeda_br(rng.gamma(2.0, 40.0, n)),
+        "aasm_state": STATUS_ITEM[rng.integers(0, len(STATUS_ITEM), n)],
+    })
+
+
+def gerar_suprimentos(rng, n, total_materiais):
+    materiais = rng.integers(ID_INICIAL, ID_INICIAL + total_materiais, n)
+    localizacoes = inteiro_milhar(rng.integers(1, 10_000, n))
+    return pd.DataFrame({
+        # ids, quantidades e localização com separador de milhar ('6.121'): exercita limpar_id_milhar/limpar_inteiro_milhar
+        "supply_id": inteiro_milhar(np.arange(ID_INICIAL, ID_INICIAL + n)),
+        "material_id": inteiro_milhar(materiais),
+        "quantity": inteiro_milhar(rng.integers(0, 5_000, n)),
+        "factory_id": rng.integers(1, 8, n),
+        "reposition": rng.random(n) < 0.3,
+        "leadtime": rng.integers(1, 30, n),
+        "discontinued": rng.random(n) < 0.05,
+        "inventory_centre_id": rng.integers(1, 15, n),
+        "should_sell": rng.random(n) < 0.9,
+        "material_localization_id": np.where(rng.random(n) < 0.5, localizacoes, ""),
+        "material_name": "Material " + pd.Series(materiais).astype(str),
+    })
+
+
+def escrever_em_blocos(caminho, total, gerar_bloco):
+    for inicio in range(0, total, LINHAS_POR_BLOCO):
+        n = min(LINHAS_POR_BLOCO, total - inicio)
+        gerar_bloco(inicio, n).to_csv(caminho, mode="w" if inicio == 0 else "a", header=inicio == 0, index=False)
+
+
+def gerar_dados(diretorio, linhas_pedidos, semente=42):
+    """Gera os três CSVs sintéticos. Retorna a contagem de linhas de cada um."""
+    os.makedirs(diretorio, exist_ok=True)
+    rng = np.random.default_rng(semente)
+    linhas_itens = int(linhas_pedidos * ITENS_POR_PEDIDO)
+    linhas_suprimentos = max(1_000, int(linhas_pedidos * SUPRIMENTOS_POR_PEDIDO))
+    total_materiais = max(100, linhas_suprimentos // 2)
+
+    escrever_em_blocos(os.path.join(diretorio, "Pedidos.csv"), linhas_pedidos,
+                       lambda inicio, n: gerar_pedidos(rng, inicio + 1, n))
+    escrever_em_blocos(os.path.join(diretorio, "Itens.csv"), linhas_itens,
+                       lambda inicio, n: gerar_itens(rng, n, linhas_pedidos, total_materiais))
+    escrever_em_blocos(os.path.join(diretorio, "Supply.csv"), linhas_suprimentos,
+                       lambda inicio, n: gerar_suprimentos(rng, n, total_materiais))
+
+    return {"pedidos": linhas_pedidos, "itens": linhas_itens, "suprimentos": linhas_suprimentos}
+
+
+def versao_atual():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, cwd=RAIZ).stdout.strip() or None
+    except Exception:
+        return None
+
+
+def rodar_pipeline(diretorio):
+    with tempfile.NamedTemporaryFile(suffix=".json", delete=False) as tmp:
+        arquivo_metricas = tmp.name
+    try:
+        res = subprocess.run(
+            [sys.executable, PIPELINE, "--metricas-json", arquivo_metricas],
+            cwd=RAIZ, env=dict(os.environ, DIR_DADOS=diretorio), capture_output=True, text=True
+        )
+        if res.returncode != 0:
+            raise RuntimeError(f"Pipeline falhou:\n{res.stdout[-2000:]}\n{res.stderr[-2000:]}")
+        with open(arquivo_metricas) as f:
+            return json.load(f)
+    finally:
+        os.remove(arquivo_metricas)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark do ETL com dados sintéticos.")
+    parser.add_argument("--tamanhos", default="10k", help=f"Tamanhos (pedidos) separados por vírgula: {', '.join(TAMANHOS)}")
+    parser.add_argument("--dir-dados", help="Onde gerar/reutilizar os CSVs (padrão: diretório temporário por tamanho)")
+    parser.add_argument("--so-gerar", action="store_true", help="Apenas gera os CSVs, sem rodar o pipeline")
+    parser.add_argument("--confirmar", action="store_true", help="Confirma que o banco do .env pode ser recriado")
+    parser.add_argument("--saida", help="Arquivo JSON de resultados (padrão: stdout)")
+    args = parser.parse_args()
+
+    if not args.so_gerar and not args.confirmar:
+        parser.error("O pipeline recria as tabelas do banco configurado. Rode com --confirmar (ou --so-gerar).")
+
+    resultados = []
+    for rotulo in [t.strip().lower() for t in args.tamanhos.split(",") if t.strip()]:
+        if rotulo not in TAMANHOS:
+            parser.error(f"Tamanho desconhecido: {rotulo}")
+
+        diretorio = args.dir_dados or os.path.join(tempfile.gettempdir(), f"gocase_bench_etl_{rotulo}")
+        print(f"[{rotulo}] Gerando dados sintéticos em {diretorio}...", file=sys.stderr)
+        linhas = gerar_dados(diretorio, TAMANHOS[rotulo])
+        if args.so_gerar:
+            continue
+
+        print(f"[{rotulo}] Rodando pipeline...", file=sys.stderr)
+        metricas = rodar_pipeline(diretorio)
+        resultados.append({
+            "versao": versao_atual(),
+            "tamanho": rotulo,
+            "linhas_entrada": linhas,
+            "executado_em": datetime.now().isoformat(timespec="seconds"),
+            **metricas,
+        })
+
+    saida = json.dumps(resultados, indent=2, ensure_ascii=False)
+    if args.saida:
+        with open(args.saida, "w") as f:
+            f.write(saida)
+        print(f"Resultados gravados em {args.saida}", file=sys.stderr)
+    elif resultados:
+        print(saida)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""
+Benchmark de cold start: mede o tempo de import dos módulos do app e dos jobs com `python -X importtime`
+e compara com um orçamento (budget) em milissegundos.
+
+Uso:
+    python src/benchmarks/bench_importtime.py            # tabela + top módulos mais pesados
+    python src/benchmarks/bench_importtime.py --json     # saída JSON (para comparar entre versões)
+
+Sai com código 1 se algum alvo estourar o orçamento.
+"""
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+
+RAIZ_SRC = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+# (módulo, diretório base no sys.path, orçamento em ms)
+# Os orçamentos assumem que matplotlib, seaborn, google.genai e requests NÃO são carregados no import.
+ALVOS = [
+    ("servicos.banco", "app", 900),
+    ("servicos.visualizacao", "app", 900),
+    ("servicos.ia", "app", 100),
+    ("utils.ui_helpers", "app", 1500),
+    ("pages_logic.dashboard", "app", 1500),
+    ("pages_logic.gerenciar_visoes", "app", 1500),
+    ("pages_logic.explorador", "app", 1500),
+    ("processar_visoes", "jobs", 1000),
+]
+
+# Módulos pesados que não podem aparecer no cold start
+MODULOS_PROIBIDOS = ["matplotlib", "seaborn", "google.genai", "requests"]
+
+PADRAO_LINHA = re.compile(r"import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+
+def medir(modulo, base):
+    """Executa um interpretador limpo e retorna (cumulativo_ms, {modulo: cumulativo_ms})."""
+    ambiente = dict(os.environ, PYTHONPATH=os.path.join(RAIZ_SRC, base))
+    res = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {modulo}"],
+        capture_output=True, text=True, env=ambiente, cwd=os.path.join(RAIZ_SRC, base)
+    )
+    if res.returncode != 0:
+        raise RuntimeError(f"Falha ao importar {modulo}: {res.stderr.strip().splitlines()[-1]}")
+
+    modulos = {}
+    for linha in res.stderr.splitlines():
+        m = PADRAO_LINHA.match(linha)
+        if m:
+            modulos[m.group(4)] = int(m.group(2)) / 1000
+    return modulos.get(modulo, 0.0), modulos
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Orçamento de tempo de import (cold start).")
+    parser.add_argument("--json", action="store_true", help="Emitir resultado em JSON")
+    parser.add_argument("--top", type=int, default=5, help="Quantos módulos mais pesados listar por alvo")
+    args = parser.parse_args()
+
+    resultados = []
+    for modulo, base, orcamento in ALVOS:
+        total, modulos = medir(modulo, base)
+        proibidos = [p for p in MODULOS_PROIBIDOS if p in modulos]
+        # Considera só pacotes de topo para o ranking (evita contar submódulos duas vezes)
+        topo = sorted(
+            ((nome, ms) for nome, ms in modulos.items() if '.' not in nome and nome != modulo),
+            key=lambda x: x[1], reverse=True
+        )[:args.top]
+        resultados.append({
+            "modulo": modulo,
+            "import_ms": round(total, 1),
+            "orcamento_ms": orcamento,
+            "dentro_orcamento": total <= orcamento and not proibidos,
+            "modulos_proibidos": proibidos,
+            "mais_pesados": [{"modulo": n, "ms": round(ms, 1)} for n, ms in topo],
+        })
+
+    if args.json:
+        print(json.dumps(resultados, indent=2, ensure_ascii=False))
+    else:
+        print(f"{'Módulo':<32} {'Import (ms)':>12} {'Orçamento':>10}  Status")
+        for r in resultados:
+            status = "OK" if r["dentro_orcamento"] else "ESTOUROU"
+            if r["modulos_proibidos"]:
+                status += f" (carrega {', '.join(r['modulos_proibidos'])})"
+            print(f"{r['modulo']:<32} {r['import_ms']:>12.1f} {r['orcamento_ms']:>10}  {status}")
+            pesados = ", ".join(f"{p['modulo']}={p['ms']:.0f}ms" for p in r["mais_pesados"])
+            print(f"    mais pesados: {pesados}")
+
+    sys.exit(0 if all(r["dentro_orcamento"] for r in resultados) else 1)
+
+
+if __name__ == "__main__":
+    main()
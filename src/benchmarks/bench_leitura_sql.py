@@ -0,0 +1,98 @@
+"""
+Benchmark dos motores de leitura de consultas (servicos/leitor_sql.py): pd.read_sql x COPY/CSV -> Arrow
+x ADBC x connectorx, com resultados de 100 mil e 1 milhão de linhas.
+
+A consulta padrão gera linhas sintéticas no próprio Postgres (generate_series) com os tipos usados
+nas visões: inteiros, texto de baixa e alta cardinalidade, NUMERIC, TIMESTAMP e DATE.
+
+Uso (Postgres local do docker-compose, variáveis do .env):
+    python src/benchmarks/bench_leitura_sql.py
+    python src/benchmarks/bench_leitura_sql.py --linhas 100000,1000000 --repeticoes 5 --json
+    python src/benchmarks/bench_leitura_sql.py --sql "SELECT * FROM itens"
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+
+import pandas as pd
+from sqlalchemy import text
+
+DIR_APP = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'app'))
+sys.path.append(DIR_APP)
+
+import servicos.banco as banco
+import servicos.leitor_sql as leitor_sql
+
+SQL_SINTETICO = """
+    SELECT
+        g AS id,
+        'pedido-' || g AS id_pedido,
+        (ARRAY['SP','RJ','MG','CE','BA'])[1 + g % 5] AS estado_cliente,
+        (g % 997)::numeric(12,2) + 0.99 AS valor_total,
+        g % 7 AS dia_semana,
+        TIMESTAMP '2025-01-01' + (g % 525600) * INTERVAL '1 minute' AS criado_em,
+        DATE '2025-01-01' + (g % 365) AS dia
+    FROM generate_series(1, :linhas) AS g
+"""
+
+
+def ler(motor, engine, sql, params):
+    if motor == "read_sql":
+        return pd.read_sql(text(sql), engine, params=params)
+    return leitor_sql.LEITORES[motor](engine, sql, params)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compara os motores de leitura de consultas.")
+    parser.add_argument("--linhas", default="100000,1000000", help="Tamanhos do resultado sintético")
+    parser.add_argument("--sql", help="Consulta própria (ignora --linhas)")
+    parser.add_argument("--repeticoes", type=int, default=3)
+    parser.add_argument("--json", action="store_true", help="Emitir resultado em JSON")
+    args = parser.parse_args()
+
+    engine = banco.obter_conexao()
+    motores = ["read_sql"] + [m for m in leitor_sql.LEITORES if leitor_sql._pacote_disponivel(m)]
+
+    cenarios = [(args.sql, None, "sql")] if args.sql else [
+        (SQL_SINTETICO, {"linhas": int(n)}, n) for n in args.linhas.split(",")
+    ]
+
+    resultados = []
+    for sql, params, rotulo in cenarios:
+        for motor in motores:
+            tempos, df, erro = [], None, None
+            try:
+                for _ in range(args.repeticoes):
+                    inicio = time.perf_counter()
+                    df = ler(motor, engine, sql, params)
+                    tempos.append(time.perf_counter() - inicio)
+            except Exception as e:
+                erro = str(e)
+            resultados.append({
+                "cenario": rotulo,
+                "motor": motor,
+                "linhas": None if df is None else len(df),
+                "mediana_s": round(statistics.median(tempos), 3) if tempos else None,
+                "melhor_s": round(min(tempos), 3) if tempos else None,
+                "memoria_mb": None if df is None else round(df.memory_usage(deep=True).sum() / 1024 ** 2, 1),
+                "erro": erro,
+            })
+            print(f"[{rotulo}] {motor}: {resultados[-1]['mediana_s']}s", file=sys.stderr)
+
+    if args.json:
+        print(json.dumps(resultados, indent=2, ensure_ascii=False))
+        return
+
+    print(f"{'Cenário':>10} {'Motor':<12} {'Linhas':>9} {'Mediana(s)':>11} {'Melhor(s)':>10} {'Memória(MB)':>12}")
+    for r in resultados:
+        if r["erro"]:
+            print(f"{r['cenario']:>10} {r['motor']:<12} ERRO: {r['erro'][:80]}")
+            continue
+        print(f"{r['cenario']:>10} {r['motor']:<12} {r['linhas']:>9} {r['mediana_s']:>11} {r['melhor_s']:>10} {r['memoria_mb']:>12}")
+
+
+if __name__ == "__main__":
+    main()
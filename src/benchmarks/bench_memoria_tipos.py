@@ -0,0 +1,124 @@
+"""
+Benchmark de memória da política de tipos compactos (servicos/tipos.py).
+
+Compara, com e sem a política, a memória (deep) dos DataFrames limpos do ETL, o pico de alocação
+do merge de main() (montar_pedidos_final) e o tamanho de um resultado grande do playground
+(itens x pedidos, como o pandas devolve do read_sql: textos em object, inteiros em int64).
+
+Não usa o banco: os dados de entrada são os mesmos CSVs sintéticos do bench_etl.
+
+Uso:
+    python src/benchmarks/bench_memoria_tipos.py --linhas 1000000
+    python src/benchmarks/bench_memoria_tipos.py --linhas 200000 --json
+"""
+import argparse
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'etl')))
+
+import bench_etl
+import pipeline
+import servicos.tipos as tipos
+
+try:
+    import pyarrow
+except ImportError:
+    pyarrow = None
+
+
+def mb(df):
+    return round(df.memory_usage(index=True, deep=True).sum() / 1024 ** 2, 1)
+
+
+def medir(func, *args):
+    """Executa func medindo tempo e pico de alocação (numpy via tracemalloc + buffers do Arrow)."""
+    arrow_antes = pyarrow.total_allocated_bytes() if pyarrow else 0
+    tracemalloc.start()
+    inicio = time.perf_counter()
+    resultado = func(*args)
+    duracao = time.perf_counter() - inicio
+    _, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    arrow = (pyarrow.total_allocated_bytes() - arrow_antes) if pyarrow else 0
+    return resultado, round(duracao, 2), round((pico + max(arrow, 0)) / 1024 ** 2, 1)
+
+
+def resultado_playground(df_itens, df_pedidos):
+    """Simula um SELECT grande do playground com os tipos que o read_sql devolve."""
+    df = df_itens.merge(df_pedidos[['id_pedido', 'status', 'estado_cliente', 'transportadora', 'criado_em']],
+                        on='id_pedido', how='inner', suffixes=('_item', '_pedido'))
+    for col in df.columns:
+        if not pd.api.types.is_numeric_dtype(df[col]) and not pd.api.types.is_datetime64_any_dtype(df[col]):
+            df[col] = df[col].astype(object)
+        elif pd.api.types.is_integer_dtype(df[col]):
+            df[col] = df[col].astype('int64')
+    df['quantidade'] = np.int64(1)
+    return df
+
+
+def rodar(brutos, politica):
+    tipos.ATIVA = politica
+    df_pedidos = pipeline.limpar_pedidos(brutos['pedidos'])
+    df_itens = pipeline.limpar_itens(brutos['itens'])
+    pedidos_final, merge_s, merge_pico = medir(pipeline.montar_pedidos_final, df_pedidos, df_itens)
+
+    # Playground: sempre parte dos tipos "largos" do read_sql; a política é aplicada como no banco.executar_consulta
+    tipos.ATIVA = False
+    bruto_playground = resultado_playground(pipeline.limpar_itens(brutos['itens']), pipeline.limpar_pedidos(brutos['pedidos']))
+    tipos.ATIVA = politica
+    playground, conv_s, _ = medir(tipos.compactar_resultado, bruto_playground)
+
+    return {
+        "politica": politica,
+        "pedidos_mb": mb(df_pedidos),
+        "itens_mb": mb(df_itens),
+        "pedidos_final_mb": mb(pedidos_final),
+        "merge_s": merge_s,
+        "merge_pico_alocado_mb": merge_pico,
+        "playground_linhas": len(playground),
+        "playground_mb": mb(playground),
+        "playground_conversao_s": conv_s,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Memória com e sem a política de tipos compactos.")
+    parser.add_argument("--linhas", type=int, default=200_000, help="Quantidade de pedidos sintéticos")
+    parser.add_argument("--json", action="store_true", help="Emitir resultado em JSON")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(42)
+    total_materiais = max(100, args.linhas // 200)
+    brutos = {
+        "pedidos": bench_etl.gerar_pedidos(rng, 1, args.linhas),
+        "itens": bench_etl.gerar_itens(rng, int(args.linhas * bench_etl.ITENS_POR_PEDIDO), args.linhas, total_materiais),
+    }
+
+    resultados = [rodar(brutos, politica=False), rodar(brutos, politica=True)]
+    antes, depois = resultados
+    reducao = {
+        chave: round(1 - depois[chave] / antes[chave], 3) if antes[chave] else None
+        for chave in ("pedidos_mb", "itens_mb", "pedidos_final_mb", "merge_pico_alocado_mb", "playground_mb")
+    }
+
+    if args.json:
+        print(json.dumps({"linhas": args.linhas, "resultados": resultados, "reducao": reducao}, indent=2))
+        return
+
+    print(f"{'Métrica':<28} {'Padrão':>10} {'Compacto':>10} {'Redução':>9}")
+    for chave in antes:
+        if chave == "politica":
+            continue
+        red = f"{reducao[chave] * 100:.0f}%" if reducao.get(chave) is not None else ""
+        print(f"{chave:<28} {antes[chave]:>10} {depois[chave]:>10} {red:>9}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""
+Micro-benchmark da ordenação lógica do eixo X (visualizacao.sort_dataframe_logically): a versão anterior
+(regex por valor via .apply, chave float/str misturada) x a versão vetorizada (str.extract + np.lexsort).
+
+Cenários: faixas numéricas ("5-10%", ">15%"), meses por extenso e rótulos mistos (faixas + texto), caso
+em que a versão anterior quebrava no sort_values e devolvia o DataFrame sem ordenar.
+
+Uso:
+    python src/benchmarks/bench_ordenacao_eixo.py
+    python src/benchmarks/bench_ordenacao_eixo.py --linhas 100,10000,1000000 --json
+"""
+import argparse
+import json
+import os
+import re
+import statistics
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+DIR_APP = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'app'))
+sys.path.append(DIR_APP)
+
+import servicos.visualizacao as visuais
+
+ROTULOS = {
+    "faixas": ["<5%", "5-10%", "10-15%", "15-20%", ">20%"],
+    "meses": ["Janeiro", "Fevereiro", "Março", "Abril", "Maio", "Junho",
+              "Julho", "Agosto", "Setembro", "Outubro", "Novembro", "Dezembro"],
+    "misto": ["R$ 0-100", "R$ 100-200", "R$ 200-500", "R$ 1.000+", "Outros", "Sem valor"],
+}
+
+
+def sort_dataframe_logically_original(df, col):
+    """Cópia da implementação anterior, mantida só como referência do benchmark."""
+    try:
+        if df.empty or col not in df.columns:
+            return df
+        if pd.api.types.is_numeric_dtype(df[col]) or pd.api.types.is_datetime64_any_dtype(df[col]):
+            return df.sort_values(by=col)
+        df = df.copy()
+
+        def extract_sort_key(val):
+            s = str(val).strip()
+            match = re.search(r'(\d+[.,]?\d*)', s)
+            if match:
+                num = float(match.group(1).replace(',', '.'))
+                if '>' in s: num += 0.1
+                if '<' in s: num -= 0.1
+                return num
+            return s
+
+        df['_sort_key'] = df[col].apply(extract_sort_key)
+        return df.sort_values(by='_sort_key').drop(columns=['_sort_key'])
+    except Exception:
+        return df
+
+
+def cronometrar(func, df, repeticoes):
+    tempos = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        resultado = func(df, "rotulo")
+        tempos.append(time.perf_counter() - inicio)
+    return resultado, statistics.median(tempos)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compara as implementações da ordenação lógica do eixo X.")
+    parser.add_argument("--linhas", default="100,10000,1000000", help="Tamanhos dos DataFrames")
+    parser.add_argument("--repeticoes", type=int, default=5)
+    parser.add_argument("--json", action="store_true", help="Emitir resultado em JSON")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(42)
+    metodos = {"original": sort_dataframe_logically_original, "vetorizada": visuais.sort_dataframe_logically}
+
+    resultados = []
+    for cenario, rotulos in ROTULOS.items():
+        for n in [int(x) for x in args.linhas.split(",")]:
+            df = pd.DataFrame({"rotulo": rng.choice(rotulos, n), "valor": rng.random(n)})
+            for nome, func in metodos.items():
+                resultado, mediana = cronometrar(func, df, args.repeticoes)
+                resultados.append({
+                    "cenario": cenario,
+                    "linhas": n,
+                    "metodo": nome,
+                    "mediana_ms": round(mediana * 1000, 2),
+                    # Ordem do eixo resultante (primeira ocorrência de cada rótulo)
+                    "ordem": list(dict.fromkeys(resultado["rotulo"].tolist()))[:len(rotulos)],
+                    "ordenou": not resultado.index.equals(df.index),
+                })
+                print(f"[{cenario} {n}] {nome}: {resultados[-1]['mediana_ms']}ms", file=sys.stderr)
+
+    if args.json:
+        print(json.dumps(resultados, indent=2, ensure_ascii=False))
+        return
+
+    print(f"{'Cenário':<8} {'Linhas':>8} {'Método':<11} {'Mediana(ms)':>12} {'Ordenou':>8}  Ordem")
+    for r in resultados:
+        print(f"{r['cenario']:<8} {r['linhas']:>8} {r['metodo']:<11} {r['mediana_ms']:>12} {str(r['ordenou']):>8}  {', '.join(r['ordem'][:6])}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,170 @@
+"""
+Benchmark da renderização de tabelas para envio (servicos/visualizacao.py): a gerar_tabela_imagem
+original (apply por célula, iterrows e laço de estilo por célula, tabela inteira numa imagem) x
+gerar_tabela_imagens (formatação por coluna, páginas de LINHAS_POR_IMAGEM linhas) x gerar_tabela_csv.
+
+Não usa o banco: a tabela é sintética, com texto longo, texto curto, float e inteiro
+(parecida com os resultados de "Estoque Baixo" e dos rankings de produtos).
+
+Uso:
+    python src/benchmarks/bench_tabela_imagem.py
+    python src/benchmarks/bench_tabela_imagem.py --linhas 50,500,2000 --json
+"""
+import argparse
+import json
+import os
+import sys
+import textwrap
+import time
+import tracemalloc
+from io import BytesIO
+
+import numpy as np
+import pandas as pd
+
+DIR_APP = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'app'))
+sys.path.append(DIR_APP)
+
+import servicos.visualizacao as visuais
+
+
+def gerar_tabela(rng, n):
+    produtos = np.array([
+        "Capinha Transparente", "Capinha Personalizada com Nome e Foto da Família Inteira",
+        "Película 3D", "Carregador Turbo 20W USB-C com Cabo Trançado de Dois Metros", "Garrafa Térmica",
+    ])
+    return pd.DataFrame({
+        "nome_produto": produtos[rng.integers(0, len(produtos), n)],
+        "estado_cliente": rng.choice(["SP", "RJ", "MG", "CE", "BA"], n),
+        "receita": rng.gamma(2.0, 1500.0, n).round(2),
+        "quantidade": rng.integers(1, 5000, n),
+    })
+
+
+def gerar_tabela_imagem_original(df, titulo="Tabela"):
+    """Cópia da implementação anterior, mantida só como referência do benchmark."""
+    plt, _, _ = visuais.carregar_stack_grafica()
+    df_display = df.copy()
+
+    WIDTH_WRAP = 35
+    def smart_wrap(text, width=WIDTH_WRAP):
+        return textwrap.fill(str(text), width=width)
+
+    for col in df_display.columns:
+        if pd.api.types.is_float_dtype(df_display[col]):
+            df_display[col] = df_display[col].apply(lambda x: f"{x:,.2f}".replace(",", "X").replace(".", ",").replace("X", "."))
+        elif pd.api.types.is_string_dtype(df_display[col]) or pd.api.types.is_object_dtype(df_display[col]):
+            df_display[col] = df_display[col].apply(lambda x: smart_wrap(x, width=WIDTH_WRAP))
+
+    num_cols = len(df.columns)
+    num_rows = len(df)
+    total_text_lines = 2
+    row_heights = []
+    for idx, row in df_display.iterrows():
+        max_lines_in_row = 1
+        for item in row:
+            if isinstance(item, str):
+                max_lines_in_row = max(max_lines_in_row, item.count('\n') + 1)
+        row_heights.append(max_lines_in_row)
+        total_text_lines += max_lines_in_row
+
+    altura_total = max(2, total_text_lines * 0.4 + 1)
+    largura_total = max(8, min(num_cols * 4, 22))
+    plt.figure(figsize=(largura_total, altura_total))
+    ax = plt.gca()
+    ax.axis('off')
+    tabela = plt.table(cellText=df_display.values, colLabels=df_display.columns, loc='upper center',
+                       cellLoc='left', colLoc='center', edges='horizontal')
+    cell_dict = tabela.get_celld()
+    for row in range(num_rows + 1):
+        height = 0.1 if row == 0 else row_heights[row - 1] * 0.08 + 0.05
+        for col in range(num_cols):
+            if (row, col) in cell_dict:
+                cell = cell_dict[(row, col)]
+                cell.set_height(height)
+                cell.set_edgecolor('#eeeeee')
+                cell.set_linewidth(1)
+                if row == 0:
+                    cell.set_text_props(weight='bold', color='white', size=11, ha='center')
+                    cell.set_facecolor('#2c3e50')
+                else:
+                    cell.set_facecolor('white' if row % 2 != 0 else '#fdfdfd')
+    plt.title(titulo, fontsize=14, weight='bold', color='#333333', pad=10)
+    buf = BytesIO()
+    plt.savefig(buf, format='png', dpi=150, bbox_inches='tight', pad_inches=0.1)
+    buf.seek(0)
+    plt.close()
+    return [buf]
+
+
+def paginada(df):
+    imagens, erro = visuais.gerar_tabela_imagens(df, "Tabela")
+    if erro:
+        raise RuntimeError(erro)
+    return imagens
+
+
+def csv(df):
+    return [visuais.gerar_tabela_csv(df)]
+
+
+def medir(func, df):
+    """Tempo numa execução limpa e pico de alocação numa segunda (o tracemalloc deixa o Python ~3x mais lento)."""
+    inicio = time.perf_counter()
+    try:
+        buffers = func(df)
+    except (MemoryError, ValueError) as e:
+        # A versão original estoura a altura máxima da figura do Agg em tabelas grandes
+        visuais.plt.close('all')
+        return {"segundos": round(time.perf_counter() - inicio, 3), "pico_mb": None, "arquivos": 0, "bytes": 0,
+                "erro": f"{type(e).__name__}: {e}"}
+    duracao = time.perf_counter() - inicio
+
+    tracemalloc.start()
+    func(df)
+    _, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        "segundos": round(duracao, 3),
+        "pico_mb": round(pico / 1024 ** 2, 1),
+        "arquivos": len(buffers),
+        "bytes": sum(len(b.getbuffer()) for b in buffers),
+        "erro": None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compara a renderização de tabelas para envio.")
+    parser.add_argument("--linhas", default="50,500,2000", help="Tamanhos das tabelas")
+    parser.add_argument("--limite-original", type=int, default=2000, help="Maior tabela medida na versão original")
+    parser.add_argument("--json", action="store_true", help="Emitir resultado em JSON")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(42)
+    visuais.carregar_stack_grafica()
+    metodos = {"original": gerar_tabela_imagem_original, "paginada": paginada, "csv": csv}
+
+    resultados = []
+    for n in [int(x) for x in args.linhas.split(",")]:
+        df = gerar_tabela(rng, n)
+        for nome, func in metodos.items():
+            if nome == "original" and n > args.limite_original:
+                continue
+            r = {"linhas": n, "metodo": nome, **medir(func, df)}
+            resultados.append(r)
+            print(f"[{n}] {nome}: {r['segundos']}s", file=sys.stderr)
+
+    if args.json:
+        print(json.dumps(resultados, indent=2, ensure_ascii=False))
+        return
+
+    print(f"{'Linhas':>7} {'Método':<9} {'Tempo(s)':>9} {'Pico(MB)':>9} {'Arquivos':>9} {'Tamanho(KB)':>12}")
+    for r in resultados:
+        if r["erro"]:
+            print(f"{r['linhas']:>7} {r['metodo']:<9} {r['segundos']:>9} ERRO: {r['erro'][:60]}")
+            continue
+        print(f"{r['linhas']:>7} {r['metodo']:<9} {r['segundos']:>9} {r['pico_mb']:>9} {r['arquivos']:>9} {r['bytes'] / 1024:>12.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -2,9 +2,21 @@ import pandas as pd
 from sqlalchemy import create_engine, text
 import json
 import os
+import io
+import csv
+import sys
+import gzip
 import time
+import hashlib
+import argparse
+from contextlib import contextmanager
 from datetime import datetime
 
+try:
+    import resource # Unix: pico de memória residente do processo
+except ImportError:
+    resource = None
+
 # Carregar variáveis de ambiente manualmente se necessário (para execução local)
 def carregar_env():
     arquivo_env = '.env'
@@ -26,6 +38,62 @@ DB_NAME = os.getenv("POSTGRES_DB", "gocase_db")
 
 DATABASE_URL = f"postgresql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
 
+# Diretório dos CSVs de origem (o benchmark aponta para dados sintéticos)
+DIR_DADOS = os.getenv("DIR_DADOS", "dados")
+
+# Política de tipos compactos compartilhada com o app (categorias, inteiros reduzidos, strings Arrow)
+DIR_APP = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'app'))
+sys.path.append(DIR_APP)
+import servicos.tipos as tipos
+
+# Registros por bloco comprimido do arquivo bruto (buscar uma linha descomprime só o seu bloco)
+LINHAS_POR_BLOCO_BRUTO = 10000
+
+# Métricas por etapa da execução atual
+METRICAS_ETAPAS = []
+
+# Carga sem janela vazia: as tabelas derivadas dos CSVs são montadas em sombras (pedidos__new, ...),
+# indexadas e só então trocadas pelas atuais com RENAME numa única transação (ver trocar_tabelas)
+SUFIXO_SOMBRA = "__new"
+# Na ordem de dependência (itens referencia pedidos)
+TABELAS_CARGA = ["pedidos", "itens", "suprimentos", "disponibilidade_materiais", "localidades", "pedidos_geo_diario", "cubo_frete"]
+# A troca espera no máximo isto pelo lock de cada tabela (consultas longas em andamento) antes de tentar de novo
+LOCK_TIMEOUT_TROCA = "5s"
+TENTATIVAS_TROCA = 5
+
+# Faixas de peso do cubo de frete (kg, limite superior inclusivo); rótulos ordenáveis pelo eixo do dashboard
+FAIXAS_PESO_KG = [0, 0.3, 0.5, 1, 2, 5, 10, float("inf")]
+ROTULOS_FAIXAS_PESO = ["0-0,3 kg", "0,3-0,5 kg", "0,5-1 kg", "1-2 kg", "2-5 kg", "5-10 kg", ">10 kg"]
+
+def sombra(tabela):
+    return f"{tabela}{SUFIXO_SOMBRA}"
+
+def pico_rss_mb():
+    """Pico de memória residente do processo até agora (MB), ou None se indisponível."""
+    if resource is None:
+        return None
+    pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reporta em KB, macOS em bytes
+    return round(pico / (1024 * 1024) if sys.platform == 'darwin' else pico / 1024, 1)
+
+@contextmanager
+def medir_etapa(nome):
+    """
+    Mede tempo de parede, linhas/s e pico de RSS de uma etapa do ETL.
+    Use etapa['linhas'] = N dentro do bloco para registrar o volume processado.
+    """
+    etapa = {"etapa": nome, "linhas": None}
+    inicio = time.perf_counter()
+    try:
+        yield etapa
+    finally:
+        duracao = time.perf_counter() - inicio
+        etapa["duracao_s"] = round(duracao, 3)
+        etapa["linhas_por_s"] = round(etapa["linhas"] / duracao, 1) if etapa["linhas"] and duracao > 0 else None
+        etapa["pico_rss_mb"] = pico_rss_mb()
+        METRICAS_ETAPAS.append(etapa)
+        print(f"  [{nome}] {etapa['duracao_s']}s, {etapa['linhas'] or 0} linhas, {etapa['linhas_por_s'] or '-'} linhas/s, pico RSS {etapa['pico_rss_mb']} MB")
+
 def obter_engine():
     tentativas = 10
     while tentativas > 0:
@@ -44,6 +112,14 @@ def limpar_moeda(valor):
         return float(valor.replace('.', '').replace(',', '.'))
     return valor
 
+def limpar_inteiro_milhar(serie):
+    """Inteiros com '.' como separador de milhar (ex: '1.787', '999.999.998'). Inválidos viram NaN."""
+    return pd.to_numeric(serie.astype(str).str.replace('.', '', regex=False), errors='coerce')
+
+def limpar_id_milhar(serie):
+    """Identificadores com '.' como separador de milhar ('7.900' -> '7900'), como texto."""
+    return serie.astype(str).str.strip().str.replace('.', '', regex=False)
+
 def analisar_datas(data_str):
     if not isinstance(data_str, str):
         return None
@@ -65,25 +141,48 @@ def analisar_datas(data_str):
         return None
 
 def configurar_banco(engine):
+    """
+    Cria as tabelas permanentes que faltarem e as sombras vazias desta carga.
+    As tabelas atuais não são tocadas: o dashboard continua lendo a carga anterior até trocar_tabelas.
+    """
     with engine.connect() as conn:
-        # Reiniciar esquema para garantir limpeza
-        conn.execute(text("DROP TABLE IF EXISTS itens CASCADE;"))
-        conn.execute(text("DROP TABLE IF EXISTS pedidos CASCADE;"))
-        conn.execute(text("DROP TABLE IF EXISTS suprimentos CASCADE;"))
+        # Sombras de uma execução interrompida
+        for tabela in reversed(TABELAS_CARGA):
+            conn.execute(text(f"DROP TABLE IF EXISTS {sombra(tabela)} CASCADE;"))
+        # Tabela antiga (um JSONB por linha do CSV), substituída por arquivos_brutos
         conn.execute(text("DROP TABLE IF EXISTS dados_brutos CASCADE;"))
-        conn.execute(text("DROP TABLE IF EXISTS visoes_dashboard CASCADE;"))
 
+        # Arquivo bruto: cada CSV ingerido é guardado uma única vez (deduplicado pelo sha256 do conteúdo),
+        # em blocos de linhas comprimidos com gzip. Não é recriado: serve de histórico entre cargas.
         conn.execute(text("""
-            CREATE TABLE IF NOT EXISTS dados_brutos (
+            CREATE TABLE IF NOT EXISTS arquivos_brutos (
                 id SERIAL PRIMARY KEY,
                 arquivo_origem TEXT,
+                sha256 TEXT UNIQUE,
+                cabecalho TEXT,
+                linhas BIGINT,
+                tamanho_bytes BIGINT,
+                tamanho_comprimido BIGINT,
                 criado_em TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                dados_brutos JSONB
+                ultimo_carregamento TIMESTAMP DEFAULT CURRENT_TIMESTAMP
             );
         """))
-
+        # linha_inicial é o índice de offsets: a linha N está no bloco com maior linha_inicial <= N
         conn.execute(text("""
-            CREATE TABLE IF NOT EXISTS pedidos (
+            CREATE TABLE IF NOT EXISTS arquivos_brutos_blocos (
+                id_arquivo INTEGER REFERENCES arquivos_brutos(id) ON DELETE CASCADE,
+                bloco INTEGER,
+                linha_inicial BIGINT,
+                linhas INTEGER,
+                dados BYTEA,
+                PRIMARY KEY (id_arquivo, bloco)
+            );
+        """))
+        conn.execute(text("CREATE INDEX IF NOT EXISTS idx_arquivos_brutos_blocos_linha ON arquivos_brutos_blocos (id_arquivo, linha_inicial);"))
+        conn.execute(text("CREATE INDEX IF NOT EXISTS idx_arquivos_brutos_origem ON arquivos_brutos (arquivo_origem, ultimo_carregamento);"))
+
+        conn.execute(text(f"""
+            CREATE TABLE {sombra('pedidos')} (
                 id_pedido TEXT PRIMARY KEY,
                 cliente_ref TEXT,
                 criado_em TIMESTAMP,
@@ -103,36 +202,142 @@ def configurar_banco(engine):
                 desconto_perc NUMERIC,
                 mes_pedido INTEGER,
                 ano_pedido INTEGER,
-                dia_semana INTEGER
+                dia_semana INTEGER,
+                
+                -- Linhagem: posição da linha no CSV de origem (ver buscar_linha_bruta)
+                linha_origem INTEGER,
+
+                -- Chave da dimensão localidades (cidade/estado normalizados)
+                id_localidade INTEGER
             );
         """))
 
-        conn.execute(text("""
-            CREATE TABLE IF NOT EXISTS itens (
+        conn.execute(text(f"""
+            CREATE TABLE {sombra('itens')} (
                 id SERIAL PRIMARY KEY,
-                id_pedido TEXT REFERENCES pedidos(id_pedido),
+                id_pedido TEXT REFERENCES {sombra('pedidos')}(id_pedido),
                 id_produto TEXT,
                 id_material TEXT,
                 nome_material TEXT,
                 categoria TEXT,
                 preco NUMERIC,
                 status TEXT,
-                quantidade INTEGER DEFAULT 1
+                quantidade INTEGER DEFAULT 1,
+                linha_origem INTEGER
             );
         """))
 
-        conn.execute(text("""
-            CREATE TABLE IF NOT EXISTS suprimentos (
+        conn.execute(text(f"""
+            CREATE TABLE {sombra('suprimentos')} (
                 id_suprimento TEXT PRIMARY KEY,
                 id_material TEXT,
                 nome_material TEXT,
                 quantidade INTEGER,
                 tempo_entrega INTEGER,
                 id_fabrica INTEGER,
-                descontinuado BOOLEAN
+                descontinuado BOOLEAN,
+                reposicao BOOLEAN,
+                id_centro_estoque SMALLINT,
+                deve_vender BOOLEAN,
+                id_localizacao_material INTEGER,
+                linha_origem INTEGER
+            );
+        """))
+        
+        # Índice de disponibilidade por material (uma linha por material, montada a partir de suprimentos + itens)
+        conn.execute(text(f"""
+            CREATE TABLE {sombra('disponibilidade_materiais')} (
+                id_material TEXT PRIMARY KEY,
+                nome_material TEXT,
+                estoque_total BIGINT,
+                qtd_fabricas INTEGER,
+                tempo_entrega_min INTEGER,
+                tempo_entrega_medio NUMERIC,
+                descontinuado BOOLEAN,
+                demanda_30d BIGINT,
+                demanda_90d BIGINT,
+                cobertura_dias NUMERIC,
+                atualizado_em TIMESTAMP
             );
         """))
         
+        # Dimensão de localidades: cidade/estado dos pedidos normalizados (texto livre no CSV) com chave inteira
+        conn.execute(text(f"""
+            CREATE TABLE {sombra('localidades')} (
+                id_localidade INTEGER PRIMARY KEY,
+                estado TEXT,
+                cidade TEXT,
+                cidade_normalizada TEXT,
+                prefixo_cep TEXT
+            );
+        """))
+
+        # Agregado diário por localidade: rankings e mapas geográficos sem varrer pedidos
+        conn.execute(text(f"""
+            CREATE TABLE {sombra('pedidos_geo_diario')} (
+                dia DATE,
+                id_localidade INTEGER,
+                pedidos INTEGER,
+                valor_total NUMERIC,
+                custo_frete NUMERIC,
+                total_itens_preco NUMERIC,
+                desconto_implicito NUMERIC,
+                contagem_itens BIGINT,
+                peso_kg NUMERIC,
+                PRIMARY KEY (dia, id_localidade)
+            );
+        """))
+
+        # Cubo de frete: transportadora x estado x faixa de peso x dia com contagem, somas e somas dos quadrados
+        # (médias, custo por kg e variâncias saem do cubo sem voltar aos pedidos)
+        conn.execute(text(f"""
+            CREATE TABLE {sombra('cubo_frete')} (
+                dia DATE,
+                transportadora TEXT,
+                estado TEXT,
+                faixa_peso TEXT,
+                ordem_faixa_peso SMALLINT,
+                pedidos INTEGER,
+                frete_soma NUMERIC,
+                frete_soma_quadrados NUMERIC,
+                peso_soma NUMERIC,
+                peso_soma_quadrados NUMERIC,
+                itens_soma BIGINT,
+                itens_soma_quadrados BIGINT
+            );
+        """))
+
+        # Catálogo de metadados (não é recriado: a versão de carga precisa sobreviver entre execuções)
+        conn.execute(text("""
+            CREATE TABLE IF NOT EXISTS catalogo_tabelas (
+                tabela TEXT PRIMARY KEY,
+                linhas BIGINT,
+                data_min TIMESTAMP,
+                data_max TIMESTAMP,
+                carregado_em TIMESTAMP,
+                versao_carga BIGINT
+            );
+        """))
+        
+        # Log de consultas do app (histórico preservado entre cargas)
+        conn.execute(text("""
+            CREATE TABLE IF NOT EXISTS consultas_log (
+                id BIGSERIAL PRIMARY KEY,
+                executado_em TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                fingerprint TEXT,
+                sql_normalizado TEXT,
+                id_visao INTEGER,
+                id_componente TEXT,
+                duracao_ms NUMERIC,
+                linhas INTEGER,
+                peso NUMERIC DEFAULT 1,
+                plan_hash TEXT,
+                erro TEXT
+            );
+        """))
+        conn.execute(text("CREATE INDEX IF NOT EXISTS idx_consultas_log_executado_em ON consultas_log (executado_em);"))
+        conn.execute(text("CREATE INDEX IF NOT EXISTS idx_consultas_log_visao ON consultas_log (id_visao, executado_em);"))
+
         conn.execute(text("""
             CREATE TABLE IF NOT EXISTS visoes_dashboard (
                 id SERIAL PRIMARY KEY,
@@ -141,27 +346,404 @@ def configurar_banco(engine):
                 estrutura_json JSONB
             );
         """))
+        # Catálogo das visões: dono, versão (controle otimista) e índices de busca mantidos pelo gatilho abaixo
+        conn.execute(text("""
+            ALTER TABLE visoes_dashboard
+                ADD COLUMN IF NOT EXISTS dono TEXT NOT NULL DEFAULT 'padrao',
+                ADD COLUMN IF NOT EXISTS versao INTEGER NOT NULL DEFAULT 1,
+                ADD COLUMN IF NOT EXISTS atualizado_em TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                ADD COLUMN IF NOT EXISTS total_componentes INTEGER,
+                ADD COLUMN IF NOT EXISTS tabelas TEXT[],
+                ADD COLUMN IF NOT EXISTS colunas TEXT[];
+        """))
+        conn.execute(text("""
+            CREATE OR REPLACE FUNCTION visoes_dashboard_indexar() RETURNS trigger AS $$
+            DECLARE
+                componentes JSONB := CASE WHEN jsonb_typeof(NEW.estrutura_json->'componentes') = 'array'
+                                          THEN NEW.estrutura_json->'componentes' ELSE '[]'::jsonb END;
+            BEGIN
+                NEW.total_componentes := jsonb_array_length(componentes);
+                -- Tabelas citadas em FROM/JOIN do SQL de cada componente (só nomes que existem no banco)
+                NEW.tabelas := ARRAY(
+                    SELECT DISTINCT lower(m[1])
+                    FROM jsonb_array_elements(componentes) AS c,
+                         regexp_matches(COALESCE(c->>'sql', ''), '(?\\:from|join)\\s+([a-z_][a-z0-9_]*)', 'gi') AS m
+                    WHERE to_regclass(lower(m[1])) IS NOT NULL
+                );
+                NEW.colunas := ARRAY(
+                    SELECT DISTINCT e.coluna
+                    FROM jsonb_array_elements(componentes) AS c,
+                         LATERAL (VALUES (c->>'eixo_x'), (c->>'eixo_y'), (c->>'eixo_y2')) AS e(coluna)
+                    WHERE e.coluna IS NOT NULL
+                );
+                IF TG_OP = 'UPDATE' THEN
+                    NEW.versao := OLD.versao + 1;
+                END IF;
+                NEW.atualizado_em := CURRENT_TIMESTAMP;
+                RETURN NEW;
+            END
+            $$ LANGUAGE plpgsql;
+        """))
+        conn.execute(text("DROP TRIGGER IF EXISTS trg_visoes_dashboard_indexar ON visoes_dashboard;"))
+        conn.execute(text("""
+            CREATE TRIGGER trg_visoes_dashboard_indexar
+            BEFORE INSERT OR UPDATE ON visoes_dashboard
+            FOR EACH ROW EXECUTE FUNCTION visoes_dashboard_indexar();
+        """))
+        # Visões anteriores ao catálogo: o gatilho preenche os índices
+        conn.execute(text("UPDATE visoes_dashboard SET nome = nome WHERE total_componentes IS NULL;"))
+        # GIN: busca por componentes (@> no JSON), por tabela e por coluna
+        conn.execute(text("CREATE INDEX IF NOT EXISTS idx_visoes_estrutura ON visoes_dashboard USING GIN (estrutura_json jsonb_path_ops);"))
+        conn.execute(text("CREATE INDEX IF NOT EXISTS idx_visoes_tabelas ON visoes_dashboard USING GIN (tabelas);"))
+        conn.execute(text("CREATE INDEX IF NOT EXISTS idx_visoes_colunas ON visoes_dashboard USING GIN (colunas);"))
+        conn.execute(text("CREATE INDEX IF NOT EXISTS idx_visoes_dono ON visoes_dashboard (dono, id DESC);"))
+
+        # Planos das consultas das visões (prepared statements), com o carimbo do esquema em que foram compilados
+        conn.execute(text("""
+            CREATE TABLE IF NOT EXISTS planos_consultas (
+                hash TEXT PRIMARY KEY,
+                nome TEXT,
+                id_visao INTEGER,
+                sql_original TEXT,
+                sql_preparado TEXT,
+                parametros TEXT[],
+                tipos TEXT[],
+                versao_esquema TEXT,
+                compilado_em TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            );
+        """))
+        conn.execute(text("CREATE INDEX IF NOT EXISTS idx_planos_consultas_visao ON planos_consultas (id_visao);"))
         conn.commit()
 
-def carregar_dados_brutos(engine, df, arquivo_origem):
-    # Substituir NaN por None para JSON válido
-    df_limpo = df.astype(object).where(pd.notnull(df), None)
-    registros = df_limpo.to_dict(orient='records')
-    
+def _registros_csv(arquivo):
+    """
+    Itera os registros de um CSV aberto em modo binário, preservando os bytes originais.
+    Um registro pode ocupar várias linhas físicas (quebra de linha dentro de aspas): a linha só fecha
+    o registro quando a quantidade de aspas acumulada é par. Linhas em branco são ignoradas, como no read_csv.
+    """
+    partes = []
+    aspas_abertas = False
+    for linha in arquivo:
+        partes.append(linha)
+        if linha.count(b'"') % 2:
+            aspas_abertas = not aspas_abertas
+        if not aspas_abertas:
+            registro = b"".join(partes)
+            partes = []
+            if registro.strip():
+                yield registro
+    if partes:
+        yield b"".join(partes)
+
+def _agrupar(iteravel, tamanho):
+    grupo = []
+    for item in iteravel:
+        grupo.append(item)
+        if len(grupo) == tamanho:
+            yield grupo
+            grupo = []
+    if grupo:
+        yield grupo
+
+def carregar_arquivo_bruto(engine, caminho, arquivo_origem):
+    """
+    Guarda o CSV original em arquivos_brutos: uma linha por arquivo (deduplicada pelo sha256) e blocos de
+    LINHAS_POR_BLOCO_BRUTO registros comprimidos com gzip. Se o mesmo conteúdo já foi ingerido, só atualiza
+    ultimo_carregamento. Retorna o número de registros do arquivo.
+    """
+    sha = hashlib.sha256()
+    tamanho = 0
+    with open(caminho, 'rb') as f:
+        for pedaco in iter(lambda: f.read(1 << 20), b""):
+            sha.update(pedaco)
+            tamanho += len(pedaco)
+    sha256 = sha.hexdigest()
+
+    with engine.connect() as conn:
+        existente = conn.execute(
+            text("UPDATE arquivos_brutos SET ultimo_carregamento = CURRENT_TIMESTAMP, arquivo_origem = :origem WHERE sha256 = :sha RETURNING linhas"),
+            {"sha": sha256, "origem": arquivo_origem}
+        ).fetchone()
+        if existente:
+            conn.commit()
+            print(f"  {arquivo_origem}: conteúdo já arquivado (sha256 {sha256[:12]}), nada a gravar.")
+            return existente[0]
+
+        with open(caminho, 'rb') as f:
+            registros = _registros_csv(f)
+            cabecalho = next(registros, b"").decode('utf-8', errors='replace').rstrip("\r\n")
+            id_arquivo = conn.execute(
+                text("INSERT INTO arquivos_brutos (arquivo_origem, sha256, cabecalho, tamanho_bytes) VALUES (:origem, :sha, :cabecalho, :tamanho) RETURNING id"),
+                {"origem": arquivo_origem, "sha": sha256, "cabecalho": cabecalho, "tamanho": tamanho}
+            ).scalar()
+
+            sql_bloco = text("INSERT INTO arquivos_brutos_blocos VALUES (:id, :bloco, :inicio, :n, :dados)")
+            linhas, comprimido, lote = 0, 0, []
+            for numero, bloco in enumerate(_agrupar(registros, LINHAS_POR_BLOCO_BRUTO)):
+                dados = gzip.compress(b"".join(bloco), compresslevel=6)
+                lote.append({"id": id_arquivo, "bloco": numero, "inicio": linhas, "n": len(bloco), "dados": dados})
+                linhas += len(bloco)
+                comprimido += len(dados)
+                # Grava em lotes para não manter o arquivo inteiro comprimido em memória
+                if len(lote) == 20:
+                    conn.execute(sql_bloco, lote)
+                    lote = []
+            if lote:
+                conn.execute(sql_bloco, lote)
+
+        conn.execute(
+            text("UPDATE arquivos_brutos SET linhas = :linhas, tamanho_comprimido = :comprimido WHERE id = :id"),
+            {"linhas": linhas, "comprimido": comprimido, "id": id_arquivo}
+        )
+        conn.commit()
+
+    print(f"  {arquivo_origem}: {tamanho / 1024**2:.1f} MB -> {comprimido / 1024**2:.1f} MB (gzip, {linhas} linhas)")
+    return linhas
+
+def buscar_linha_bruta(engine, arquivo_origem, linha, id_arquivo=None):
+    """
+    Linhagem: devolve a linha original (dict cabeçalho -> valor) do CSV arquivado.
+    linha é a posição do registro (0 = primeira linha após o cabeçalho), como em linha_origem.
+    Sem id_arquivo, usa a versão carregada mais recentemente. Descomprime um único bloco.
+    """
+    with engine.connect() as conn:
+        if id_arquivo is None:
+            id_arquivo = conn.execute(
+                text("SELECT id FROM arquivos_brutos WHERE arquivo_origem = :origem ORDER BY ultimo_carregamento DESC LIMIT 1"),
+                {"origem": arquivo_origem}
+            ).scalar()
+            if id_arquivo is None:
+                return None
+
+        cabecalho = conn.execute(text("SELECT cabecalho FROM arquivos_brutos WHERE id = :id"), {"id": id_arquivo}).scalar()
+        bloco = conn.execute(text("""
+            SELECT linha_inicial, linhas, dados FROM arquivos_brutos_blocos
+            WHERE id_arquivo = :id AND linha_inicial <= :linha
+            ORDER BY linha_inicial DESC LIMIT 1
+        """), {"id": id_arquivo, "linha": linha}).fetchone()
+
+    if bloco is None or linha >= bloco.linha_inicial + bloco.linhas:
+        return None
+    conteudo = gzip.decompress(bytes(bloco.dados)).decode('utf-8', errors='replace')
+    registros = csv.reader(io.StringIO(conteudo))
+    for _ in range(linha - bloco.linha_inicial):
+        next(registros)
+    colunas = next(csv.reader([cabecalho]))
+    return dict(zip(colunas, next(registros)))
+
+def construir_disponibilidade_materiais(engine):
+    """
+    Consolida suprimentos (várias linhas por material) e a demanda recente de itens em uma linha por material:
+    estoque total nas fábricas, lead time mínimo/médio, descontinuado e demanda dos últimos 30/90 dias.
+    A demanda é relativa ao pedido mais recente da carga (os dados são históricos).
+    Materiais vendidos sem registro de suprimento entram com estoque 0.
+    Lê e grava as sombras desta carga.
+    """
+    with engine.connect() as conn:
+        resultado = conn.execute(text(f"""
+            INSERT INTO {sombra('disponibilidade_materiais')} (
+                id_material, nome_material, estoque_total, qtd_fabricas, tempo_entrega_min, tempo_entrega_medio,
+                descontinuado, demanda_30d, demanda_90d, cobertura_dias, atualizado_em
+            )
+            WITH oferta AS (
+                SELECT
+                    id_material,
+                    MAX(nome_material) AS nome_material,
+                    SUM(quantidade) AS estoque_total,
+                    COUNT(DISTINCT id_fabrica) AS qtd_fabricas,
+                    MIN(tempo_entrega) AS tempo_entrega_min,
+                    ROUND(AVG(tempo_entrega), 1) AS tempo_entrega_medio,
+                    -- Descontinuado só quando nenhuma fábrica mantém o material
+                    BOOL_AND(descontinuado) AS descontinuado
+                FROM {sombra('suprimentos')}
+                GROUP BY id_material
+            ),
+            referencia AS (
+                SELECT MAX(criado_em) AS data_ref FROM {sombra('pedidos')}
+            ),
+            demanda AS (
+                SELECT
+                    i.id_material,
+                    MAX(i.nome_material) AS nome_material,
+                    SUM(i.quantidade) FILTER (WHERE p.criado_em > r.data_ref - INTERVAL '30 days') AS demanda_30d,
+                    SUM(i.quantidade) AS demanda_90d
+                FROM {sombra('itens')} i
+                JOIN {sombra('pedidos')} p ON p.id_pedido = i.id_pedido
+                CROSS JOIN referencia r
+                WHERE p.criado_em > r.data_ref - INTERVAL '90 days'
+                GROUP BY i.id_material
+            )
+            SELECT
+                COALESCE(o.id_material, d.id_material),
+                COALESCE(o.nome_material, d.nome_material),
+                COALESCE(o.estoque_total, 0),
+                COALESCE(o.qtd_fabricas, 0),
+                o.tempo_entrega_min,
+                o.tempo_entrega_medio,
+                COALESCE(o.descontinuado, FALSE),
+                COALESCE(d.demanda_30d, 0),
+                COALESCE(d.demanda_90d, 0),
+                -- Dias de estoque no ritmo de venda dos últimos 30 dias (NULL sem demanda)
+                CASE WHEN d.demanda_30d > 0 THEN ROUND(COALESCE(o.estoque_total, 0) / (d.demanda_30d / 30.0), 1) END,
+                CURRENT_TIMESTAMP
+            FROM oferta o
+            FULL OUTER JOIN demanda d ON d.id_material = o.id_material
+            WHERE COALESCE(o.id_material, d.id_material) IS NOT NULL
+        """))
+        conn.commit()
+
+    print(f"Disponibilidade de materiais: {resultado.rowcount} materiais.")
+    return resultado.rowcount
+
+def criar_indices_sombras(engine):
+    """Índices e estatísticas das sombras, antes da troca (o dashboard nunca vê a tabela sem índice)."""
+    with engine.connect() as conn:
+        # Índice para os filtros de período usados por todas as visões
+        conn.execute(text(f"CREATE INDEX idx_pedidos_criado_em{SUFIXO_SOMBRA} ON {sombra('pedidos')} (criado_em);"))
+        conn.execute(text(f"CREATE INDEX idx_pedidos_localidade{SUFIXO_SOMBRA} ON {sombra('pedidos')} (id_localidade);"))
+        # A PK (dia, id_localidade) atende o filtro de período; este, o histórico de uma localidade
+        conn.execute(text(f"CREATE INDEX idx_pedidos_geo_diario_localidade{SUFIXO_SOMBRA} ON {sombra('pedidos_geo_diario')} (id_localidade, dia);"))
+        # Cubo de frete: filtro de período e recortes por transportadora/estado
+        conn.execute(text(f"CREATE INDEX idx_cubo_frete_dia{SUFIXO_SOMBRA} ON {sombra('cubo_frete')} (dia);"))
+        conn.execute(text(f"CREATE INDEX idx_cubo_frete_transportadora{SUFIXO_SOMBRA} ON {sombra('cubo_frete')} (transportadora, estado, dia);"))
+        conn.commit()
+
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        for tabela in ("pedidos", "itens", "disponibilidade_materiais", "localidades", "pedidos_geo_diario", "cubo_frete"):
+            conn.execute(text(f"ANALYZE {sombra(tabela)};"))
+
+def _renomear_objetos_sombra(conn, tabela):
+    """Tira o sufixo da sombra de constraints, índices e sequências da tabela recém-trocada (tabela__new_pkey -> tabela_pkey)."""
+    constraints = conn.execute(text("""
+        SELECT conname FROM pg_constraint WHERE conrelid = CAST(:tabela AS regclass) AND strpos(conname, :sufixo) > 0
+    """), {"tabela": tabela, "sufixo": SUFIXO_SOMBRA}).scalars().all()
+    for nome in constraints:
+        # Renomear a constraint renomeia o índice da PK junto
+        conn.execute(text(f'ALTER TABLE {tabela} RENAME CONSTRAINT "{nome}" TO "{nome.replace(SUFIXO_SOMBRA, "")}"'))
+
+    objetos = conn.execute(text("""
+        SELECT c.relname, c.relkind FROM pg_class c
+        WHERE strpos(c.relname, :sufixo) > 0 AND (
+            c.oid IN (SELECT indexrelid FROM pg_index WHERE indrelid = CAST(:tabela AS regclass))
+            OR c.oid IN (SELECT objid FROM pg_depend WHERE refobjid = CAST(:tabela AS regclass) AND classid = 'pg_class'::regclass)
+        )
+    """), {"tabela": tabela, "sufixo": SUFIXO_SOMBRA}).fetchall()
+    for nome, tipo in objetos:
+        comando = "SEQUENCE" if tipo == "S" else "INDEX"
+        conn.execute(text(f'ALTER {comando} "{nome}" RENAME TO "{nome.replace(SUFIXO_SOMBRA, "")}"'))
+
+def trocar_tabelas(engine, tabelas=TABELAS_CARGA):
+    """
+    Põe as sombras no ar numa única transação: a tabela atual sai (DROP), a sombra assume o nome
+    e seus índices/constraints perdem o sufixo. Leitores veem a carga anterior inteira ou a nova inteira,
+    nunca uma tabela vazia. Os locks duram só os RENAMEs; com consultas longas em andamento, a transação
+    desiste após LOCK_TIMEOUT_TROCA (para não enfileirar o dashboard atrás dela) e tenta de novo.
+    """
+    for tentativa in range(1, TENTATIVAS_TROCA + 1):
+        try:
+            with engine.connect() as conn:
+                conn.execute(text(f"SET LOCAL lock_timeout = '{LOCK_TIMEOUT_TROCA}'"))
+                # Dependentes primeiro (a FK de itens aponta para pedidos). Sem CASCADE: uma view, FK ou
+                # materialized view de fora da carga (ex: criada no explorador) faz a troca falhar em vez de sumir
+                for tabela in reversed(tabelas):
+                    conn.execute(text(f"DROP TABLE IF EXISTS {tabela};"))
+                for tabela in tabelas:
+                    conn.execute(text(f"ALTER TABLE {sombra(tabela)} RENAME TO {tabela};"))
+                    _renomear_objetos_sombra(conn, tabela)
+                conn.commit()
+            print(f"Tabelas trocadas: {', '.join(tabelas)}.")
+            return
+        except Exception as e:
+            if "depend" in str(e):
+                print("Troca cancelada: há objetos fora da carga que dependem das tabelas atuais. "
+                      "Remova-os (ou recrie-os apontando para outra tabela) e rode o ETL de novo; a carga anterior continua no ar.")
+            if "lock timeout" not in str(e) or tentativa == TENTATIVAS_TROCA:
+                raise
+            print(f"Troca de tabelas aguardando consultas em andamento (tentativa {tentativa}/{TENTATIVAS_TROCA})...")
+            time.sleep(2)
+
+def construir_geo_diario(engine):
+    """Agrega os pedidos da sombra por dia e localidade em pedidos_geo_diario (sombra)."""
     with engine.connect() as conn:
-        for registro in registros:
-            conn.execute(
-                text("INSERT INTO dados_brutos (arquivo_origem, dados_brutos) VALUES (:origem, :dados)"),
-                {"origem": arquivo_origem, "dados": json.dumps(registro, default=str)}
+        resultado = conn.execute(text(f"""
+            INSERT INTO {sombra('pedidos_geo_diario')} (
+                dia, id_localidade, pedidos, valor_total, custo_frete, total_itens_preco,
+                desconto_implicito, contagem_itens, peso_kg
             )
+            SELECT
+                DATE(criado_em),
+                id_localidade,
+                COUNT(*),
+                SUM(valor_total),
+                SUM(custo_frete),
+                SUM(total_itens_preco),
+                SUM(desconto_implicito),
+                SUM(contagem_itens),
+                SUM(peso_kg)
+            FROM {sombra('pedidos')}
+            WHERE criado_em IS NOT NULL AND id_localidade IS NOT NULL
+            GROUP BY 1, 2
+        """))
         conn.commit()
 
+    print(f"Agregado geográfico diário: {resultado.rowcount} linhas.")
+    return resultado.rowcount
+
+def atualizar_catalogo(engine):
+    """
+    Registra limites de data, contagem de linhas e a versão desta carga para cada tabela.
+    O app lê este catálogo em vez de varrer 'pedidos' com MIN/MAX a cada interação.
+    """
+    # Versão monotônica por execução do ETL (ms desde epoch)
+    versao = int(time.time() * 1000)
+    tabelas = {
+        "pedidos": "criado_em",
+        "itens": None,
+        "suprimentos": None,
+        "disponibilidade_materiais": None,
+        "localidades": None,
+        "pedidos_geo_diario": "dia",
+        "cubo_frete": "dia",
+    }
+
+    with engine.connect() as conn:
+        for tabela, coluna_data in tabelas.items():
+            if coluna_data:
+                sql_stats = f"SELECT COUNT(*), MIN({coluna_data}), MAX({coluna_data}) FROM {tabela}"
+            else:
+                sql_stats = f"SELECT COUNT(*), NULL::timestamp, NULL::timestamp FROM {tabela}"
+            linhas, data_min, data_max = conn.execute(text(sql_stats)).fetchone()
+
+            conn.execute(text("""
+                INSERT INTO catalogo_tabelas (tabela, linhas, data_min, data_max, carregado_em, versao_carga)
+                VALUES (:tabela, :linhas, :data_min, :data_max, CURRENT_TIMESTAMP, :versao)
+                ON CONFLICT (tabela) DO UPDATE SET
+                    linhas = EXCLUDED.linhas,
+                    data_min = EXCLUDED.data_min,
+                    data_max = EXCLUDED.data_max,
+                    carregado_em = EXCLUDED.carregado_em,
+                    versao_carga = EXCLUDED.versao_carga
+            """), {"tabela": tabela, "linhas": linhas, "data_min": data_min, "data_max": data_max, "versao": versao})
+        conn.commit()
+
+    print(f"Catálogo atualizado (versão de carga {versao}).")
+
 def processar_pedidos(engine):
     print("Processando Pedidos...")
-    df = pd.read_csv('dados/Pedidos.csv')
+    with medir_etapa("pedidos.leitura") as etapa:
+        df = pd.read_csv(os.path.join(DIR_DADOS, 'Pedidos.csv'))
+        etapa["linhas"] = len(df)
 
-    carregar_dados_brutos(engine, df, 'Pedidos.csv')
+    with medir_etapa("pedidos.arquivo_bruto") as etapa:
+        etapa["linhas"] = carregar_arquivo_bruto(engine, os.path.join(DIR_DADOS, 'Pedidos.csv'), 'Pedidos.csv')
 
+    with medir_etapa("pedidos.parse") as etapa:
+        df_limpo = limpar_pedidos(df)
+        etapa["linhas"] = len(df_limpo)
+
+    return df_limpo
+
+def limpar_pedidos(df):
     df_limpo = pd.DataFrame()
     df_limpo['id_pedido'] = df['id'].astype(str)
     df_limpo['cliente_ref'] = df['reference'].astype(str)
@@ -181,54 +763,196 @@ def processar_pedidos(engine):
     df_limpo['mes_pedido'] = df_limpo['criado_em'].dt.month
     df_limpo['ano_pedido'] = df_limpo['criado_em'].dt.year
     df_limpo['dia_semana'] = df_limpo['criado_em'].dt.dayofweek
+    df_limpo['linha_origem'] = range(len(df))
 
-    return df_limpo
+    return tipos.aplicar_politica_tipos(
+        df_limpo,
+        categorias=['status', 'cidade_cliente', 'estado_cliente', 'transportadora'],
+        textos=['id_pedido', 'cliente_ref', 'cep_cliente'],
+        inteiros=['contagem_itens']
+    )
 
 def processar_itens(engine):
     print("Processando Itens...")
-    df = pd.read_csv('dados/Itens.csv')
+    with medir_etapa("itens.leitura") as etapa:
+        # material_id como texto: mesma chave de suprimentos/disponibilidade_materiais ('1.787' -> '1787')
+        df = pd.read_csv(os.path.join(DIR_DADOS, 'Itens.csv'), dtype={'material_id': str})
+        etapa["linhas"] = len(df)
     
-    carregar_dados_brutos(engine, df, 'Itens.csv')
+    with medir_etapa("itens.arquivo_bruto") as etapa:
+        etapa["linhas"] = carregar_arquivo_bruto(engine, os.path.join(DIR_DADOS, 'Itens.csv'), 'Itens.csv')
 
+    with medir_etapa("itens.parse") as etapa:
+        df_limpo = limpar_itens(df)
+        etapa["linhas"] = len(df_limpo)
+    
+    return df_limpo
+
+def limpar_itens(df):
     df_limpo = pd.DataFrame()
     df_limpo['id_pedido'] = df['order_id'].astype(str)
     df_limpo['id_produto'] = df['product_id'].astype(str)
-    df_limpo['id_material'] = df['material_id'].astype(str)
+    df_limpo['id_material'] = limpar_id_milhar(df['material_id'])
     df_limpo['nome_material'] = df['material_name']
     df_limpo['categoria'] = df['material_category']
     df_limpo['preco'] = df['price'].apply(limpar_moeda)
     df_limpo['status'] = df['aasm_state']
-    
-    return df_limpo
+    df_limpo['linha_origem'] = range(len(df))
+
+    # Poucos materiais se repetem em muitos itens: id/nome do material também viram category
+    return tipos.aplicar_politica_tipos(
+        df_limpo,
+        categorias=['id_material', 'nome_material', 'categoria', 'status'],
+        textos=['id_pedido', 'id_produto']
+    )
 
 def processar_suprimentos(engine):
     print("Processando Suprimentos...")
-    df = pd.read_csv('dados/Supply.csv')
+    with medir_etapa("suprimentos.leitura") as etapa:
+        # quantity, material_localization_id e os ids (supply_id, material_id) usam '.' como separador
+        # de milhar (ex: 1.787, 7.900): lidas como texto para não virarem decimais ('7.900' -> 7.9)
+        df = pd.read_csv(os.path.join(DIR_DADOS, 'Supply.csv'),
+                         dtype={'quantity': str, 'material_localization_id': str, 'supply_id': str, 'material_id': str})
+        etapa["linhas"] = len(df)
+
+    with medir_etapa("suprimentos.arquivo_bruto") as etapa:
+        etapa["linhas"] = carregar_arquivo_bruto(engine, os.path.join(DIR_DADOS, 'Supply.csv'), 'Supply.csv')
+
+    with medir_etapa("suprimentos.parse") as etapa:
+        df_limpo = limpar_suprimentos(df)
+        etapa["linhas"] = len(df_limpo)
 
-    carregar_dados_brutos(engine, df, 'Supply.csv')
+    with medir_etapa("suprimentos.carga") as etapa:
+        df_limpo.to_sql(sombra('suprimentos'), engine, if_exists='append', index=False, method='multi', chunksize=1000)
+        etapa["linhas"] = len(df_limpo)
 
+    with medir_etapa("suprimentos.indices"):
+        criar_indices_suprimentos(engine)
+
+    return df_limpo
+
+def criar_indices_suprimentos(engine):
+    """
+    Índice por material e centro de estoque cobrindo as colunas de reposição: consultas de estoque por
+    centro respondem com index-only scan. O VACUUM marca o mapa de visibilidade, sem o qual o Postgres
+    ainda visitaria a tabela.
+    """
+    with engine.connect() as conn:
+        conn.execute(text(f"""
+            CREATE INDEX idx_suprimentos_material_centro{SUFIXO_SOMBRA}
+            ON {sombra('suprimentos')} (id_material, id_centro_estoque)
+            INCLUDE (quantidade, reposicao, deve_vender, tempo_entrega, descontinuado);
+        """))
+        conn.commit()
+
+    # VACUUM não roda dentro de transação. Feito na sombra: a tabela entra no ar já com mapa de visibilidade e estatísticas
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        conn.execute(text(f"VACUUM ANALYZE {sombra('suprimentos')};"))
+
+def limpar_suprimentos(df):
     df_limpo = pd.DataFrame()
-    df_limpo['id_suprimento'] = df['supply_id'].astype(str)
-    df_limpo['id_material'] = df['material_id'].astype(str)
+    df_limpo['id_suprimento'] = limpar_id_milhar(df['supply_id'])
+    df_limpo['id_material'] = limpar_id_milhar(df['material_id'])
     df_limpo['nome_material'] = df['material_name']
-    df_limpo['quantidade'] = pd.to_numeric(df['quantity'], errors='coerce').fillna(0)
+    df_limpo['quantidade'] = limpar_inteiro_milhar(df['quantity']).fillna(0)
     df_limpo['tempo_entrega'] = pd.to_numeric(df['leadtime'], errors='coerce').fillna(0)
     df_limpo['id_fabrica'] = pd.to_numeric(df['factory_id'], errors='coerce').fillna(0)
     df_limpo['descontinuado'] = df['discontinued'].astype(bool)
+    # Colunas de reposição por centro de estoque (booleanos nulos continuam nulos)
+    df_limpo['reposicao'] = df['reposition'].astype('boolean')
+    df_limpo['id_centro_estoque'] = pd.to_numeric(df['inventory_centre_id'], errors='coerce').fillna(0)
+    df_limpo['deve_vender'] = df['should_sell'].astype('boolean')
+    # Maioria nula (material sem localização): inteiro anulável
+    df_limpo['id_localizacao_material'] = limpar_inteiro_milhar(df['material_localization_id']).astype('Int32')
+    df_limpo['linha_origem'] = range(len(df))
 
-    df_limpo.to_sql('suprimentos', engine, if_exists='append', index=False, method='multi', chunksize=1000)
+    return tipos.aplicar_politica_tipos(
+        df_limpo,
+        categorias=['id_material', 'nome_material'],
+        textos=['id_suprimento'],
+        inteiros=['quantidade', 'tempo_entrega', 'id_fabrica', 'id_centro_estoque']
+    )
 
-    return df_limpo
+def _normalizar_rotulos(serie, chave=True):
+    """
+    Rótulos de texto livre sem espaços extras; com chave=True também em maiúsculas e sem acentos
+    ("  são  paulo" -> "SAO PAULO"). Calculado só sobre os valores distintos. Vazios viram nulo.
+    """
+    codigos, distintos = pd.factorize(serie)
+    rotulos = pd.Series(distintos, dtype=object).astype(str).str.strip().str.replace(r'\s+', ' ', regex=True)
+    if chave:
+        rotulos = (rotulos.str.normalize('NFKD').str.encode('ascii', 'ignore').str.decode('ascii').str.upper())
+    rotulos = rotulos.where(rotulos != '')
+    # Código -1 (nulo) cai fora do índice e vira NaN
+    return pd.Series(rotulos.reindex(codigos).to_numpy(), index=serie.index)
 
-def main():
-    engine = obter_engine()
-    configurar_banco(engine)
+def _prefixo_cep(serie):
+    """Prefixo de 5 dígitos do CEP (o CSV traz o CEP numérico, sem o zero à esquerda); inválidos viram nulo."""
+    codigos, distintos = pd.factorize(serie)
+    digitos = (pd.Series(distintos, dtype=object).astype(str)
+               .str.replace(r'\.0$', '', regex=True).str.replace(r'\D', '', regex=True))
+    prefixos = digitos.str.zfill(8).str[:5].where(digitos.str.len().between(1, 8))
+    return pd.Series(prefixos.reindex(codigos).to_numpy(), index=serie.index)
 
-    df_pedidos = processar_pedidos(engine)
-    df_itens = processar_itens(engine)
-    processar_suprimentos(engine)
+def montar_localidades(df_pedidos):
+    """
+    Dimensão de localidades: uma linha por (estado, cidade) normalizados, com chave inteira, a grafia
+    mais frequente da cidade e o prefixo de CEP mais frequente. Retorna (localidades, id_localidade por pedido).
+    """
+    chaves = ['estado', 'cidade_normalizada']
+    base = pd.DataFrame({
+        'estado': _normalizar_rotulos(df_pedidos['estado_cliente']).str[:2],
+        'cidade_normalizada': _normalizar_rotulos(df_pedidos['cidade_cliente']),
+        'cidade': _normalizar_rotulos(df_pedidos['cidade_cliente'], chave=False),
+        'prefixo_cep': _prefixo_cep(df_pedidos['cep_cliente']),
+    })
+    # Chaves em ordem alfabética (nulos por último)
+    base['id_localidade'] = base.groupby(chaves, dropna=False, sort=True).ngroup() + 1
 
-    # Engenharia de Recursos
+    def mais_frequente(coluna):
+        contagem = base.groupby(['id_localidade', coluna]).size().rename('n').reset_index()
+        return contagem.sort_values('n', ascending=False, kind='stable').drop_duplicates('id_localidade')[['id_localidade', coluna]]
+
+    localidades = (base.drop_duplicates('id_localidade')[['id_localidade'] + chaves]
+                   .merge(mais_frequente('cidade'), on='id_localidade', how='left')
+                   .merge(mais_frequente('prefixo_cep'), on='id_localidade', how='left')
+                   .sort_values('id_localidade')[['id_localidade', 'estado', 'cidade', 'cidade_normalizada', 'prefixo_cep']])
+    return localidades, base['id_localidade']
+
+def montar_cubo_frete(pedidos_final):
+    """
+    Cubo de frete por transportadora x estado x faixa de peso x dia: contagem, soma e soma dos quadrados
+    de frete, peso e itens. Média = soma / pedidos; variância = (soma_quadrados - soma² / pedidos) / (pedidos - 1);
+    custo por kg = frete_soma / peso_soma. Pedidos sem data, frete ou peso ficam de fora.
+    """
+    base = pedidos_final[pedidos_final['criado_em'].notna() & pedidos_final['custo_frete'].notna() & pedidos_final['peso_kg'].notna()]
+    frete = base['custo_frete'].astype('float64')
+    peso = base['peso_kg'].astype('float64')
+    itens = base['contagem_itens'].astype('int64')
+    faixas = pd.cut(peso, FAIXAS_PESO_KG, labels=ROTULOS_FAIXAS_PESO, include_lowest=True)
+
+    medidas = pd.DataFrame({
+        'dia': base['criado_em'].dt.normalize(),
+        'transportadora': _normalizar_rotulos(base['transportadora'], chave=False),
+        'estado': _normalizar_rotulos(base['estado_cliente']).str[:2],
+        'faixa_peso': faixas,
+        'pedidos': 1,
+        'frete_soma': frete,
+        'frete_soma_quadrados': frete ** 2,
+        'peso_soma': peso,
+        'peso_soma_quadrados': peso ** 2,
+        'itens_soma': itens,
+        'itens_soma_quadrados': itens ** 2,
+    })
+    cubo = (medidas.groupby(['dia', 'transportadora', 'estado', 'faixa_peso'], dropna=False, observed=True, sort=True)
+            .sum().reset_index())
+    cubo['dia'] = cubo['dia'].dt.date
+    cubo.insert(4, 'ordem_faixa_peso', cubo['faixa_peso'].cat.codes.astype('int16'))
+    cubo['faixa_peso'] = cubo['faixa_peso'].astype(str)
+    return cubo
+
+def montar_pedidos_final(df_pedidos, df_itens):
+    """Engenharia de recursos: soma dos itens por pedido e desconto implícito."""
     soma_itens_pedido = df_itens.groupby('id_pedido')['preco'].sum().reset_index()
     soma_itens_pedido.rename(columns={'preco': 'total_itens_preco'}, inplace=True)
 
@@ -251,23 +975,85 @@ def main():
     # O pd.to_sql com method multi cria as colunas se não existirem? Não, eu criei a tabela manualmente antes com CREATE TABLE.
     # Preciso adicionar desconto_perc no CREATE TABLE acima.
     pedidos_final.drop(columns=['base_original'], inplace=True)
+    return pedidos_final
+
+def main(arquivo_metricas=None):
+    METRICAS_ETAPAS.clear()
+    inicio = time.perf_counter()
+
+    engine = obter_engine()
+    with medir_etapa("configurar_banco"):
+        configurar_banco(engine)
+
+    df_pedidos = processar_pedidos(engine)
+    df_itens = processar_itens(engine)
+    processar_suprimentos(engine)
+
+    # Engenharia de Recursos
+    with medir_etapa("engenharia_recursos") as etapa:
+        pedidos_final = montar_pedidos_final(df_pedidos, df_itens)
+        etapa["linhas"] = len(pedidos_final)
+
+    with medir_etapa("localidades") as etapa:
+        localidades, pedidos_final['id_localidade'] = montar_localidades(pedidos_final)
+        localidades.to_sql(sombra('localidades'), engine, if_exists='append', index=False, method='multi', chunksize=1000)
+        etapa["linhas"] = len(localidades)
+
+    with medir_etapa("cubo_frete") as etapa:
+        cubo_frete = montar_cubo_frete(pedidos_final)
+        cubo_frete.to_sql(sombra('cubo_frete'), engine, if_exists='append', index=False, method='multi', chunksize=1000)
+        etapa["linhas"] = len(cubo_frete)
 
 
     print("Carregando Pedidos no BD...")
-    pedidos_final.to_sql('pedidos', engine, if_exists='append', index=False, method='multi', chunksize=1000)
+    with medir_etapa("pedidos.carga") as etapa:
+        pedidos_final.to_sql(sombra('pedidos'), engine, if_exists='append', index=False, method='multi', chunksize=1000)
+        etapa["linhas"] = len(pedidos_final)
     
     
     # Filtrar itens órfãos
-    ids_pedidos_validos = set(pedidos_final['id_pedido'].astype(str))
-    df_itens = df_itens[df_itens['id_pedido'].isin(ids_pedidos_validos)]
+    df_itens = df_itens[df_itens['id_pedido'].isin(pedidos_final['id_pedido'])]
     
     if not df_itens.empty:
         print(f"Carregando {len(df_itens)} Itens válidos no BD...")
-        df_itens.to_sql('itens', engine, if_exists='append', index=False, method='multi', chunksize=1000)
+        with medir_etapa("itens.carga") as etapa:
+            df_itens.to_sql(sombra('itens'), engine, if_exists='append', index=False, method='multi', chunksize=1000)
+            etapa["linhas"] = len(df_itens)
     else:
         print("AVISO: Nenhum item para carregar!")
 
+    with medir_etapa("disponibilidade_materiais") as etapa:
+        etapa["linhas"] = construir_disponibilidade_materiais(engine)
+
+    with medir_etapa("pedidos_geo_diario") as etapa:
+        etapa["linhas"] = construir_geo_diario(engine)
+
+    with medir_etapa("indices"):
+        criar_indices_sombras(engine)
+
+    with medir_etapa("troca_tabelas"):
+        trocar_tabelas(engine)
+
+    with medir_etapa("catalogo"):
+        atualizar_catalogo(engine)
+
+    resultado = {
+        "executado_em": datetime.now().isoformat(timespec='seconds'),
+        "duracao_total_s": round(time.perf_counter() - inicio, 3),
+        "pico_rss_mb": pico_rss_mb(),
+        "etapas": list(METRICAS_ETAPAS),
+    }
+    if arquivo_metricas:
+        with open(arquivo_metricas, 'w') as f:
+            json.dump(resultado, f, indent=2, ensure_ascii=False)
+        print(f"Métricas do ETL gravadas em {arquivo_metricas}")
+
     print("Pipeline Finalizado com Sucesso!")
+    return resultado
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description='Pipeline ETL (CSV -> PostgreSQL).')
+    parser.add_argument('--metricas-json', type=str, help='Arquivo para gravar tempo, linhas/s e pico de RSS por etapa')
+    args = parser.parse_args()
+
+    main(args.metricas_json)
@@ -1,6 +1,7 @@
 import pandas as pd
 from sqlalchemy import create_engine, text
 import os
+from pipeline import buscar_linha_bruta
 
 # Carregar variáveis de ambiente manualmente
 def carregar_env():
@@ -28,9 +29,15 @@ def main():
         with engine.connect() as conn:
             print("--- Relatório de Verificação (PT-BR) ---")
             
-            # Verificar Tabela de Dados Brutos
-            resultado = conn.execute(text("SELECT COUNT(*) FROM dados_brutos")).scalar()
-            print(f"Contagem Tabela Dados Brutos: {resultado}")
+            # Verificar Arquivos Brutos (CSV original comprimido, um registro por conteúdo)
+            resultado = conn.execute(text("""
+                SELECT arquivo_origem, linhas, tamanho_bytes, tamanho_comprimido, sha256
+                FROM arquivos_brutos ORDER BY ultimo_carregamento DESC
+            """)).fetchall()
+            print(f"Arquivos Brutos: {len(resultado)}")
+            for row in resultado:
+                taxa = row[2] / row[3] if row[3] else 0
+                print(f"  {row[0]}: {row[1]} linhas, {row[2]} -> {row[3]} bytes ({taxa:.1f}x), sha256 {row[4][:12]}")
             
             # Verificar Pedidos
             resultado = conn.execute(text("SELECT COUNT(*) FROM pedidos")).scalar()
@@ -50,6 +57,12 @@ def main():
             for row in resultado:
                 print(f"Pedido: {row[0]}, Total: {row[1]}, Itens: {row[2]}, Frete: {row[3]}, Desconto: {row[4]}")
                 
+            print("\n--- Verificação de Linhagem ---")
+            resultado = conn.execute(text("SELECT id_pedido, linha_origem FROM pedidos ORDER BY linha_origem LIMIT 1")).fetchone()
+            if resultado:
+                linha_bruta = buscar_linha_bruta(engine, 'Pedidos.csv', resultado[1])
+                print(f"Pedido {resultado[0]} (linha {resultado[1]} de Pedidos.csv): {linha_bruta}")
+                
             print("\n--- Verificação de Datas ---")
             resultado = conn.execute(text("SELECT criado_em, mes_pedido, ano_pedido, dia_semana FROM pedidos LIMIT 5")).fetchall()
             for row in resultado:
@@ -0,0 +1,301 @@
+import io
+import sys
+import threading
+import time
+import uuid
+import queue
+import argparse
+from datetime import datetime
+
+import requests
+from sqlalchemy import text
+
+import processar_visoes as job
+
+# Prioridades da fila (menor = executa antes)
+PRIORIDADE_ALTA = 0      # Disparo manual pela interface
+PRIORIDADE_NORMAL = 5
+PRIORIDADE_AGENDADA = 10 # Disparos do cron
+
+# Intervalo entre verificações do cron (segundos)
+INTERVALO_CRON = 20
+
+# Quantos jobs finalizados manter em memória para consulta de status
+MAX_HISTORICO = 200
+
+
+class ExpressaoCron:
+    """
+    Expressão cron de 5 campos: minuto hora dia_mes mes dia_semana (0 ou 7 = domingo).
+    Suporta '*', listas (1,15), intervalos (1-5) e passos (*/15, 8-18/2).
+    """
+    LIMITES = [(0, 59), (0, 23), (1, 31), (1, 12), (0, 7)]
+
+    def __init__(self, expressao):
+        campos = expressao.split()
+        if len(campos) != 5:
+            raise ValueError(f"Expressão cron inválida (esperado 5 campos): '{expressao}'")
+
+        self.expressao = expressao
+        self.valores = [self._interpretar(campo, *limites) for campo, limites in zip(campos, self.LIMITES)]
+        # Domingo pode ser 0 ou 7
+        if 7 in self.valores[4]:
+            self.valores[4].add(0)
+        # Na semântica do cron, se dia do mês e dia da semana forem restritos, basta um casar
+        self.dia_mes_livre = campos[2] == '*'
+        self.dia_semana_livre = campos[4] == '*'
+
+    @staticmethod
+    def _interpretar(campo, minimo, maximo):
+        valores = set()
+        for parte in campo.split(','):
+            passo = 1
+            if '/' in parte:
+                parte, passo_str = parte.split('/', 1)
+                passo = int(passo_str)
+
+            if parte == '*':
+                inicio, fim = minimo, maximo
+            elif '-' in parte:
+                inicio_str, fim_str = parte.split('-', 1)
+                inicio, fim = int(inicio_str), int(fim_str)
+            else:
+                inicio = int(parte)
+                fim = maximo if passo > 1 else inicio
+
+            if inicio < minimo or fim > maximo or inicio > fim:
+                raise ValueError(f"Valor fora do intervalo [{minimo}-{maximo}]: '{campo}'")
+            valores.update(range(inicio, fim + 1, passo))
+        return valores
+
+    def corresponde(self, momento):
+        minutos, horas, dias_mes, meses, dias_semana = self.valores
+        if momento.minute not in minutos or momento.hour not in horas or momento.month not in meses:
+            return False
+
+        # datetime.weekday(): segunda=0 ... domingo=6 -> cron: domingo=0
+        dia_semana = (momento.weekday() + 1) % 7
+        casa_dia_mes = momento.day in dias_mes
+        casa_dia_semana = dia_semana in dias_semana
+
+        if self.dia_mes_livre or self.dia_semana_livre:
+            return casa_dia_mes and casa_dia_semana
+        return casa_dia_mes or casa_dia_semana
+
+
+class _SaidaJob(io.TextIOBase):
+    """
+    Saída de um job: guarda o log no buffer do job e repassa para o stdout do processo.
+    Passada para processar_visoes(saida=...), sem trocar o sys.stdout global (que o Streamlit compartilha).
+    """
+    def __init__(self):
+        self.buffer = io.StringIO()
+
+    def write(self, texto):
+        self.buffer.write(texto)
+        return sys.stdout.write(texto)
+
+    def flush(self):
+        sys.stdout.flush()
+
+    def getvalue(self):
+        return self.buffer.getvalue()
+
+
+class Agendador:
+    """
+    Agendador de relatórios de visões em processo (ou como sidecar via linha de comando).
+
+    Mantém engine, sessão HTTP e stack de renderização aquecidos, executa jobs a partir de
+    uma fila com prioridades e, opcionalmente, dispara visões cujo JSON tenha um campo
+    "agendamento" (ex: {"cron": "0 8 * * 1", "janelas": "ultimos-7"} ou apenas "0 8 * * 1").
+
+    API: enfileirar(...) -> id_job e status(id_job) -> dict.
+    """
+
+    def __init__(self, workers=1):
+        # 1 worker por padrão: o desenho é serializado por visuais.LOCK_PYPLOT, mais workers só paralelizam consultas e envio
+        self.workers = workers
+        self.fila = queue.PriorityQueue()
+        self.jobs = {}
+        self.lock = threading.Lock()
+        self.sequencia = 0
+        self.ultimos_disparos = {}
+        # Agendamentos já interpretados por visão: id -> (versao, agendamento)
+        self.agendamentos_cache = {}
+        self.ativo = False
+        self.engine = None
+        self.session = None
+
+    # --- API ---
+    def iniciar(self, cron=True):
+        if self.ativo:
+            return self
+        self.ativo = True
+
+        # Aquecer conexões e stack de renderização uma única vez
+        self.engine = job.get_connection()
+        self.session = requests.Session()
+        plt, _, _ = job.visuais.carregar_stack_grafica()
+        with job.visuais.LOCK_PYPLOT:
+            plt.figure()
+            plt.close()
+
+        for i in range(self.workers):
+            threading.Thread(target=self._loop_worker, name=f"agendador-worker-{i}", daemon=True).start()
+        if cron:
+            threading.Thread(target=self._loop_cron, name="agendador-cron", daemon=True).start()
+
+        print(f"Agendador iniciado ({self.workers} worker(s), cron={'ativo' if cron else 'inativo'}).")
+        return self
+
+    def parar(self):
+        self.ativo = False
+
+    def enfileirar(self, data_inicio=None, data_fim=None, janelas=None, ids_visoes=None, prioridade=PRIORIDADE_NORMAL, origem="manual"):
+        """Coloca uma execução na fila. Retorna o id do job para consulta de status."""
+        id_job = uuid.uuid4().hex[:12]
+        with self.lock:
+            self.sequencia += 1
+            self.jobs[id_job] = {
+                "id": id_job,
+                "estado": "na_fila",
+                "origem": origem,
+                "prioridade": prioridade,
+                "ids_visoes": ids_visoes,
+                "criado_em": datetime.now().isoformat(timespec='seconds'),
+                "iniciado_em": None,
+                "finalizado_em": None,
+                "resumo": None,
+                "erro": None,
+                "log": "",
+            }
+            # A sequência desempata prioridades iguais em ordem de chegada
+            self.fila.put((prioridade, self.sequencia, id_job, (data_inicio, data_fim, janelas, ids_visoes)))
+            self._podar_historico()
+        return id_job
+
+    def status(self, id_job):
+        with self.lock:
+            info = self.jobs.get(id_job)
+            if info is None:
+                return None
+            info = dict(info)
+        if info["estado"] == "na_fila":
+            info["posicao_fila"] = self._posicao_na_fila(id_job)
+        return info
+
+    def listar_jobs(self):
+        with self.lock:
+            return [dict(info) for info in self.jobs.values()]
+
+    # --- Internos ---
+    def _posicao_na_fila(self, id_job):
+        with self.fila.mutex:
+            pendentes = sorted(self.fila.queue)
+        for posicao, item in enumerate(pendentes, start=1):
+            if item[2] == id_job:
+                return posicao
+        return None
+
+    def _podar_historico(self):
+        finalizados = [j for j in self.jobs.values() if j["estado"] in ("concluido", "erro")]
+        excesso = len(finalizados) - MAX_HISTORICO
+        for info in sorted(finalizados, key=lambda j: j["finalizado_em"])[:max(excesso, 0)]:
+            del self.jobs[info["id"]]
+
+    def _atualizar(self, id_job, **campos):
+        with self.lock:
+            self.jobs[id_job].update(campos)
+
+    def _loop_worker(self):
+        while self.ativo:
+            try:
+                _, _, id_job, args = self.fila.get(timeout=1)
+            except queue.Empty:
+                continue
+
+            data_inicio, data_fim, janelas, ids_visoes = args
+            self._atualizar(id_job, estado="executando", iniciado_em=datetime.now().isoformat(timespec='seconds'))
+
+            saida = _SaidaJob()
+            resultado = {}
+            try:
+                resumo = job.processar_visoes(
+                    data_inicio, data_fim, janelas=janelas, ids_visoes=ids_visoes,
+                    engine=self.engine, session=self.session, saida=saida
+                )
+                erro = resumo.get("erro") if resumo else "Execução sem resumo"
+                resultado = {"estado": "erro" if erro else "concluido", "resumo": resumo, "erro": erro}
+            except Exception as e:
+                resultado = {"estado": "erro", "erro": str(e)}
+            finally:
+                self._atualizar(id_job, log=saida.getvalue(), finalizado_em=datetime.now().isoformat(timespec='seconds'), **resultado)
+                self.fila.task_done()
+
+    def _carregar_agendamentos(self):
+        """
+        Lê o campo 'agendamento' das visões que o têm. Retorna lista de (id_visao, ExpressaoCron, especificação das janelas, prioridade).
+        Só o campo é trazido do banco, e cada agendamento é interpretado uma vez por versão da visão.
+        """
+        with self.engine.connect() as conn:
+            linhas = conn.execute(text(
+                "SELECT id, nome, versao, estrutura_json->'agendamento' FROM visoes_dashboard "
+                "WHERE estrutura_json->'agendamento' IS NOT NULL"
+            )).fetchall()
+
+        cache = {}
+        for id_visao, nome, versao, config in linhas:
+            anterior = self.agendamentos_cache.get(id_visao)
+            if anterior is not None and anterior[0] == versao:
+                cache[id_visao] = anterior
+                continue
+            cache[id_visao] = (versao, self._interpretar_agendamento(id_visao, nome, config))
+        # Visões excluídas ou sem agendamento saem do cache
+        self.agendamentos_cache = cache
+        return [agendamento for _, agendamento in cache.values() if agendamento is not None]
+
+    @staticmethod
+    def _interpretar_agendamento(id_visao, nome, config):
+        """(id_visao, ExpressaoCron, especificação das janelas, prioridade) a partir do campo 'agendamento'; None se inválido."""
+        if not config:
+            return None
+        if isinstance(config, str):
+            config = {"cron": config}
+        try:
+            cron = ExpressaoCron(config["cron"])
+            # Só valida: presets relativos (ultimos-7) são resolvidos a cada disparo
+            if config.get("janelas"):
+                job.interpretar_janelas(config["janelas"])
+        except Exception as e:
+            print(f"Agendamento inválido na visão {nome}: {e}")
+            return None
+        return (id_visao, cron, config.get("janelas"), config.get("prioridade", PRIORIDADE_AGENDADA))
+
+    def _loop_cron(self):
+        while self.ativo:
+            agora = datetime.now().replace(second=0, microsecond=0)
+            try:
+                for id_visao, cron, especificacao, prioridade in self._carregar_agendamentos():
+                    # Evita disparar duas vezes no mesmo minuto
+                    if cron.corresponde(agora) and self.ultimos_disparos.get(id_visao) != agora:
+                        self.ultimos_disparos[id_visao] = agora
+                        janelas = job.interpretar_janelas(especificacao) if especificacao else None
+                        id_job = self.enfileirar(janelas=janelas, ids_visoes=[id_visao], prioridade=prioridade, origem="cron")
+                        print(f"Cron '{cron.expressao}': visão {id_visao} enfileirada (job {id_job}).")
+            except Exception as e:
+                print(f"Erro ao verificar agendamentos: {e}")
+            time.sleep(INTERVALO_CRON)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Agendador de relatórios de visões (sidecar).')
+    parser.add_argument('--workers', type=int, default=1, help='Quantidade de workers da fila')
+    args = parser.parse_args()
+
+    agendador = Agendador(workers=args.workers).iniciar(cron=True)
+    try:
+        while True:
+            time.sleep(60)
+    except KeyboardInterrupt:
+        agendador.parar()
@@ -1,13 +1,14 @@
 import os
+import sys
 import json
-import requests
 import pandas as pd
-import matplotlib.pyplot as plt
-import seaborn as sns
 from sqlalchemy import create_engine, text
-from io import BytesIO
 import argparse
+import functools
+import re
 from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+import contextvars
 
 # Configuração do Banco
 DB_USER = os.getenv('POSTGRES_USER', 'user')
@@ -25,147 +26,412 @@ else:
 # Webhook do N8N
 WEBHOOK_URL = os.getenv('WEBHOOK_URL')
 
+# Instrumentação compartilhada com o app (src/app/servicos/metricas.py)
+DIR_APP = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'app'))
+if DIR_APP not in sys.path:
+    sys.path.append(DIR_APP)
+import servicos.metricas as metricas
+import servicos.leitor_sql as leitor_sql
+import servicos.visualizacao as visuais
+
 def get_connection():
     url = f"postgresql://{DB_USER}:{DB_PASS}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
     return create_engine(url)
 
-def processar_visoes(data_inicio=None, data_fim=None):
-    engine = get_connection()
-    
-    # 0. Definir Datas Padrão se não informadas
-    if not data_inicio:
-        data_inicio = (datetime.now() - timedelta(days=30)).strftime('%Y-%m-%d')
-    if not data_fim:
-        data_fim = datetime.now().strftime('%Y-%m-%d')
+def canonizar_sql(sql):
+    """
+    Normaliza o texto SQL (espaços, quebras de linha e ';' final) para identificar consultas idênticas.
+    Literais entre aspas simples são preservados como estão.
+    """
+    partes = re.split(r"('(?:[^']|'')*')", sql)
+    for i in range(0, len(partes), 2):
+        partes[i] = re.sub(r'\s+', ' ', partes[i])
+    return ''.join(partes).strip().rstrip(';').strip()
 
-    print(f"Usando período: {data_inicio} até {data_fim}")
-    
-    params = {
+def montar_plano(visoes, params):
+    """
+    Agrupa os componentes de todas as visões por consulta distinta (SQL canônico + params).
+    O SQL canônico serve só de chave: a consulta executada é o texto original do componente
+    (colapsar as quebras de linha transformaria um comentário "--" no resto da consulta).
+    Retorna: (consultas, usos)
+      - consultas: dict chave -> SQL original do primeiro componente com a chave (uma execução por chave)
+      - usos: lista ordenada de (chave, nome_visao, estrutura, componente)
+    """
+    chave_params = tuple(sorted((k, str(v)) for k, v in params.items()))
+    consultas = {}
+    usos = []
+
+    for visao in visoes:
+        id_visao, nome, json_raw = visao
+        
+        # O JSON pode vir como string ou dict dependendo do driver
+        if isinstance(json_raw, str):
+            estrutura = json.loads(json_raw)
+        else:
+            estrutura = json_raw
+
+        for comp in estrutura.get('componentes', []):
+            sql = comp.get('sql')
+            tipo = comp.get('tipo')
+            
+            if not sql or tipo not in ['grafico_barra', 'grafico_linha', 'grafico_combinado']:
+                continue
+
+            sql_canonico = canonizar_sql(sql)
+            chave = (sql_canonico, chave_params)
+            consultas.setdefault(chave, sql)
+            usos.append((chave, nome, estrutura, comp))
+
+    return consultas, usos
+
+PRESETS_JANELAS = {
+    "ultimos-7": 7,
+    "ultimos-30": 30,
+    "ultimos-90": 90,
+}
+
+# Máximo de janelas executadas em paralelo quando a consulta não pode ser fatiada em memória
+MAX_JANELAS_PARALELAS = 4
+
+def montar_params(data_inicio, data_fim):
+    return {
         "data_inicio": data_inicio, 
         "data_inicio_datetime": data_inicio, # Para compatibilidade se usar datetime
         "data_fim": data_fim,
         "data_fim_datetime": data_fim
     }
 
-    # 1. Buscar todas as visões
+def interpretar_janelas(especificacao, hoje=None):
+    """
+    Converte a especificação de janelas da linha de comando em uma lista de (rotulo, inicio, fim).
+    Aceita presets (ultimos-7, ultimos-30, ultimos-90) e intervalos explícitos YYYY-MM-DD:YYYY-MM-DD,
+    separados por vírgula. Ex: "ultimos-7,ultimos-30,2025-01-01:2025-03-31"
+    """
+    hoje = hoje or datetime.now()
+    janelas = []
+
+    for item in especificacao.split(','):
+        item = item.strip()
+        if not item:
+            continue
+
+        if item in PRESETS_JANELAS:
+            inicio = (hoje - timedelta(days=PRESETS_JANELAS[item])).strftime('%Y-%m-%d')
+            janelas.append((item, inicio, hoje.strftime('%Y-%m-%d')))
+        elif ':' in item:
+            inicio, fim = item.split(':', 1)
+            # Valida o formato antes de chegar ao banco
+            datetime.strptime(inicio, '%Y-%m-%d')
+            datetime.strptime(fim, '%Y-%m-%d')
+            janelas.append((f"{inicio}_{fim}", inicio, fim))
+        else:
+            raise ValueError(f"Janela inválida: '{item}'. Use um preset ({', '.join(PRESETS_JANELAS)}) ou YYYY-MM-DD:YYYY-MM-DD")
+
+    return janelas
+
+# Expressão de balde diário no SELECT seguida do alias: DATE(x) AS dia, x::date AS dia, DATE_TRUNC('day', x) AS dia.
+# Dentro de agregações (MAX(DATE(x)) AS ultima) o ')' seguinte impede o casamento.
+RE_BALDE_DIARIO = re.compile(
+    r"(DATE\s*\(\s*[\w.]+\s*\)|DATE_TRUNC\s*\(\s*'day'\s*,\s*[\w.]+\s*\)|[\w.]+\s*::\s*date)\s+(?:AS\s+)?(\w+)",
+    re.IGNORECASE
+)
+
+def _itens_select(sql):
+    """Expressões do SELECT externo, separadas pelas vírgulas de nível zero (ou None se não reconhecer)."""
+    m = re.match(r"\s*SELECT\s+(.*?)\s+FROM\s", sql, re.IGNORECASE | re.DOTALL)
+    if not m:
+        return None
+    itens, nivel, atual = [], 0, ""
+    for c in m.group(1):
+        nivel += (c == "(") - (c == ")")
+        if c == "," and nivel == 0:
+            itens.append(atual.strip())
+            atual = ""
+        else:
+            atual += c
+    return itens + [atual.strip()]
+
+def coluna_dia_agrupada(sql):
+    """
+    Coluna do resultado que é um balde diário e chave do GROUP BY (pelo alias, pela expressão ou pela posição).
+    Só resultados assim podem ser fatiados por janela sem mudar a semântica; baldes por mês/semana ou
+    datas agregadas por entidade (MAX(DATE(criado_em))) não se qualificam. Retorna None se não identificar.
+    """
+    sql_limpo = re.sub(r"--[^\n]*", " ", sql)
+    agrupamento = re.search(r"\bGROUP\s+BY\s+(.*?)(?:\bHAVING\b|\bORDER\s+BY\b|\bLIMIT\b|$)", sql_limpo, re.IGNORECASE | re.DOTALL)
+    itens = _itens_select(sql_limpo)
+    if not agrupamento or not itens:
+        return None
+    chaves = [re.sub(r"\s+", "", c).lower() for c in agrupamento.group(1).strip().rstrip(";").split(",")]
+
+    for posicao, item in enumerate(itens, start=1):
+        m = RE_BALDE_DIARIO.fullmatch(item)
+        if not m:
+            continue
+        expressao, alias = re.sub(r"\s+", "", m.group(1)).lower(), m.group(2)
+        if {expressao, alias.lower(), str(posicao)} & set(chaves):
+            return alias
+    return None
+
+def coluna_dia_componentes(comps, sql):
+    """Balde diário declarado no componente ("granularidade": "dia" -> eixo_x) ou identificado no SQL."""
+    for comp in comps:
+        if comp.get('granularidade') == 'dia' and comp.get('eixo_x'):
+            return comp['eixo_x']
+    return coluna_dia_agrupada(sql)
+
+def consultar_janela(engine, sql, data_inicio, data_fim):
+    with metricas.medir("executar_consulta", origem="job") as span:
+        df, span["motor"] = leitor_sql.ler_sql(engine, sql, montar_params(data_inicio, data_fim))
+        span["linhas"] = len(df)
+        span["bytes"] = metricas.tamanho_dataframe(df)
+    return df
+
+def executar_janelas(engine, sql, janelas, coluna_dia=None):
+    """
+    Executa uma consulta para todas as janelas. Retorna dict rotulo -> DataFrame.
+
+    coluna_dia: balde diário do resultado (ver coluna_dia_componentes). Com ele, sem LIMIT e sem funções
+    de janela (OVER: acumulados sobre a união diferem dos de cada janela), roda uma única vez sobre a
+    união dos períodos e fatia cada janela em memória, com os mesmos limites do SQL.
+    Caso contrário, cada janela roda a própria consulta (em paralelo); a união só é consultada
+    quando coincide com alguma janela.
+    """
+    inicio_uniao = min(inicio for _, inicio, _ in janelas)
+    fim_uniao = max(fim for _, _, fim in janelas)
+    fatiar = (bool(coluna_dia) and len(janelas) > 1
+              and not re.search(r'\bLIMIT\b|\bOVER\s*\(', sql, re.IGNORECASE))
+    usar_uniao = fatiar or any((inicio, fim) == (inicio_uniao, fim_uniao) for _, inicio, fim in janelas)
+    resultados = {}
+
+    if usar_uniao:
+        df_uniao = consultar_janela(engine, sql, inicio_uniao, fim_uniao)
+        if fatiar and coluna_dia in df_uniao.columns:
+            datas = pd.to_datetime(df_uniao[coluna_dia]).dt.date
+            for rotulo, inicio, fim in janelas:
+                # BETWEEN :data_inicio AND :data_fim com datas para na meia-noite do último dia: ele fica de fora
+                mascara = (datas >= pd.to_datetime(inicio).date()) & (datas < pd.to_datetime(fim).date())
+                resultados[rotulo] = df_uniao[mascara].reset_index(drop=True)
+            return resultados
+
+    pendentes = []
+    for rotulo, inicio, fim in janelas:
+        if usar_uniao and (inicio, fim) == (inicio_uniao, fim_uniao):
+            resultados[rotulo] = df_uniao
+        else:
+            pendentes.append((rotulo, inicio, fim))
+
+    if pendentes:
+        with ThreadPoolExecutor(max_workers=min(len(pendentes), MAX_JANELAS_PARALELAS)) as executor:
+            futuros = {
+                # copy_context: mantém as consultas paralelas no mesmo trace do job
+                rotulo: executor.submit(contextvars.copy_context().run, consultar_janela, engine, sql, inicio, fim)
+                for rotulo, inicio, fim in pendentes
+            }
+            for rotulo, futuro in futuros.items():
+                resultados[rotulo] = futuro.result()
+
+    return resultados
+
+@metricas.instrumentar("renderizar_grafico")
+def renderizar_grafico(df, comp, titulo_grafico, saida=None):
+    """
+    Gera a imagem de um componente (destino "email" de visuais.DESTINOS_IMAGEM). Retorna BytesIO ou None se as colunas forem inválidas.
+    saida: stream dos avisos (padrão: sys.stdout).
+    """
+    # Lock compartilhado com o app: o agendador pode rodar no mesmo processo que as sessões
+    with visuais.LOCK_PYPLOT:
+        return _desenhar_grafico(df, comp, titulo_grafico, saida)
+
+def _desenhar_grafico(df, comp, titulo_grafico, saida):
+    titulo = comp.get('titulo', 'Sem Título')
+    tipo = comp.get('tipo')
+    # matplotlib/seaborn são carregados sob demanda (import custa centenas de ms por execução)
+    plt, _, sns = visuais.carregar_stack_grafica()
+
+    try:
+        plt.figure(figsize=(10, 6))
+        
+        eixo_x = comp.get('eixo_x')
+        eixo_y = comp.get('eixo_y')
+        eixo_y2 = comp.get('eixo_y2')
+        
+        if not (eixo_x and eixo_y and eixo_x in df.columns and eixo_y in df.columns):
+             print(f"Colunas inválidas para {titulo} (Esperado: {eixo_x}, {eixo_y}) - Colunas: {df.columns.tolist()}", file=saida)
+             plt.close()
+             return None
+
+        if tipo == 'grafico_barra':
+            sns.barplot(data=df, x=eixo_x, y=eixo_y)
+        elif tipo == 'grafico_linha':
+            sns.lineplot(data=df, x=eixo_x, y=eixo_y, marker='o')
+        elif tipo == 'grafico_combinado' and eixo_y2 and eixo_y2 in df.columns:
+            fig, ax1 = plt.subplots(figsize=(10,6))
+            sns.barplot(data=df, x=eixo_x, y=eixo_y, ax=ax1, color='b', alpha=0.6)
+            ax2 = ax1.twinx()
+            sns.lineplot(data=df, x=eixo_x, y=eixo_y2, ax=ax2, color='r', marker='o')
+            ax1.set_ylabel(eixo_y, color='b')
+            ax2.set_ylabel(eixo_y2, color='r')
+        
+        plt.title(titulo_grafico)
+        plt.xticks(rotation=45)
+        plt.tight_layout()
+        
+        # Salvar em Buffer (Memória); layout já fixado pelo tight_layout
+        buf = visuais.salvar_figura(plt.gcf(), **visuais.DESTINOS_IMAGEM["email"])
+        plt.close()
+        return buf
+
+    except Exception as e:
+        print(f"Erro ao processar {titulo}: {e}", file=saida)
+        plt.close()
+        return None
+
+@metricas.instrumentar("processar_visoes")
+def processar_visoes(data_inicio=None, data_fim=None, janelas=None, ids_visoes=None, engine=None, session=None, saida=None):
+    """
+    Renderiza as visões e envia em um único lote para o N8N.
+    janelas: lista opcional de (rotulo, inicio, fim). Sem ela, usa apenas o período data_inicio/data_fim.
+    ids_visoes: restringe o processamento a essas visões (padrão: todas).
+    engine/session: permitem reaproveitar conexões já abertas (ex: agendador).
+    saida: stream para o log da execução (padrão: sys.stdout); o agendador passa um por job.
+    Retorna: dict resumo da execução ({"erro": ...} em caso de falha).
+    """
+    engine = engine or get_connection()
+    log = functools.partial(print, file=saida)
+    
+    # 0. Definir Datas Padrão se não informadas
+    if not janelas:
+        if not data_inicio:
+            data_inicio = (datetime.now() - timedelta(days=30)).strftime('%Y-%m-%d')
+        if not data_fim:
+            data_fim = datetime.now().strftime('%Y-%m-%d')
+        janelas = [(None, data_inicio, data_fim)]
+
+    for rotulo, inicio, fim in janelas:
+        prefixo = f"[{rotulo}] " if rotulo else ""
+        log(f"{prefixo}Usando período: {inicio} até {fim}")
+
+    # 1. Buscar as visões
     try:
         with engine.connect() as conn:
-            result = conn.execute(text("SELECT id, nome, estrutura_json FROM visoes_dashboard"))
+            if ids_visoes:
+                result = conn.execute(
+                    text("SELECT id, nome, estrutura_json FROM visoes_dashboard WHERE id = ANY(:ids)"),
+                    {"ids": [int(i) for i in ids_visoes]}
+                )
+            else:
+                result = conn.execute(text("SELECT id, nome, estrutura_json FROM visoes_dashboard"))
             visoes = result.fetchall()
     except Exception as e:
-        print(f"Erro ao conectar banco: {e}")
-        return
+        log(f"Erro ao conectar banco: {e}")
+        return {"erro": f"Erro ao conectar banco: {e}"}
 
-    print(f"Encontradas {len(visoes)} visões para processar.")
+    log(f"Encontradas {len(visoes)} visões para processar.")
+
+    # 2. Montar plano: cada consulta distinta (SQL canônico + params) roda uma única vez para todas as janelas
+    params_uniao = montar_params(min(j[1] for j in janelas), max(j[2] for j in janelas))
+    consultas, usos = montar_plano(visoes, params_uniao)
+    log(f"Plano: {len(usos)} componentes, {len(consultas)} consultas distintas, {len(janelas)} janela(s).")
+
+    resultados = {}
+    for chave, sql in consultas.items():
+        try:
+            coluna_dia = coluna_dia_componentes([comp for c, _, _, comp in usos if c == chave], sql)
+            resultados[chave] = executar_janelas(engine, sql, janelas, coluna_dia)
+        except Exception as e:
+            nomes = ", ".join(sorted({nome for c, nome, _, _ in usos if c == chave}))
+            log(f"Erro na query das visões {nomes}: {e}")
 
     # Otimização: Reutilizar conexão TCP
-    session = requests.Session()
+    if session is None:
+        import requests
+        session = requests.Session()
     
     files_to_send = []
     metadata_list = []
 
-    for visao in visoes:
-        id_visao, nome, json_raw = visao
-        print(f"Processando: {nome}...")
+    # 3. Gerar Gráficos: o mesmo DataFrame é distribuído para todos os componentes que usam a consulta
+    for chave, nome, estrutura, comp in usos:
+        titulo = comp.get('titulo', 'Sem Título')
         
-        # O JSON pode vir como string ou dict dependendo do driver
-        if isinstance(json_raw, str):
-            estrutura = json.loads(json_raw)
-        else:
-            estrutura = json_raw
-            
-        componentes = estrutura.get('componentes', [])
-        
-        for comp in componentes:
-            titulo = comp.get('titulo', 'Sem Título')
-            sql = comp.get('sql')
-            tipo = comp.get('tipo')
+        if chave not in resultados:
+            continue
+
+        for rotulo, inicio, fim in janelas:
+            df = resultados[chave][rotulo]
             
-            if not sql or tipo not in ['grafico_barra', 'grafico_linha', 'grafico_combinado']:
+            if df.empty:
+                log(f"Sem dados para {titulo}" + (f" ({rotulo})" if rotulo else ""))
                 continue
 
-            # 2. Executar Query
-            try:
-                # Importante: Envolver SQL em text() e passar params
-                df = pd.read_sql(text(sql), engine, params=params)
-            except Exception as e:
-                print(f"Erro na query da visão {nome}: {e}")
-                continue
-                
-            if df.empty:
-                print(f"Sem dados para {titulo}")
+            titulo_grafico = f"{nome} - {titulo}" + (f" ({rotulo})" if rotulo else "")
+            buf = renderizar_grafico(df, comp, titulo_grafico, saida)
+            if buf is None:
                 continue
 
-            # 3. Gerar Gráfico
-            try:
-                plt.figure(figsize=(10, 6))
-                
-                eixo_x = comp.get('eixo_x')
-                eixo_y = comp.get('eixo_y')
-                eixo_y2 = comp.get('eixo_y2')
-                
-                if not (eixo_x and eixo_y and eixo_x in df.columns and eixo_y in df.columns):
-                     print(f"Colunas inválidas para {titulo} (Esperado: {eixo_x}, {eixo_y}) - Colunas: {df.columns.tolist()}")
-                     plt.close()
-                     continue
-
-                if tipo == 'grafico_barra':
-                    sns.barplot(data=df, x=eixo_x, y=eixo_y)
-                elif tipo == 'grafico_linha':
-                    sns.lineplot(data=df, x=eixo_x, y=eixo_y, marker='o')
-                elif tipo == 'grafico_combinado' and eixo_y2 and eixo_y2 in df.columns:
-                    fig, ax1 = plt.subplots(figsize=(10,6))
-                    sns.barplot(data=df, x=eixo_x, y=eixo_y, ax=ax1, color='b', alpha=0.6)
-                    ax2 = ax1.twinx()
-                    sns.lineplot(data=df, x=eixo_x, y=eixo_y2, ax=ax2, color='r', marker='o')
-                    ax1.set_ylabel(eixo_y, color='b')
-                    ax2.set_ylabel(eixo_y2, color='r')
-                
-                plt.title(f"{nome} - {titulo}")
-                plt.xticks(rotation=45)
-                plt.tight_layout()
-                
-                # 4. Salvar em Buffer (Memória)
-                buf = BytesIO()
-                plt.savefig(buf, format='png')
-                buf.seek(0)
-                plt.close()
-                
-                # Adicionar à lista de envio
-                files_to_send.append(('files', (f"{nome}_{titulo}.png", buf, 'image/png')))
-                metadata_list.append({
-                    'nome_visao': nome,
-                    'titulo_grafico': titulo,
-                    'descricao': estrutura.get('descricao_prompt', '')
-                })
-
-            except Exception as e:
-                print(f"Erro ao processar {titulo}: {e}")
-                plt.close()
-
-    # 5. Enviar TUDO para N8N (Batch)
+            # Adicionar à lista de envio
+            sufixo = f"_{rotulo}" if rotulo else ""
+            extensao, mime = visuais.FORMATOS_IMAGEM[visuais.DESTINOS_IMAGEM["email"]["formato"]]
+            files_to_send.append(('files', (f"{nome}_{titulo}{sufixo}.{extensao}", buf, mime)))
+            metadados = {
+                'nome_visao': nome,
+                'titulo_grafico': titulo,
+                'descricao': estrutura.get('descricao_prompt', '')
+            }
+            if rotulo:
+                metadados.update({'janela': rotulo, 'data_inicio': inicio, 'data_fim': fim})
+            metadata_list.append(metadados)
+
+    log(f"Consultas economizadas pela deduplicação: {len(usos) - len(consultas)}")
+
+    resumo = {
+        "visoes": len(visoes),
+        "graficos": len(files_to_send),
+        "consultas_economizadas": len(usos) - len(consultas),
+        "status_envio": None
+    }
+
+    # 4. Enviar TUDO para N8N (Batch)
     if files_to_send and WEBHOOK_URL:
-        print(f"Enviando {len(files_to_send)} gráficos em lote para N8N...")
+        log(f"Enviando {len(files_to_send)} gráficos em lote para N8N...")
         try:
             # Enviar metadados como JSON string
             data_payload = {'metadata': json.dumps(metadata_list)}
             
             response = session.post(WEBHOOK_URL, files=files_to_send, data=data_payload, timeout=30)
-            print(f"Status do Envio em Lote: {response.status_code}")
+            log(f"Status do Envio em Lote: {response.status_code}")
+            resumo["status_envio"] = response.status_code
             if response.status_code != 200:
-                print(f"Erro no envio: {response.text}")
+                log(f"Erro no envio: {response.text}")
+                resumo["erro"] = f"Falha no envio: {response.status_code}"
         except Exception as e:
-            print(f"Erro ao enviar request: {e}")
+            log(f"Erro ao enviar request: {e}")
+            resumo["erro"] = f"Erro ao enviar request: {e}"
     elif not WEBHOOK_URL:
-        print("URL do Webhook não configurada. Simulando envio...")
+        log("URL do Webhook não configurada. Simulando envio...")
     else:
-        print("Nenhum gráfico gerado para envio.")
+        log("Nenhum gráfico gerado para envio.")
+
+    return resumo
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description='Processar visões e enviar relatórios.')
     parser.add_argument('--start', type=str, help='Data de início (YYYY-MM-DD)')
     parser.add_argument('--end', type=str, help='Data de fim (YYYY-MM-DD)')
+    parser.add_argument('--janelas', type=str, help='Várias janelas em uma única execução: presets (ultimos-7, ultimos-30, ultimos-90) e/ou YYYY-MM-DD:YYYY-MM-DD separados por vírgula')
+    parser.add_argument('--metricas-prometheus', type=str, help='Arquivo para gravar as métricas da execução (formato texto Prometheus)')
+    parser.add_argument('--metricas-spans', type=str, help='Arquivo para gravar os spans da execução (JSON Lines)')
     
     args = parser.parse_args()
     
-    processar_visoes(args.start, args.end)
+    janelas = interpretar_janelas(args.janelas) if args.janelas else None
+    processar_visoes(args.start, args.end, janelas)
+
+    if args.metricas_prometheus:
+        with open(args.metricas_prometheus, 'w') as f:
+            f.write(metricas.exportar_prometheus())
+        print(f"Métricas gravadas em {args.metricas_prometheus}")
+    if args.metricas_spans:
+        metricas.exportar_spans(args.metricas_spans)
+        print(f"Spans gravados em {args.metricas_spans}")
@@ -0,0 +1,79 @@
+import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'src', 'jobs'))
+
+import processar_visoes
+
+
+def test_montar_plano_executa_sql_original_com_comentarios():
+    sql = (
+        "SELECT DATE(criado_em) AS dia, COUNT(*) AS pedidos -- pedidos por dia\n"
+        "FROM pedidos\n"
+        "WHERE criado_em BETWEEN :data_inicio AND :data_fim\n"
+        "GROUP BY 1"
+    )
+    # Mesma consulta com outra formatação: deduplicada pela forma canônica
+    sql_reformatado = sql.replace("\n", "\n  ") + ";"
+    estrutura = {"componentes": [
+        {"tipo": "grafico_linha", "sql": sql, "eixo_x": "dia", "eixo_y": "pedidos"},
+        {"tipo": "grafico_barra", "sql": sql_reformatado, "eixo_x": "dia", "eixo_y": "pedidos"},
+    ]}
+
+    consultas, usos = processar_visoes.montar_plano([(1, "Visão", estrutura)], {"data_inicio": "2025-01-01"})
+
+    assert len(usos) == 2
+    # Executa o texto original: o comentário continua terminando na quebra de linha, antes do FROM
+    assert list(consultas.values()) == [sql]
+    assert "-- pedidos por dia\nFROM pedidos" in consultas[usos[0][0]]
+
+
+def test_coluna_dia_agrupada_so_para_balde_diario():
+    assert processar_visoes.coluna_dia_agrupada(
+        "SELECT DATE(criado_em) AS dia, COUNT(*) AS pedidos FROM pedidos WHERE criado_em BETWEEN :data_inicio AND :data_fim GROUP BY 1 ORDER BY 1"
+    ) == "dia"
+    assert processar_visoes.coluna_dia_agrupada(
+        "SELECT p.criado_em::date AS data, SUM(valor_total) AS receita FROM pedidos p GROUP BY p.criado_em::date"
+    ) == "data"
+    # Baldes mensais e datas agregadas por entidade não podem ser fatiados por dia
+    assert processar_visoes.coluna_dia_agrupada(
+        "SELECT DATE_TRUNC('month', criado_em) AS dia, COUNT(*) FROM pedidos GROUP BY 1"
+    ) is None
+    assert processar_visoes.coluna_dia_agrupada(
+        "SELECT cliente_ref, MAX(DATE(criado_em)) AS ultima_data FROM pedidos GROUP BY cliente_ref"
+    ) is None
+    assert processar_visoes.coluna_dia_agrupada(
+        "SELECT DATE(criado_em) AS dia, cliente_ref FROM pedidos"
+    ) is None
+
+
+def test_executar_janelas_sem_balde_diario_nao_consulta_uniao(monkeypatch):
+    chamadas = []
+    monkeypatch.setattr(processar_visoes, "consultar_janela",
+                        lambda engine, sql, inicio, fim: chamadas.append((inicio, fim)) or processar_visoes.pd.DataFrame())
+    janelas = [("a", "2025-01-01", "2025-01-10"), ("b", "2025-01-05", "2025-01-20")]
+
+    resultados = processar_visoes.executar_janelas(None, "SELECT 1", janelas)
+
+    assert set(resultados) == {"a", "b"}
+    assert sorted(chamadas) == [("2025-01-01", "2025-01-10"), ("2025-01-05", "2025-01-20")]
+
+
+def test_executar_janelas_fatia_com_limites_do_sql(monkeypatch):
+    chamadas = []
+    uniao = processar_visoes.pd.DataFrame({"dia": ["2025-01-01", "2025-01-05", "2025-01-10", "2025-01-20"], "pedidos": [1, 2, 3, 4]})
+    monkeypatch.setattr(processar_visoes, "consultar_janela",
+                        lambda engine, sql, inicio, fim: chamadas.append((inicio, fim)) or uniao)
+    janelas = [("a", "2025-01-01", "2025-01-10"), ("b", "2025-01-05", "2025-01-20")]
+
+    resultados = processar_visoes.executar_janelas(None, "SELECT DATE(criado_em) AS dia ... GROUP BY 1", janelas, "dia")
+
+    assert chamadas == [("2025-01-01", "2025-01-20")]
+    # O dia final fica de fora, como em criado_em BETWEEN :data_inicio AND :data_fim
+    assert resultados["a"]["pedidos"].tolist() == [1, 2]
+    assert resultados["b"]["pedidos"].tolist() == [2, 3]
+
+    # Funções de janela (acumulados) não são fatiadas: cada janela roda a própria consulta
+    chamadas.clear()
+    processar_visoes.executar_janelas(None, "SELECT DATE(criado_em) AS dia, SUM(COUNT(*)) OVER (ORDER BY 1) ...", janelas, "dia")
+    assert sorted(chamadas) == [("2025-01-01", "2025-01-10"), ("2025-01-05", "2025-01-20")]